@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import users, auth, database_configs, servers
+from app.api.endpoints import users, auth, database_configs, servers, exports, system
 
 api_router = APIRouter()
 
@@ -7,3 +7,5 @@ api_router.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["User Management"])
 api_router.include_router(servers.router, prefix="/servers", tags=["Server Management"])
 api_router.include_router(database_configs.router, prefix="/database-configs", tags=["Database Configuration"])
+api_router.include_router(exports.router, prefix="/exports", tags=["Log Export"])
+api_router.include_router(system.router, prefix="/system", tags=["System"])
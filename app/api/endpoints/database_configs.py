@@ -1,12 +1,15 @@
+from datetime import datetime
 from typing import List, Optional
 from fastapi import APIRouter, Depends, Query, Path, HTTPException, status
-from sqlalchemy.orm import Session
-from app.db import get_db
-from app.models.user import User
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import get_async_db, get_async_read_db
+from app.core.principal import UserPrincipal
 from app.models.database_config import (
     DatabaseConfigCreate, DatabaseConfigUpdate, DatabaseConfigResponse, 
-    DatabaseConfigListResponse, DatabaseConfigTestRequest, DatabaseConfigTestResponse
+    DatabaseConfigListResponse, DatabaseConfigTestRequest, DatabaseConfigTestResponse,
+    DatabaseConfigBatchTestRequest, DatabaseConfigBatchTestResult
 )
+from app.models.connection_test_rollup import RollupResolution, LatencyHistoryResponse
 from app.core.dependencies import get_current_user
 from app.controllers.database_config_controller import DatabaseConfigController
 
@@ -20,8 +23,8 @@ db_config_controller = DatabaseConfigController()
 async def create_database_config(
     server_id: int = Path(..., description="伺服器ID"),
     config: DatabaseConfigCreate = ...,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create new database configuration for a server"""
     # 確保 server_id 與請求體中的 server_id 一致
@@ -31,7 +34,7 @@ async def create_database_config(
             detail="URL中的server_id與請求體中的server_id不一致"
         )
     
-    return db_config_controller.create_config(db, current_user, config)
+    return await db_config_controller.create_config(db, current_user, config)
 
 @router.get("/", 
            response_model=DatabaseConfigListResponse, 
@@ -40,11 +43,13 @@ async def create_database_config(
 async def get_user_database_configs(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="上一頁返回的 next_cursor，提供時忽略 skip"),
+    include_total: bool = Query(True, description="是否返回總數，false 時 total 為 null"),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get all database configurations for the current user"""
-    return db_config_controller.get_user_configs(db, current_user, skip, limit)
+    return await db_config_controller.get_user_configs(db, current_user, skip, limit, cursor, include_total)
 
 @router.get("/servers/{server_id}/configs/", 
            response_model=DatabaseConfigListResponse, 
@@ -54,11 +59,13 @@ async def get_server_database_configs(
     server_id: int = Path(..., description="伺服器ID"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="上一頁返回的 next_cursor，提供時忽略 skip"),
+    include_total: bool = Query(True, description="是否返回總數，false 時 total 為 null"),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get database configurations for a specific server"""
-    return db_config_controller.get_server_configs(db, server_id, current_user, skip, limit)
+    return await db_config_controller.get_server_configs(db, server_id, current_user, skip, limit, cursor, include_total)
 
 @router.get("/{config_id}", 
            response_model=DatabaseConfigResponse, 
@@ -66,11 +73,11 @@ async def get_server_database_configs(
            description="Get database configuration by ID")
 async def get_database_config(
     config_id: int = Path(..., description="資料庫配置ID"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get database configuration by ID"""
-    return db_config_controller.get_config_by_id(db, config_id, current_user)
+    return await db_config_controller.get_config_by_id(db, config_id, current_user)
 
 @router.put("/{config_id}", 
            response_model=DatabaseConfigResponse, 
@@ -79,22 +86,22 @@ async def get_database_config(
 async def update_database_config(
     config_id: int = Path(..., description="資料庫配置ID"),
     config_update: DatabaseConfigUpdate = ...,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update database configuration"""
-    return db_config_controller.update_config(db, config_id, current_user, config_update)
+    return await db_config_controller.update_config(db, config_id, current_user, config_update)
 
 @router.delete("/{config_id}", 
               summary="Delete Database Config", 
               description="Delete database configuration")
 async def delete_database_config(
     config_id: int = Path(..., description="資料庫配置ID"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete database configuration"""
-    return db_config_controller.delete_config(db, config_id, current_user)
+    return await db_config_controller.delete_config(db, config_id, current_user)
 
 @router.get("/servers/{server_id}/default/", 
            response_model=DatabaseConfigResponse, 
@@ -102,11 +109,11 @@ async def delete_database_config(
            description="Get default database configuration for a server")
 async def get_default_database_config(
     server_id: int = Path(..., description="伺服器ID"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get default database configuration for a server"""
-    return db_config_controller.get_default_config(db, server_id, current_user)
+    return await db_config_controller.get_default_config(db, server_id, current_user)
 
 @router.post("/{config_id}/test/", 
             response_model=DatabaseConfigTestResponse, 
@@ -114,11 +121,11 @@ async def get_default_database_config(
             description="Test database connection and save result")
 async def test_database_connection(
     config_id: int = Path(..., description="資料庫配置ID"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Test database connection and save result"""
-    return db_config_controller.test_connection(db, config_id, current_user)
+    return await db_config_controller.test_connection(db, config_id, current_user)
 
 @router.post("/test/", 
             response_model=DatabaseConfigTestResponse, 
@@ -126,7 +133,49 @@ async def test_database_connection(
             description="Test database connection without saving result")
 async def test_database_connection_without_save(
     test_data: DatabaseConfigTestRequest = ...,
-    current_user: User = Depends(get_current_user)
+    current_user: UserPrincipal = Depends(get_current_user)
 ):
     """Test database connection without saving result"""
-    return db_config_controller.test_connection_without_save(test_data)
\ No newline at end of file
+    return await db_config_controller.test_connection_without_save(test_data)
+
+@router.post("/test-batch/", 
+            summary="Batch Test Database Connections", 
+            description="Test many database configurations concurrently and stream results as NDJSON",
+            responses={200: {"model": DatabaseConfigBatchTestResult, "content": {"application/x-ndjson": {}}}})
+async def test_database_connections_batch(
+    batch_request: DatabaseConfigBatchTestRequest = ...,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Test database connections in batch and save results"""
+    return await db_config_controller.test_connections_batch(db, current_user, batch_request)
+
+@router.get("/{config_id}/latency/", 
+           response_model=LatencyHistoryResponse, 
+           summary="Get Database Config Latency History", 
+           description="Get rolled-up connection test latency for a database configuration")
+async def get_database_config_latency(
+    config_id: int = Path(..., description="資料庫配置ID"),
+    resolution: RollupResolution = Query(RollupResolution.HOUR, description="彙總粒度"),
+    start: Optional[datetime] = Query(None, description="起始時間（UTC）"),
+    end: Optional[datetime] = Query(None, description="結束時間（UTC）"),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Get latency history for a database configuration"""
+    return await db_config_controller.get_config_latency(db, config_id, current_user, resolution, start, end)
+
+@router.get("/servers/{server_id}/latency/", 
+           response_model=LatencyHistoryResponse, 
+           summary="Get Server Latency History", 
+           description="Get rolled-up connection test latency merged across a server's database configurations")
+async def get_server_latency(
+    server_id: int = Path(..., description="伺服器ID"),
+    resolution: RollupResolution = Query(RollupResolution.HOUR, description="彙總粒度"),
+    start: Optional[datetime] = Query(None, description="起始時間（UTC）"),
+    end: Optional[datetime] = Query(None, description="結束時間（UTC）"),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Get latency history for all database configurations of a server"""
+    return await db_config_controller.get_server_latency(db, server_id, current_user, resolution, start, end)
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""
+日誌匯出 API 端點
+"""
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import get_async_db
+from app.core.principal import UserPrincipal
+from app.core.dependencies import get_current_user
+from app.controllers.export_controller import ExportController
+from app.services.export_service import ExportFormat
+
+router = APIRouter()
+export_controller = ExportController()
+
+@router.get("/login-events", summary="Export Login Events", description="Stream login audit events as NDJSON or CSV (users with system.logs may export all users)")
+async def export_login_events(
+    format: ExportFormat = Query(ExportFormat.NDJSON, description="匯出格式"),
+    gzip: bool = Query(False, description="是否以 gzip 壓縮"),
+    user_id: Optional[int] = Query(None, description="用戶ID（僅管理員可指定其他用戶）"),
+    start: Optional[datetime] = Query(None, description="起始時間（含）"),
+    end: Optional[datetime] = Query(None, description="結束時間（不含）"),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Export login events"""
+    return await export_controller.export_login_events(db, current_user, format, gzip, user_id, start, end)
+
+@router.get("/connection-test-logs", summary="Export Connection Test Logs", description="Stream connection test logs as NDJSON or CSV (users with system.logs may export all users)")
+async def export_connection_test_logs(
+    format: ExportFormat = Query(ExportFormat.NDJSON, description="匯出格式"),
+    gzip: bool = Query(False, description="是否以 gzip 壓縮"),
+    user_id: Optional[int] = Query(None, description="用戶ID（僅管理員可指定其他用戶）"),
+    config_id: Optional[int] = Query(None, description="資料庫配置ID"),
+    start: Optional[datetime] = Query(None, description="起始時間（含）"),
+    end: Optional[datetime] = Query(None, description="結束時間（不含）"),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Export connection test logs"""
+    return await export_controller.export_connection_test_logs(db, current_user, format, gzip, user_id, config_id, start, end)
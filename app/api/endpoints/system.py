@@ -0,0 +1,27 @@
+"""
+系統管理 API 端點
+"""
+from fastapi import APIRouter, Depends, Query
+from app.core.principal import UserPrincipal
+from app.core.dependencies import require_permission
+from app.controllers.system_controller import SystemController
+from app.models.slow_query import SlowQueryListResponse
+
+router = APIRouter()
+system_controller = SystemController()
+
+@router.get("/slow-queries", response_model=SlowQueryListResponse, summary="Get Slow Queries", description="Get the top slow SQL statements grouped by fingerprint (requires system.logs)")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=1000, description="返回的查詢數量"),
+    order_by: str = Query("total", description="排序欄位（total / max / count）"),
+    current_user: UserPrincipal = Depends(require_permission("system.logs"))
+):
+    """Get slow queries"""
+    return system_controller.get_slow_queries(limit, order_by)
+
+@router.delete("/slow-queries", summary="Reset Slow Queries", description="Clear the accumulated slow query statistics (requires system.admin)")
+async def reset_slow_queries(
+    current_user: UserPrincipal = Depends(require_permission("system.admin"))
+):
+    """Reset slow queries"""
+    return system_controller.reset_slow_queries()
@@ -1,82 +1,100 @@
 """
 用戶相關 API 端點
 """
-from typing import List
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from app.db import get_db
-from app.models.user import User, UserCreate, UserResponse, UserStatusUpdate
-from app.core.dependencies import get_current_user
+from typing import List, Optional
+from fastapi import APIRouter, Depends, File, Query, Response, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import get_async_db, get_async_read_db
+from app.models.user import UserCreate, UserResponse, UserStatusUpdate, UserImportResponse
+from app.core.principal import UserPrincipal
+from app.core.dependencies import get_current_user, require_permission
 from app.controllers.user_controller import UserController
+from app.services.user_import_service import ImportFormat
 
 router = APIRouter()
 user_controller = UserController()
 
 @router.post("/", response_model=UserResponse, summary="Create User", description="Create a new user account")
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Create new user"""
-    return user_controller.create_user(db, user)
+    return await user_controller.create_user(db, user)
+
+@router.post("/import", response_model=UserImportResponse, summary="Import Users", description="Bulk create users from a CSV or NDJSON file with username, email, phone and password columns (requires user.create)")
+async def import_users(
+    file: UploadFile = File(..., description="CSV 或 NDJSON 檔案"),
+    format: Optional[ImportFormat] = Query(None, description="匯入格式（未指定時依副檔名判斷）"),
+    current_user: UserPrincipal = Depends(require_permission("user.create")),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Bulk import users"""
+    return await user_controller.import_users(db, file, format)
 
 @router.get("/", response_model=List[UserResponse], summary="Get Users", description="Get list of users (requires authentication)")
 async def get_users(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="上一頁返回的 next_cursor，提供時忽略 skip"),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get users list"""
-    return user_controller.get_users(db, current_user, skip, limit)
+    return await user_controller.get_users(db, current_user, skip, limit, cursor, response)
 
 @router.get("/{user_id}", response_model=UserResponse, summary="Get User by ID", description="Get user information by user ID")
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """Get user by ID"""
-    return user_controller.get_user_by_id(db, user_id)
+    return await user_controller.get_user_by_id(db, user_id)
 
 @router.put("/{user_id}", response_model=UserResponse, summary="Update User", description="Update user information")
 async def update_user(
     user_id: int, 
     user_update: UserCreate, 
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update user information"""
-    return user_controller.update_user(db, user_id, user_update, current_user)
+    return await user_controller.update_user(db, user_id, user_update, current_user)
 
 @router.delete("/{user_id}", summary="Delete User", description="Delete user account")
 async def delete_user(
     user_id: int, 
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(require_permission("user.delete")),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete user"""
-    return user_controller.delete_user(db, user_id, current_user)
+    return await user_controller.delete_user(db, user_id, current_user)
 
 @router.patch("/{user_id}/status", response_model=UserResponse, summary="Update User Status", description="Update user account status")
 async def update_user_status(
     user_id: int,
     status_update: UserStatusUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(require_permission("user.manage")),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update user status"""
-    return user_controller.update_user_status(db, user_id, status_update, current_user)
+    return await user_controller.update_user_status(db, user_id, status_update, current_user)
 
 @router.get("/active/list", response_model=List[UserResponse], summary="Get Active Users", description="Get list of active users (admin function)")
 async def get_active_users(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="上一頁返回的 next_cursor，提供時忽略 skip"),
+    current_user: UserPrincipal = Depends(require_permission("user.read")),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get active users list"""
-    return user_controller.get_active_users(db, current_user, skip, limit)
+    return await user_controller.get_active_users(db, current_user, skip, limit, cursor, response)
 
 @router.get("/locked/list", response_model=List[UserResponse], summary="Get Locked Users", description="Get list of locked users (admin function)")
 async def get_locked_users(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="上一頁返回的 next_cursor，提供時忽略 skip"),
+    current_user: UserPrincipal = Depends(require_permission("user.read")),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get locked users list"""
-    return user_controller.get_locked_users(db, current_user, skip, limit)
\ No newline at end of file
+    return await user_controller.get_locked_users(db, current_user, skip, limit, cursor, response)
\ No newline at end of file
@@ -1,12 +1,16 @@
 """
 認證控制器
 """
-from typing import Dict, Any
-from fastapi import Request, HTTPException, status
-from sqlalchemy.orm import Session
-from app.models.user import User, UserLogin, PasswordReset, PasswordResetConfirm, UserRegister, EmailVerification
+from typing import Dict, Any, Optional
+from fastapi import Request, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import UserLogin, TokenRefresh, PasswordReset, PasswordResetConfirm, UserRegister, EmailVerification
+from app.core.principal import UserPrincipal
+from app.core.pagination import set_next_cursor
 from app.services.auth_service import AuthService
 from app.core.dependencies import get_current_user
+from app.core.password_hashing import PasswordHashingBusyError
+from app.core.login_throttle import LoginThrottledError
 
 class AuthController:
     """認證控制器"""
@@ -14,13 +18,13 @@ class AuthController:
     def __init__(self):
         self.auth_service = AuthService()
     
-    def login(self, request: Request, db: Session, credentials: UserLogin) -> Dict[str, Any]:
+    async def login(self, request: Request, db: AsyncSession, credentials: UserLogin) -> Dict[str, Any]:
         """用戶登入"""
         try:
             ip_address = request.client.host if request.client else None
             user_agent = request.headers.get("user-agent")
             
-            result = self.auth_service.login(
+            result = await self.auth_service.login(
                 db=db,
                 username=credentials.username,
                 password=credentials.password,
@@ -29,22 +33,49 @@ class AuthController:
             )
             
             return result
-            
+        
         except ValueError as e:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=str(e)
             )
+        except LoginThrottledError as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except PasswordHashingBusyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e),
+                headers={"Retry-After": "1"}
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="登入過程中發生錯誤"
             )
     
-    def logout(self, db: Session, current_user: User, session_id: str = None) -> Dict[str, str]:
+    async def refresh(self, db: AsyncSession, token_refresh: TokenRefresh) -> Dict[str, Any]:
+        """以刷新令牌換發訪問令牌"""
+        try:
+            return await self.auth_service.refresh(db, token_refresh.refresh_token)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=str(e)
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="刷新令牌過程中發生錯誤"
+            )
+    
+    async def logout(self, db: AsyncSession, current_user: UserPrincipal, session_id: str = None) -> Dict[str, str]:
         """用戶登出"""
         try:
-            result = self.auth_service.logout(db, current_user, session_id)
+            result = await self.auth_service.logout(db, current_user, session_id)
             return result
         except Exception as e:
             raise HTTPException(
@@ -52,24 +83,31 @@ class AuthController:
                 detail="登出過程中發生錯誤"
             )
     
-    def get_current_user_info(self, current_user: User) -> Dict[str, Any]:
+    async def get_current_user_info(self, db: AsyncSession, current_user: UserPrincipal) -> Dict[str, Any]:
         """獲取當前用戶信息"""
+        # principal 只保存身分欄位，完整資料需讀取資料庫
+        user = await self.auth_service.user_service.get_by_id_async(db, current_user.id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="用戶不存在"
+            )
         return {
-            "id": current_user.id,
-            "username": current_user.username,
-            "email": current_user.email,
-            "phone": current_user.phone,
-            "status": current_user.status,
-            "last_login_at": current_user.last_login_at,
-            "mfa_enabled": current_user.mfa_enabled,
-            "created_at": current_user.created_at,
-            "updated_at": current_user.updated_at
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "phone": user.phone,
+            "status": user.status,
+            "last_login_at": user.last_login_at,
+            "mfa_enabled": user.mfa_enabled,
+            "created_at": user.created_at,
+            "updated_at": user.updated_at
         }
     
-    def request_password_reset(self, db: Session, password_reset: PasswordReset) -> Dict[str, str]:
+    async def request_password_reset(self, db: AsyncSession, password_reset: PasswordReset) -> Dict[str, str]:
         """請求密碼重設"""
         try:
-            result = self.auth_service.request_password_reset(db, password_reset.username)
+            result = await self.auth_service.request_password_reset(db, password_reset.username)
             return result
         except Exception as e:
             raise HTTPException(
@@ -77,7 +115,7 @@ class AuthController:
                 detail="請求密碼重設時發生錯誤"
             )
     
-    def confirm_password_reset(self, db: Session, password_reset_confirm: PasswordResetConfirm) -> Dict[str, str]:
+    async def confirm_password_reset(self, db: AsyncSession, password_reset_confirm: PasswordResetConfirm) -> Dict[str, str]:
         """確認密碼重設"""
         try:
             # 檢查密碼強度
@@ -89,13 +127,13 @@ class AuthController:
                     detail=message
                 )
             
-            result = self.auth_service.confirm_password_reset(
+            result = await self.auth_service.confirm_password_reset(
                 db, 
                 password_reset_confirm.token, 
                 password_reset_confirm.new_password
             )
             return result
-            
+        
         except ValueError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -103,16 +141,24 @@ class AuthController:
             )
         except HTTPException:
             raise
+        except PasswordHashingBusyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e),
+                headers={"Retry-After": "1"}
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="確認密碼重設時發生錯誤"
             )
     
-    def get_login_logs(self, db: Session, current_user: User, skip: int = 0, limit: int = 100):
+    async def get_login_logs(self, db: AsyncSession, current_user: UserPrincipal, skip: int = 0, limit: int = 100,
+                             cursor: Optional[str] = None, response: Optional[Response] = None):
         """獲取登入日誌"""
         try:
-            logs = self.auth_service.get_user_login_logs(db, current_user.id, skip, limit)
+            logs, next_cursor = await self.auth_service.get_user_login_logs(db, current_user.id, skip, limit, cursor)
+            set_next_cursor(response, next_cursor)
             return [
                 {
                     "id": log.id,
@@ -124,13 +170,15 @@ class AuthController:
                 }
                 for log in logs
             ]
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="獲取登入日誌時發生錯誤"
             )
     
-    def register(self, db: Session, user_register: UserRegister) -> Dict[str, Any]:
+    async def register(self, db: AsyncSession, user_register: UserRegister) -> Dict[str, Any]:
         """用戶註冊"""
         try:
             # 檢查密碼強度
@@ -142,7 +190,7 @@ class AuthController:
                     detail=message
                 )
             
-            result = self.auth_service.register_user(
+            result = await self.auth_service.register_user(
                 db=db,
                 username=user_register.username,
                 email=user_register.email,
@@ -152,24 +200,32 @@ class AuthController:
             )
             
             return result
-            
+        
         except ValueError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=str(e)
             )
+        except HTTPException:
+            raise
+        except PasswordHashingBusyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e),
+                headers={"Retry-After": "1"}
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="註冊過程中發生錯誤"
             )
     
-    def verify_email(self, db: Session, email_verification: EmailVerification) -> Dict[str, str]:
+    async def verify_email(self, db: AsyncSession, email_verification: EmailVerification) -> Dict[str, str]:
         """驗證郵箱"""
         try:
-            result = self.auth_service.verify_email(db, email_verification.token)
+            result = await self.auth_service.verify_email(db, email_verification.token)
             return result
-            
+        
         except ValueError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,16 +1,28 @@
-from typing import List, Dict, Any
+import json
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
 from fastapi import HTTPException, status, Path, Query
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import and_
-from app.models.user import User
+from app.core.principal import UserPrincipal
 from app.models.database_config import (
     DatabaseConfigCreate, DatabaseConfigUpdate, DatabaseConfigResponse, 
     DatabaseConfigListResponse, DatabaseConfigTestRequest, DatabaseConfigTestResponse,
-    TestStatus
+    DatabaseConfigBatchTestRequest, DatabaseConfigBatchTestResult, TestStatus
 )
+from app.models.connection_test_rollup import RollupResolution, LatencyHistoryResponse
+from app.core.config import settings
 from app.services.database_config_service import DatabaseConfigService
 from app.services.server_service import ServerService
 
+# 未指定時間範圍時，各粒度預設查詢的時間長度
+DEFAULT_LATENCY_WINDOWS = {
+    RollupResolution.MINUTE: timedelta(hours=6),
+    RollupResolution.HOUR: timedelta(days=7),
+    RollupResolution.DAY: timedelta(days=90),
+}
+
 class DatabaseConfigController:
     """資料庫配置控制器"""
     
@@ -18,18 +30,18 @@ class DatabaseConfigController:
         self.db_config_service = DatabaseConfigService()
         self.server_service = ServerService()
     
-    def create_config(self, db: Session, current_user: User, config_data: DatabaseConfigCreate) -> DatabaseConfigResponse:
+    async def create_config(self, db: AsyncSession, current_user: UserPrincipal, config_data: DatabaseConfigCreate) -> DatabaseConfigResponse:
         """創建資料庫配置"""
         try:
             # 檢查伺服器是否屬於該使用者
-            server = self.server_service.get_server_by_id(db, config_data.server_id, current_user.id)
+            server = await self.server_service.get_server_by_id(db, config_data.server_id, current_user.id)
             if not server:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="伺服器不存在或無權限訪問"
                 )
             
-            config = self.db_config_service.create_config(db=db, user_id=current_user.id, config_data=config_data)
+            config = await self.db_config_service.create_config(db=db, user_id=current_user.id, config_data=config_data)
             return DatabaseConfigResponse.from_orm(config)
         except ValueError as e:
             raise HTTPException(
@@ -44,41 +56,51 @@ class DatabaseConfigController:
                 detail=f"創建資料庫配置時發生錯誤: {e}"
             )
     
-    def get_user_configs(self, db: Session, current_user: User, skip: int = 0, limit: int = 100) -> DatabaseConfigListResponse:
+    async def get_user_configs(self, db: AsyncSession, current_user: UserPrincipal, skip: int = 0, limit: int = 100,
+                               cursor: Optional[str] = None, include_total: bool = True) -> DatabaseConfigListResponse:
         """獲取使用者所有資料庫配置"""
         try:
-            configs = self.db_config_service.get_user_configs(db, current_user.id, skip, limit)
-            return DatabaseConfigListResponse(total=len(configs), configs=[DatabaseConfigResponse.from_orm(c) for c in configs])
+            configs, next_cursor = await self.db_config_service.get_user_configs(db, current_user.id, skip, limit, cursor)
+            total = await self.db_config_service.count_user_configs(db, current_user.id) if include_total else None
+            return DatabaseConfigListResponse(total=total, configs=[DatabaseConfigResponse.from_orm(c) for c in configs],
+                                              next_cursor=next_cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"獲取資料庫配置列表時發生錯誤: {e}"
             )
     
-    def get_server_configs(self, db: Session, server_id: int, current_user: User, skip: int = 0, limit: int = 100) -> DatabaseConfigListResponse:
+    async def get_server_configs(self, db: AsyncSession, server_id: int, current_user: UserPrincipal, skip: int = 0, limit: int = 100,
+                                 cursor: Optional[str] = None, include_total: bool = True) -> DatabaseConfigListResponse:
         """獲取指定伺服器的資料庫配置"""
         try:
             # 檢查伺服器是否屬於該使用者
-            server = self.server_service.get_server_by_id(db, server_id, current_user.id)
+            server = await self.server_service.get_server_by_id(db, server_id, current_user.id)
             if not server:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="伺服器不存在或無權限訪問"
                 )
             
-            configs = self.db_config_service.get_server_configs(db, server_id, current_user.id, skip, limit)
-            return DatabaseConfigListResponse(total=len(configs), configs=[DatabaseConfigResponse.from_orm(c) for c in configs])
+            configs, next_cursor = await self.db_config_service.get_server_configs(db, server_id, current_user.id, skip, limit, cursor)
+            total = await self.db_config_service.count_server_configs(db, server_id, current_user.id) if include_total else None
+            return DatabaseConfigListResponse(total=total, configs=[DatabaseConfigResponse.from_orm(c) for c in configs],
+                                              next_cursor=next_cursor)
         except HTTPException:
             raise
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"獲取伺服器資料庫配置時發生錯誤: {e}"
             )
     
-    def get_config_by_id(self, db: Session, config_id: int, current_user: User) -> DatabaseConfigResponse:
+    async def get_config_by_id(self, db: AsyncSession, config_id: int, current_user: UserPrincipal) -> DatabaseConfigResponse:
         """根據ID獲取資料庫配置"""
-        config = self.db_config_service.get_config_by_id(db, config_id, current_user.id)
+        config = await self.db_config_service.get_config_by_id(db, config_id, current_user.id)
         if not config:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -86,10 +108,10 @@ class DatabaseConfigController:
             )
         return DatabaseConfigResponse.from_orm(config)
     
-    def update_config(self, db: Session, config_id: int, current_user: User, config_data: DatabaseConfigUpdate) -> DatabaseConfigResponse:
+    async def update_config(self, db: AsyncSession, config_id: int, current_user: UserPrincipal, config_data: DatabaseConfigUpdate) -> DatabaseConfigResponse:
         """更新資料庫配置"""
         try:
-            updated_config = self.db_config_service.update_config(db, config_id, current_user.id, config_data)
+            updated_config = await self.db_config_service.update_config(db, config_id, current_user.id, config_data)
             if not updated_config:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -107,10 +129,10 @@ class DatabaseConfigController:
                 detail=f"更新資料庫配置時發生錯誤: {e}"
             )
     
-    def delete_config(self, db: Session, config_id: int, current_user: User):
+    async def delete_config(self, db: AsyncSession, config_id: int, current_user: UserPrincipal):
         """刪除資料庫配置"""
         try:
-            success = self.db_config_service.delete_config(db, config_id, current_user.id)
+            success = await self.db_config_service.delete_config(db, config_id, current_user.id)
             if not success:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -123,18 +145,18 @@ class DatabaseConfigController:
                 detail=f"刪除資料庫配置時發生錯誤: {e}"
             )
     
-    def get_default_config(self, db: Session, server_id: int, current_user: User) -> DatabaseConfigResponse:
+    async def get_default_config(self, db: AsyncSession, server_id: int, current_user: UserPrincipal) -> DatabaseConfigResponse:
         """獲取指定伺服器的預設資料庫配置"""
         try:
             # 檢查伺服器是否屬於該使用者
-            server = self.server_service.get_server_by_id(db, server_id, current_user.id)
+            server = await self.server_service.get_server_by_id(db, server_id, current_user.id)
             if not server:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="伺服器不存在或無權限訪問"
                 )
             
-            config = self.db_config_service.get_default_config(db, server_id, current_user.id)
+            config = await self.db_config_service.get_default_config(db, server_id, current_user.id)
             if not config:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -150,10 +172,10 @@ class DatabaseConfigController:
                 detail=f"獲取預設資料庫配置時發生錯誤: {e}"
             )
     
-    def test_connection(self, db: Session, config_id: int, current_user: User) -> DatabaseConfigTestResponse:
+    async def test_connection(self, db: AsyncSession, config_id: int, current_user: UserPrincipal) -> DatabaseConfigTestResponse:
         """測試資料庫連接（保存結果）"""
         try:
-            result = self.db_config_service.test_connection(db, config_id, current_user.id)
+            result = await self.db_config_service.test_connection(db, config_id, current_user.id)
             return DatabaseConfigTestResponse(**result)
         except ValueError as e:
             raise HTTPException(
@@ -166,13 +188,135 @@ class DatabaseConfigController:
                 detail=f"測試資料庫連接時發生錯誤: {e}"
             )
     
-    def test_connection_without_save(self, test_data: DatabaseConfigTestRequest) -> DatabaseConfigTestResponse:
+    async def test_connection_without_save(self, test_data: DatabaseConfigTestRequest) -> DatabaseConfigTestResponse:
         """測試資料庫連接（不保存結果）"""
         try:
-            result = self.db_config_service.test_connection_without_save(test_data.dict())
+            result = await self.db_config_service.test_connection_without_save(test_data.dict())
             return DatabaseConfigTestResponse(**result)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"測試資料庫連接時發生錯誤: {e}"
             )
+    
+    async def test_connections_batch(self, db: AsyncSession, current_user: UserPrincipal,
+                                     batch_request: DatabaseConfigBatchTestRequest) -> StreamingResponse:
+        """批次測試資料庫連接，以 NDJSON 串流返回結果"""
+        try:
+            if (batch_request.config_ids is None) == (batch_request.server_id is None):
+                raise ValueError("請提供 config_ids 或 server_id 其中之一")
+            
+            if batch_request.config_ids is not None:
+                if not batch_request.config_ids:
+                    raise ValueError("config_ids 不可為空")
+                if len(batch_request.config_ids) > settings.CONNECTION_TEST_BATCH_MAX_CONFIGS:
+                    raise ValueError(f"單次最多測試 {settings.CONNECTION_TEST_BATCH_MAX_CONFIGS} 個配置")
+            else:
+                # 檢查伺服器是否屬於該使用者
+                server = await self.server_service.get_server_by_id(db, batch_request.server_id, current_user.id)
+                if not server:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail="伺服器不存在或無權限訪問"
+                    )
+            
+            configs = await self.db_config_service.get_batch_test_configs(
+                db, current_user.id, batch_request.config_ids, batch_request.server_id
+            )
+            if batch_request.config_ids is not None and len(configs) != len(set(batch_request.config_ids)):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="部分配置不存在或無權限訪問"
+                )
+            if len(configs) > settings.CONNECTION_TEST_BATCH_MAX_CONFIGS:
+                raise ValueError(f"單次最多測試 {settings.CONNECTION_TEST_BATCH_MAX_CONFIGS} 個配置")
+            
+            async def stream():
+                async for result in self.db_config_service.test_connections_batch(configs, current_user.id):
+                    item = DatabaseConfigBatchTestResult(**result)
+                    yield json.dumps(item.dict(), ensure_ascii=False) + "\n"
+            
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"批次測試資料庫連接時發生錯誤: {e}"
+            )
+    
+    async def get_config_latency(self, db: AsyncSession, config_id: int, current_user: UserPrincipal,
+                                 resolution: RollupResolution, start: Optional[datetime],
+                                 end: Optional[datetime]) -> LatencyHistoryResponse:
+        """獲取資料庫配置的延遲歷史"""
+        try:
+            config = await self.db_config_service.get_config_by_id(db, config_id, current_user.id)
+            if not config:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="資料庫配置不存在或無權限訪問"
+                )
+            
+            start, end = self._latency_window(resolution, start, end)
+            buckets = await self.db_config_service.rollup_service.get_history(
+                db, [config_id], resolution, start, end
+            )
+            return LatencyHistoryResponse(resolution=resolution, config_id=config_id, buckets=buckets)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"獲取延遲歷史時發生錯誤: {e}"
+            )
+    
+    async def get_server_latency(self, db: AsyncSession, server_id: int, current_user: UserPrincipal,
+                                 resolution: RollupResolution, start: Optional[datetime],
+                                 end: Optional[datetime]) -> LatencyHistoryResponse:
+        """獲取伺服器下所有資料庫配置合併後的延遲歷史"""
+        try:
+            # 檢查伺服器是否屬於該使用者
+            server = await self.server_service.get_server_by_id(db, server_id, current_user.id)
+            if not server:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="伺服器不存在或無權限訪問"
+                )
+            
+            start, end = self._latency_window(resolution, start, end)
+            config_ids = await self.db_config_service.get_server_config_ids(db, server_id, current_user.id)
+            buckets = await self.db_config_service.rollup_service.get_history(
+                db, config_ids, resolution, start, end
+            )
+            return LatencyHistoryResponse(resolution=resolution, server_id=server_id, buckets=buckets)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"獲取延遲歷史時發生錯誤: {e}"
+            )
+    
+    def _latency_window(self, resolution: RollupResolution, start: Optional[datetime],
+                        end: Optional[datetime]) -> Tuple[datetime, datetime]:
+        """補齊查詢時間範圍"""
+        end = end or datetime.utcnow()
+        start = start or end - DEFAULT_LATENCY_WINDOWS[resolution]
+        if start >= end:
+            raise ValueError("start 必須早於 end")
+        return start, end
@@ -0,0 +1,75 @@
+"""
+日誌匯出控制器
+"""
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.principal import UserPrincipal
+from app.core.permissions import permission_engine
+from app.services.export_service import ExportService, ExportFormat, EXPORT_MEDIA_TYPES
+
+class ExportController:
+    """日誌匯出控制器"""
+    
+    def __init__(self):
+        self.export_service = ExportService()
+    
+    async def export_login_events(self, db: AsyncSession, current_user: UserPrincipal, fmt: ExportFormat, compress: bool,
+                            user_id: Optional[int] = None, start: Optional[datetime] = None,
+                            end: Optional[datetime] = None) -> StreamingResponse:
+        """串流匯出登入稽核事件"""
+        try:
+            user_id = await self._resolve_user_id(db, current_user, user_id)
+            body = self.export_service.login_events(fmt, compress, user_id, start, end)
+            return self._response(body, "login_events", fmt, compress)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="匯出登入日誌時發生錯誤"
+            )
+    
+    async def export_connection_test_logs(self, db: AsyncSession, current_user: UserPrincipal, fmt: ExportFormat, compress: bool,
+                                    user_id: Optional[int] = None, config_id: Optional[int] = None,
+                                    start: Optional[datetime] = None, end: Optional[datetime] = None) -> StreamingResponse:
+        """串流匯出連接測試日誌"""
+        try:
+            user_id = await self._resolve_user_id(db, current_user, user_id)
+            body = self.export_service.connection_test_logs(fmt, compress, user_id, config_id, start, end)
+            return self._response(body, "connection_test_logs", fmt, compress)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="匯出連接測試日誌時發生錯誤"
+            )
+    
+    async def _resolve_user_id(self, db: AsyncSession, current_user: UserPrincipal, user_id: Optional[int]) -> Optional[int]:
+        """擁有 system.logs 權限者可匯出任一或全部用戶的日誌，其他用戶只能匯出自己的"""
+        if await permission_engine.has_permission(db, current_user.id, "system.logs"):
+            return user_id
+        if user_id is not None and user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="無權限匯出其他用戶的日誌"
+            )
+        return current_user.id
+    
+    @staticmethod
+    def _response(body: AsyncIterator[bytes], name: str, fmt: ExportFormat, compress: bool) -> StreamingResponse:
+        filename = f"{name}_{datetime.utcnow():%Y%m%d%H%M%S}.{fmt.value}"
+        if compress:
+            filename += ".gz"
+        return StreamingResponse(
+            body,
+            media_type="application/gzip" if compress else EXPORT_MEDIA_TYPES[fmt],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
@@ -0,0 +1,30 @@
+"""
+系統管理控制器
+"""
+from fastapi import HTTPException, status
+from app.core.query_log import slow_query_log
+from app.models.slow_query import SlowQueryListResponse, SlowQueryStat
+
+class SystemController:
+    """系統管理控制器"""
+    
+    def get_slow_queries(self, limit: int, order_by: str) -> SlowQueryListResponse:
+        """獲取前 N 名慢查詢"""
+        try:
+            return SlowQueryListResponse(
+                threshold_ms=slow_query_log.threshold * 1000,
+                since=slow_query_log.started_at,
+                queries=[SlowQueryStat(**stats) for stats in slow_query_log.top(limit, order_by)]
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="獲取慢查詢統計時發生錯誤"
+            )
+    
+    def reset_slow_queries(self) -> dict:
+        """清除慢查詢統計"""
+        slow_query_log.reset()
+        return {"message": "慢查詢統計已清除"}
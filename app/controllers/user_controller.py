@@ -1,20 +1,26 @@
 """
 用戶控制器
 """
-from typing import List, Dict, Any
-from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
-from app.models.user import User, UserCreate, UserResponse, UserStatusUpdate
+from typing import List, Dict, Any, Optional
+from fastapi import HTTPException, Response, UploadFile, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import UserCreate, UserResponse, UserStatusUpdate, UserImportResponse
+from app.core.principal import UserPrincipal
+from app.core.pagination import set_next_cursor
+from app.core.permissions import permission_engine
 from app.services.user_service import UserService
+from app.services.user_import_service import UserImportService, ImportFormat
 from app.core.dependencies import get_current_user
+from app.core.password_hashing import PasswordHashingBusyError
 
 class UserController:
     """用戶控制器"""
     
     def __init__(self):
         self.user_service = UserService()
+        self.import_service = UserImportService()
     
-    def create_user(self, db: Session, user_data: UserCreate) -> UserResponse:
+    async def create_user(self, db: AsyncSession, user_data: UserCreate) -> UserResponse:
         """創建新用戶"""
         try:
             # 檢查密碼強度
@@ -26,7 +32,7 @@ class UserController:
                     detail=message
                 )
             
-            user = self.user_service.create_user(
+            user = await self.user_service.create_user(
                 db=db,
                 username=user_data.username,
                 email=user_data.email,
@@ -35,33 +41,75 @@ class UserController:
             )
             
             return UserResponse.from_orm(user)
-            
+        
         except ValueError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=str(e)
             )
+        except HTTPException:
+            raise
+        except PasswordHashingBusyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e),
+                headers={"Retry-After": "1"}
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="創建用戶時發生錯誤"
             )
     
-    def get_users(self, db: Session, current_user: User, skip: int = 0, limit: int = 100) -> List[UserResponse]:
+    async def import_users(self, db: AsyncSession, file: UploadFile, fmt: Optional[ImportFormat] = None) -> UserImportResponse:
+        """批次匯入用戶"""
+        try:
+            fmt = fmt or self._detect_import_format(file)
+            data = await file.read()
+            return await self.import_service.import_users(db, data, fmt)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="匯入用戶時發生錯誤"
+            )
+    
+    @staticmethod
+    def _detect_import_format(file: UploadFile) -> ImportFormat:
+        """依副檔名或內容類型判斷匯入格式"""
+        filename = (file.filename or "").lower()
+        content_type = (file.content_type or "").lower()
+        if filename.endswith(".csv") or "csv" in content_type:
+            return ImportFormat.CSV
+        if filename.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type:
+            return ImportFormat.NDJSON
+        raise ValueError("無法判斷匯入格式，請指定 format 參數")
+    
+    async def get_users(self, db: AsyncSession, current_user: UserPrincipal, skip: int = 0, limit: int = 100,
+                        cursor: Optional[str] = None, response: Optional[Response] = None) -> List[UserResponse]:
         """獲取用戶列表"""
         try:
-            users = self.user_service.get_all(db, skip, limit)
+            users, next_cursor = await self.user_service.get_all_async(db, skip, limit, cursor)
+            set_next_cursor(response, next_cursor)
             return [UserResponse.from_orm(user) for user in users]
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="獲取用戶列表時發生錯誤"
             )
     
-    def get_user_by_id(self, db: Session, user_id: int) -> UserResponse:
+    async def get_user_by_id(self, db: AsyncSession, user_id: int) -> UserResponse:
         """根據 ID 獲取用戶"""
         try:
-            user = self.user_service.get_by_id(db, user_id)
+            user = await self.user_service.get_by_id_async(db, user_id)
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -76,18 +124,18 @@ class UserController:
                 detail="獲取用戶信息時發生錯誤"
             )
     
-    def update_user(self, db: Session, user_id: int, user_data: UserCreate, current_user: User) -> UserResponse:
+    async def update_user(self, db: AsyncSession, user_id: int, user_data: UserCreate, current_user: UserPrincipal) -> UserResponse:
         """更新用戶信息"""
         try:
-            # 檢查權限（只有管理員或用戶本人可以更新）
-            if current_user.id != user_id and not self._is_admin(current_user):
+            # 檢查權限（只有擁有 user.update 權限者或用戶本人可以更新）
+            if current_user.id != user_id and not await permission_engine.has_permission(db, current_user.id, "user.update"):
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="無權限更新此用戶信息"
                 )
             
             # 檢查用戶是否存在
-            user = self.user_service.get_by_id(db, user_id)
+            user = await self.user_service.get_by_id_async(db, user_id)
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -101,7 +149,7 @@ class UserController:
                 "phone": user_data.phone
             }
             
-            updated_user = self.user_service.update(db, user_id, **update_data)
+            updated_user = await self.user_service.update_async(db, user_id, **update_data)
             if not updated_user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -109,7 +157,7 @@ class UserController:
                 )
             
             return UserResponse.from_orm(updated_user)
-            
+        
         except HTTPException:
             raise
         except ValueError as e:
@@ -123,16 +171,9 @@ class UserController:
                 detail="更新用戶信息時發生錯誤"
             )
     
-    def delete_user(self, db: Session, user_id: int, current_user: User) -> Dict[str, str]:
+    async def delete_user(self, db: AsyncSession, user_id: int, current_user: UserPrincipal) -> Dict[str, str]:
         """刪除用戶"""
         try:
-            # 檢查權限（只有管理員可以刪除用戶）
-            if not self._is_admin(current_user):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="無權限刪除用戶"
-                )
-            
             # 不能刪除自己
             if current_user.id == user_id:
                 raise HTTPException(
@@ -140,7 +181,7 @@ class UserController:
                     detail="不能刪除自己的帳號"
                 )
             
-            success = self.user_service.delete(db, user_id)
+            success = await self.user_service.delete_async(db, user_id)
             if not success:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -148,7 +189,7 @@ class UserController:
                 )
             
             return {"message": "用戶刪除成功"}
-            
+        
         except HTTPException:
             raise
         except Exception as e:
@@ -157,17 +198,10 @@ class UserController:
                 detail="刪除用戶時發生錯誤"
             )
     
-    def update_user_status(self, db: Session, user_id: int, status_data: UserStatusUpdate, 
-                          current_user: User) -> UserResponse:
+    async def update_user_status(self, db: AsyncSession, user_id: int, status_data: UserStatusUpdate, 
+                          current_user: UserPrincipal) -> UserResponse:
         """更新用戶狀態"""
         try:
-            # 檢查權限（只有管理員可以更新用戶狀態）
-            if not self._is_admin(current_user):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="無權限更新用戶狀態"
-                )
-            
             # 不能修改自己的狀態
             if current_user.id == user_id:
                 raise HTTPException(
@@ -175,7 +209,7 @@ class UserController:
                     detail="不能修改自己的狀態"
                 )
             
-            updated_user = self.user_service.update(db, user_id, status=status_data.status)
+            updated_user = await self.user_service.update_async(db, user_id, status=status_data.status)
             if not updated_user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -183,7 +217,7 @@ class UserController:
                 )
             
             return UserResponse.from_orm(updated_user)
-            
+        
         except HTTPException:
             raise
         except Exception as e:
@@ -192,54 +226,38 @@ class UserController:
                 detail="更新用戶狀態時發生錯誤"
             )
     
-    def get_active_users(self, db: Session, current_user: User, skip: int = 0, limit: int = 100) -> List[UserResponse]:
+    async def get_active_users(self, db: AsyncSession, current_user: UserPrincipal, skip: int = 0, limit: int = 100,
+                               cursor: Optional[str] = None, response: Optional[Response] = None) -> List[UserResponse]:
         """獲取活躍用戶列表"""
         try:
-            # 檢查權限（只有管理員可以查看）
-            if not self._is_admin(current_user):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="無權限查看用戶列表"
-                )
-            
-            users = self.user_service.get_active_users(db, skip, limit)
+            users, next_cursor = await self.user_service.get_active_users(db, skip, limit, cursor)
+            set_next_cursor(response, next_cursor)
             return [UserResponse.from_orm(user) for user in users]
-            
+        
         except HTTPException:
             raise
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="獲取活躍用戶列表時發生錯誤"
             )
     
-    def get_locked_users(self, db: Session, current_user: User, skip: int = 0, limit: int = 100) -> List[UserResponse]:
+    async def get_locked_users(self, db: AsyncSession, current_user: UserPrincipal, skip: int = 0, limit: int = 100,
+                               cursor: Optional[str] = None, response: Optional[Response] = None) -> List[UserResponse]:
         """獲取被鎖定的用戶列表"""
         try:
-            # 檢查權限（只有管理員可以查看）
-            if not self._is_admin(current_user):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="無權限查看用戶列表"
-                )
-            
-            users = self.user_service.get_locked_users(db, skip, limit)
+            users, next_cursor = await self.user_service.get_locked_users(db, skip, limit, cursor)
+            set_next_cursor(response, next_cursor)
             return [UserResponse.from_orm(user) for user in users]
-            
+        
         except HTTPException:
             raise
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="獲取被鎖定用戶列表時發生錯誤"
             )
-    
-    def _is_admin(self, user: User) -> bool:
-        """檢查用戶是否為管理員"""
-        # 這裡可以根據角色系統來判斷
-        # 暫時簡單判斷用戶名包含 admin
-        return "admin" in user.username.lower()
-
-
-
-
@@ -0,0 +1,274 @@
+"""
+登入稽核事件寫入緩衝（write-behind）
+登入流程只將事件放入記憶體緩衝，由背景任務以多列 INSERT 批次寫入資料庫；
+資料庫不可用時暫存至本地檔案（每個進程各自一個），待恢復後重新寫入；
+無法解析或資料本身無法寫入的事件移至隔離檔，不阻塞後續事件
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import re
+import socket
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.models.login_log import UserLoginEvent
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BUFFERED = metrics_registry.gauge(
+    "login_audit_buffered_events", "等待寫入的登入稽核事件數"
+)
+AUDIT_FLUSH_LATENCY = metrics_registry.histogram(
+    "login_audit_flush_duration_seconds", "登入稽核事件批次寫入耗時"
+)
+AUDIT_WRITTEN = metrics_registry.counter(
+    "login_audit_written_total", "已寫入資料庫的登入稽核事件數"
+)
+AUDIT_SPILLED = metrics_registry.counter(
+    "login_audit_spilled_total", "因資料庫不可用而暫存至檔案的登入稽核事件數"
+)
+AUDIT_QUARANTINED = metrics_registry.counter(
+    "login_audit_quarantined_total", "無法解析或無法寫入而移至隔離檔的登入稽核事件數"
+)
+
+_HOSTNAME = socket.gethostname()[:40]
+
+class LoginEventSink:
+    """登入稽核事件批次寫入器"""
+    
+    def __init__(self, batch_size: int, flush_interval: float, max_buffer: int, spill_path: str):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(self.batch_size, max_buffer)
+        # 設定的路徑為各進程暫存檔的命名基準：<名稱>.<主機>-<pid><副檔名>
+        self.spill_base, self.spill_ext = os.path.splitext(spill_path)
+        self._buffer: List[Dict[str, Any]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def spill_path(self) -> str:
+        """本進程的暫存檔（於使用時取得 pid，fork 出的 worker 不會共用同一檔案）"""
+        return f"{self.spill_base}.{_HOSTNAME}-{os.getpid()}{self.spill_ext}"
+    
+    @property
+    def replay_path(self) -> str:
+        """本進程重新寫入中的暫存檔"""
+        return f"{self.spill_path}.replay"
+    
+    @property
+    def quarantine_path(self) -> str:
+        """無法寫入的事件隔離檔"""
+        return f"{self.spill_base}.rejected{self.spill_ext}"
+    
+    @property
+    def pending(self) -> int:
+        """緩衝中的事件數"""
+        return len(self._buffer)
+    
+    def record(self, event: Dict[str, Any]):
+        """加入一筆事件（不等待資料庫）"""
+        self._buffer.append(event)
+        AUDIT_BUFFERED.set(len(self._buffer))
+        if len(self._buffer) >= self.max_buffer:
+            # 背景寫入跟不上時直接暫存，避免記憶體無限增長
+            rows, self._buffer = self._buffer, []
+            AUDIT_BUFFERED.set(0)
+            self._spill(rows)
+        elif len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+    
+    def start(self):
+        """啟動背景寫入任務"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """停止背景任務並寫入剩餘事件"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+    
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("登入稽核事件寫入失敗")
+    
+    async def flush(self):
+        """將暫存檔及緩衝中的事件寫入資料庫"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            try:
+                await self._replay_spill()
+            except Exception:
+                # 重新寫入失敗不影響緩衝的寫入
+                logger.exception("登入稽核暫存檔重新寫入失敗")
+            while self._buffer:
+                rows = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                AUDIT_BUFFERED.set(len(self._buffer))
+                unwritten = await self._write(rows)
+                if unwritten:
+                    unwritten.extend(self._buffer)
+                    self._buffer = []
+                    AUDIT_BUFFERED.set(0)
+                    self._spill(unwritten)
+                    return
+    
+    async def _write(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """以單一多列 INSERT 寫入，返回因資料庫不可用而未寫入的事件"""
+        try:
+            await self._insert(rows)
+        except (IntegrityError, DataError) as e:
+            # 資料本身無法寫入（例如違反外鍵）：逐筆重試，只隔離出錯的事件
+            if len(rows) == 1:
+                self._quarantine([json.dumps(_serialize_event(rows[0]))], e)
+                return []
+            for index, row in enumerate(rows):
+                if await self._write([row]):
+                    return rows[index:]
+            return []
+        except Exception as e:
+            logger.warning("登入稽核事件寫入資料庫失敗，改為暫存至檔案: %s", e)
+            return rows
+        AUDIT_WRITTEN.inc(len(rows))
+        return []
+    
+    async def _insert(self, rows: List[Dict[str, Any]]):
+        from app.db import AsyncSessionLocal
+        
+        start_time = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(UserLoginEvent.__table__).values(rows))
+                await db.commit()
+        finally:
+            AUDIT_FLUSH_LATENCY.observe(time.perf_counter() - start_time)
+    
+    def _spill(self, rows: List[Dict[str, Any]]):
+        """將事件以 NDJSON 附加至暫存檔"""
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(_serialize_event(row)) + "\n")
+        AUDIT_SPILLED.inc(len(rows))
+    
+    def _quarantine(self, lines: List[str], error: Exception):
+        """將無法寫入的事件原樣附加至隔離檔"""
+        logger.warning("%d 筆登入稽核事件無法寫入，移至 %s: %s", len(lines), self.quarantine_path, error)
+        with open(self.quarantine_path, "a", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line.rstrip("\n") + "\n")
+        AUDIT_QUARANTINED.inc(len(lines))
+    
+    def _claim_spill(self) -> bool:
+        """取得待重新寫入的暫存檔並改名為本進程的 replay 檔，沒有時返回 False"""
+        replay_path = self.replay_path
+        if os.path.exists(replay_path):
+            return True
+        # 先改名，避免重新寫入期間的新暫存事件被一併刪除；已結束的進程遺留的暫存檔由同主機的 worker 接手，
+        # 改名為原子操作，多個 worker 同時接手時只有一個成功
+        for path in [self.spill_path] + self._orphaned_spills():
+            try:
+                os.replace(path, replay_path)
+                return True
+            except FileNotFoundError:
+                continue
+        return False
+    
+    def _orphaned_spills(self) -> List[str]:
+        """同主機上已結束的進程遺留的暫存檔"""
+        prefix = f"{self.spill_base}.{_HOSTNAME}-"
+        pattern = re.compile(r"(\d+)" + re.escape(self.spill_ext) + r"(\.replay)?")
+        orphans = []
+        for path in glob.glob(glob.escape(prefix) + "*"):
+            match = pattern.fullmatch(path[len(prefix):])
+            if match and not _process_alive(int(match.group(1))):
+                orphans.append(path)
+        return orphans
+    
+    async def _replay_spill(self):
+        """資料庫恢復後重新寫入暫存檔中的事件"""
+        while self._claim_spill():
+            replay_path = self.replay_path
+            rows, corrupt = _read_spill(replay_path)
+            if corrupt:
+                self._quarantine(corrupt, ValueError("無法解析的暫存事件"))
+            for index in range(0, len(rows), self.batch_size):
+                unwritten = await self._write(rows[index:index + self.batch_size])
+                if unwritten:
+                    # 只保留尚未寫入的事件，避免下次重複寫入；寫入暫存後再改名，中途結束不會截斷檔案
+                    with open(f"{replay_path}.tmp", "w", encoding="utf-8") as f:
+                        for row in unwritten + rows[index + self.batch_size:]:
+                            f.write(json.dumps(_serialize_event(row)) + "\n")
+                    os.replace(f"{replay_path}.tmp", replay_path)
+                    return
+            os.remove(replay_path)
+
+def _read_spill(path: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """讀取暫存檔，返回 (事件, 無法解析的原始列)；進程在寫入中途結束時最後一列可能不完整"""
+    rows, corrupt = [], []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                rows.append(_deserialize_event(json.loads(line)))
+            except (ValueError, TypeError, KeyError, AttributeError):
+                corrupt.append(line)
+    return rows, corrupt
+
+def _process_alive(pid: int) -> bool:
+    """同主機上的進程是否仍在執行（屬於其他使用者的進程視為執行中）"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _serialize_event(row: Dict[str, Any]) -> Dict[str, Any]:
+    data = dict(row)
+    if data.get("ip") is not None:
+        data["ip"] = data["ip"].hex()
+    data["occurred_at"] = data["occurred_at"].isoformat()
+    return data
+
+def _deserialize_event(data: Dict[str, Any]) -> Dict[str, Any]:
+    row = dict(data)
+    if row.get("ip") is not None:
+        row["ip"] = bytes.fromhex(row["ip"])
+    row["occurred_at"] = datetime.fromisoformat(row["occurred_at"])
+    return row
+
+# 全域登入稽核事件寫入器
+login_event_sink = LoginEventSink(
+    batch_size=settings.LOGIN_AUDIT_BATCH_SIZE,
+    flush_interval=settings.LOGIN_AUDIT_FLUSH_INTERVAL_SECONDS,
+    max_buffer=settings.LOGIN_AUDIT_MAX_BUFFER,
+    spill_path=settings.LOGIN_AUDIT_SPILL_PATH
+)
@@ -0,0 +1,74 @@
+"""
+進程內快取
+提供帶過期時間的 LRU 快取
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+from app.core.metrics import metrics_registry
+
+CACHE_HITS = metrics_registry.counter("cache_hits_total", "快取命中次數")
+CACHE_MISSES = metrics_registry.counter("cache_misses_total", "快取未命中次數")
+
+class TTLCache:
+    """帶過期時間的 LRU 快取（執行緒安全）"""
+    
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """讀取快取，過期或不存在時返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                CACHE_HITS.inc(cache=self.name)
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+        CACHE_MISSES.inc(cache=self.name)
+        return None
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """寫入快取，可為單筆資料指定較短的存活時間"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def delete(self, key: Hashable):
+        """刪除單筆快取"""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def stats(self) -> Dict[str, Any]:
+        """快取統計"""
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
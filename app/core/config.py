@@ -19,10 +19,146 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     DEBUG: bool = get_config().get("DEBUG", True)
     
+    # 資料庫引擎與連接池（SQLite 不使用連接池參數，MySQL 回收時間取兩者較小值）
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_MYSQL_POOL_RECYCLE_SECONDS: int = 280
+    DB_STATEMENT_CACHE_SIZE: int = 500
+    DB_QUERY_CACHE_SIZE: int = 1200
+    SQLITE_WAL: bool = True
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    
+    # 唯讀副本（逗號分隔的連線 URL，選擇策略 round_robin / least_latency，複寫延遲超過上限時改讀主庫）
+    DATABASE_REPLICA_URLS: List[str] = []
+    REPLICA_SELECTION: str = "round_robin"
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_CHECK_INTERVAL_SECONDS: float = 5.0
+    REPLICA_CHECK_TIMEOUT_SECONDS: float = 2.0
+    
+    # 密碼雜湊執行池
+    PASSWORD_HASH_WORKERS: int = max(1, (os.cpu_count() or 2) // 2)
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+    
+    # 密碼雜湊演算法（pbkdf2_sha256 或 passlib 支援的 argon2 / scrypt / bcrypt），切換後舊雜湊於登入成功時在背景重新雜湊
+    PASSWORD_HASH_SCHEME: str = "pbkdf2_sha256"
+    # PBKDF2 迭代次數（啟動時依目標耗時校準，以此值為下限）
+    PASSWORD_HASH_ITERATIONS: int = 100000
+    PASSWORD_HASH_CALIBRATE_ON_STARTUP: bool = True
+    PASSWORD_HASH_TARGET_MS: float = 100.0
+    PASSWORD_REHASH_QUEUE_SIZE: int = 1000
+    
+    # 用戶批次匯入（雜湊分批送入執行池，並發批數小於 worker 數以保留容量給登入請求）
+    USER_IMPORT_MAX_ROWS: int = 100000
+    USER_IMPORT_HASH_CHUNK_SIZE: int = 50
+    USER_IMPORT_HASH_CONCURRENCY: int = max(1, (os.cpu_count() or 2) // 2 - 1)
+    USER_IMPORT_INSERT_CHUNK_SIZE: int = 1000
+    # 執行池持續忙碌時重試送出雜湊的時間上限，逾時的列標記為失敗
+    USER_IMPORT_HASH_BUSY_TIMEOUT_SECONDS: float = 30.0
+    
+    # 登入識別碼正規化（電話未帶國碼時補上的預設國碼，留空則不接受未帶國碼的電話）
+    PHONE_DEFAULT_COUNTRY_CODE: str = "886"
+    
+    # 已認證使用者 principal 快取
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    
+    # RBAC 權限矩陣與使用者權限遮罩快取
+    PERMISSION_MATRIX_TTL_SECONDS: int = 300
+    PERMISSION_CACHE_TTL_SECONDS: int = 300
+    PERMISSION_CACHE_MAX_SIZE: int = 10000
+    
+    # 跨 worker 快取失效匯流排（local / database / socket）
+    INVALIDATION_BACKEND: str = "local"
+    INVALIDATION_POLL_SECONDS: float = 1.0
+    INVALIDATION_RETENTION_SECONDS: int = 3600
+    INVALIDATION_SOCKET_DIR: str = "/tmp/arfa-cache-invalidation"
+    
+    # JWT 後端與已驗證令牌快取
+    JWT_BACKEND: str = "jose"  # jose / pyjwt
+    TOKEN_CACHE_TTL_SECONDS: int = 300
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    
+    # 登入稽核事件批次寫入
+    LOGIN_AUDIT_BATCH_SIZE: int = 200
+    LOGIN_AUDIT_FLUSH_INTERVAL_SECONDS: float = 1.0
+    LOGIN_AUDIT_MAX_BUFFER: int = 10000
+    # 資料庫不可用時的暫存檔命名基準，每個進程寫入 <名稱>.<主機>-<pid><副檔名>，無法寫入的事件移至 <名稱>.rejected<副檔名>
+    LOGIN_AUDIT_SPILL_PATH: str = "./login_events.spill.ndjson"
+    
+    # 登入節流（滑動視窗失敗次數，超限時於查詢用戶與雜湊前拒絕；backend 為 memory 或 database，多 worker 時使用 database）
+    LOGIN_THROTTLE_ENABLED: bool = True
+    LOGIN_THROTTLE_BACKEND: str = "memory"
+    LOGIN_THROTTLE_WINDOW_SECONDS: int = 300
+    LOGIN_THROTTLE_IP_LIMIT: int = 50
+    LOGIN_THROTTLE_USERNAME_LIMIT: int = 10
+    LOGIN_THROTTLE_IP_USERNAME_LIMIT: int = 5
+    LOGIN_THROTTLE_MAX_KEYS: int = 100000
+    
+    # 會話活動批次寫入與撤銷集合刷新
+    SESSION_ACTIVITY_FLUSH_SECONDS: int = 30
+    SESSION_ACTIVITY_STALENESS_SECONDS: int = 60
+    SESSION_REVOCATION_REFRESH_SECONDS: int = 5
+    # 撤銷集合刷新時往回重疊檢查的時間（涵蓋較晚提交或時鐘較慢主機寫入的 revoked_at）
+    SESSION_REVOCATION_LOOKBACK_SECONDS: int = 300
+    
+    # 刷新令牌（每次使用即輪替；已輪替的令牌再次使用時撤銷整個會話，寬限期內的並發刷新只拒絕不撤銷）
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS: int = 10
+    
+    # 連接測試用外部資料庫引擎快取
+    TEST_ENGINE_MAX_ENGINES: int = 32
+    TEST_ENGINE_IDLE_SECONDS: int = 300
+    TEST_ENGINE_POOL_SIZE: int = 2
+    TEST_ENGINE_MAX_OVERFLOW: int = 2
+    
+    # 批次連接測試
+    CONNECTION_TEST_BATCH_CONCURRENCY: int = 16
+    CONNECTION_TEST_BATCH_MAX_CONFIGS: int = 500
+    CONNECTION_TEST_TIMEOUT_SECONDS: float = 10.0
+    
+    # 資料庫配置密碼加密密鑰（Fernet），未設定時由 SECRET_KEY 推導
+    DATABASE_CONFIG_ENCRYPTION_KEY: str = ""
+    
+    # 背景健康探測
+    PROBER_ENABLED: bool = True
+    PROBER_INTERVAL_SECONDS: int = 300
+    PROBER_MAX_BACKOFF_SECONDS: int = 3600
+    PROBER_JITTER_RATIO: float = 0.2
+    PROBER_CONCURRENCY: int = 8
+    PROBER_BATCH_SIZE: int = 100
+    PROBER_POLL_SECONDS: float = 5.0
+    PROBER_LEASE_SECONDS: int = 300
+    
+    # 連接測試日誌與延遲彙總保留期限（天，0 表示永久保留）
+    # 原始日誌預設永久保留（稽核時需匯出完整歷史），設定天數後由保留期限任務刪除較舊的原始日誌，延遲彙總不受影響
+    CONNECTION_TEST_LOG_RETENTION_DAYS: int = 0
+    ROLLUP_MINUTE_RETENTION_DAYS: int = 7
+    ROLLUP_HOUR_RETENTION_DAYS: int = 90
+    ROLLUP_DAY_RETENTION_DAYS: int = 0
+    ROLLUP_RETENTION_INTERVAL_SECONDS: int = 3600
+    
+    # SQL 日誌：SQL_ECHO 輸出所有語句（僅供本機除錯），慢查詢記錄只記錄超過門檻的語句並依比例抽樣其餘語句
+    SQL_ECHO: bool = False
+    SLOW_QUERY_LOG_ENABLED: bool = True
+    SLOW_QUERY_THRESHOLD_MS: int = 200
+    SLOW_QUERY_SAMPLE_RATE: float = 0.0
+    SLOW_QUERY_TOP_N: int = 50
+    
+    # 請求效能量測（單一請求查詢次數超過門檻時記錄警告，DEBUG 時附加 Server-Timing 標頭）
+    METRICS_ENABLED: bool = True
+    REQUEST_QUERY_WARN_THRESHOLD: int = 20
+    # /metrics 抓取令牌（Authorization: Bearer <令牌>）；未設定時僅限擁有 system.logs 權限的登入用戶
+    METRICS_AUTH_TOKEN: str = ""
+    
+    # 日誌匯出（每批自資料庫游標讀取的資料列數）
+    EXPORT_BATCH_SIZE: int = 1000
+    
     # CORS
     BACKEND_CORS_ORIGINS: List[str] = get_config().get("CORS_ORIGINS", ["http://localhost:3000", "http://localhost:8080"])
     
-    @validator("BACKEND_CORS_ORIGINS", pre=True)
+    @validator("BACKEND_CORS_ORIGINS", "DATABASE_REPLICA_URLS", pre=True)
     def assemble_cors_origins(cls, v: Union[str, List[str]]) -> Union[List[str], str]:
         if isinstance(v, str) and not v.startswith("["):
             return [i.strip() for i in v.split(",")]
@@ -1,23 +1,31 @@
 """
 認證依賴項
 """
+import hmac
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import get_request_db, pin_primary, reads_from_replica
 from app.models.user import User
-from app.core.security import verify_token
+from app.core.security import verify_token, hash_token
+from app.core.session import is_session_valid
+from app.core.principal import UserPrincipal, load_user_principal
+from app.core.permissions import permission_engine
+from app.core.config import settings
 
 # HTTP Bearer 認證
 security = HTTPBearer()
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """獲取當前用戶"""
+    db: AsyncSession = Depends(get_request_db)
+) -> UserPrincipal:
+    """獲取當前用戶（精簡 principal，優先讀取快取）"""
+    # 與端點共用請求範圍的會話：唯讀端點優先讀取副本，寫入端點讀取主庫
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="無效的認證憑證",
@@ -34,19 +42,30 @@ async def get_current_user(
         user_id: int = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-            
+        user_id = int(user_id)
+        # 未帶 sid 的舊令牌以令牌哈希的前32位作為會話ID
+        session_id = payload.get("sid") or hash_token(token)[:32]
+    
     except Exception:
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == user_id).first()
+    # 令牌對應的會話必須存在且未被撤銷；撤銷狀態由記憶體集合判斷，不受副本延遲影響
+    if not await is_session_valid(session_id, db):
+        # 剛建立的會話可能尚未複寫到副本，改查主庫確認
+        if not reads_from_replica(db) or not await is_session_valid(session_id, pin_primary(db)):
+            raise credentials_exception
+    
+    user = await load_user_principal(db, user_id)
+    if user is None and reads_from_replica(db):
+        user = await load_user_principal(pin_primary(db), user_id)
     if user is None:
         raise credentials_exception
     
     return user
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: UserPrincipal = Depends(get_current_user)
+) -> UserPrincipal:
     """獲取當前活躍用戶"""
     if not current_user.is_active:
         raise HTTPException(
@@ -56,8 +75,8 @@ async def get_current_active_user(
     return current_user
 
 async def get_current_verified_user(
-    current_user: User = Depends(get_current_active_user)
-) -> User:
+    current_user: UserPrincipal = Depends(get_current_active_user)
+) -> UserPrincipal:
     """獲取當前已驗證用戶"""
     if not current_user.is_verified:
         raise HTTPException(
@@ -66,6 +85,37 @@ async def get_current_verified_user(
         )
     return current_user
 
+def require_permission(code: str):
+    """要求當前用戶擁有指定權限的依賴項，例如 Depends(require_permission("user.delete"))"""
+    async def dependency(
+        current_user: UserPrincipal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_request_db)
+    ) -> UserPrincipal:
+        if not await permission_engine.has_permission(db, current_user.id, code):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="權限不足"
+            )
+        return current_user
+    return dependency
+
+async def require_metrics_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """要求 /metrics 抓取請求攜帶 METRICS_AUTH_TOKEN"""
+    if not settings.METRICS_AUTH_TOKEN or not hmac.compare_digest(
+        credentials.credentials.encode(), settings.METRICS_AUTH_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="無效的認證憑證",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def metrics_access():
+    """/metrics 的存取依賴項：設定抓取令牌時比對令牌，否則要求 system.logs 權限"""
+    if settings.METRICS_AUTH_TOKEN:
+        return require_metrics_token
+    return require_permission("system.logs")
+
 def check_user_not_locked(user: User) -> bool:
     """檢查用戶是否被鎖定"""
     return not user.is_locked
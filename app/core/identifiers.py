@@ -0,0 +1,83 @@
+"""
+登入識別碼分類與正規化
+將使用者輸入的識別碼判定為郵箱、電話或用戶名，以便只查詢對應的單一索引欄位；
+郵箱以 casefold 正規化，電話正規化為 E.164 格式
+"""
+import enum
+import re
+from typing import Optional, Tuple
+from app.core.config import settings
+
+class IdentifierKind(str, enum.Enum):
+    """識別碼類型"""
+    USERNAME = "username"
+    EMAIL = "email"
+    PHONE = "phone"
+
+_EMAIL_SHAPE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_PHONE_SHAPE = re.compile(r"^\+?[\d\s\-().]+$")
+_PHONE_SEPARATORS = re.compile(r"[\s\-().]")
+
+# E.164 最多 15 位數字；輸入少於 7 位數字時不視為電話（避免將純數字短用戶名誤判）
+PHONE_MIN_INPUT_DIGITS = 7
+PHONE_MIN_DIGITS = 8
+PHONE_MAX_DIGITS = 15
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """郵箱正規化（去除前後空白並 casefold），空值返回 None"""
+    if email is None:
+        return None
+    email = email.strip().casefold()
+    return email or None
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """電話正規化為 E.164（+國碼號碼），無法解析時返回 None"""
+    if phone is None:
+        return None
+    phone = phone.strip()
+    if not phone or not _PHONE_SHAPE.match(phone):
+        return None
+    digits = _PHONE_SEPARATORS.sub("", phone)
+    if sum(char.isdigit() for char in digits) < PHONE_MIN_INPUT_DIGITS:
+        return None
+    if digits.startswith("+"):
+        digits = digits[1:]
+    elif digits.startswith("00"):
+        # 國際冠碼
+        digits = digits[2:]
+    elif settings.PHONE_DEFAULT_COUNTRY_CODE:
+        # 國內號碼：去除長途冠碼 0 後加上預設國碼
+        digits = settings.PHONE_DEFAULT_COUNTRY_CODE + (digits[1:] if digits.startswith("0") else digits)
+    else:
+        return None
+    if not digits.isdigit() or not PHONE_MIN_DIGITS <= len(digits) <= PHONE_MAX_DIGITS:
+        return None
+    return f"+{digits}"
+
+def validate_email(email: Optional[str]) -> Optional[str]:
+    """檢查郵箱格式（批次匯入逐列使用），返回去除前後空白的值，空值返回 None"""
+    if email is None or not email.strip():
+        return None
+    email = email.strip()
+    if not _EMAIL_SHAPE.match(email):
+        raise ValueError("郵箱格式不正確")
+    return email
+
+def validate_phone(phone: Optional[str]) -> Optional[str]:
+    """檢查電話可正規化為 E.164（批次匯入逐列使用），返回去除前後空白的值，空值返回 None"""
+    if phone is None or not phone.strip():
+        return None
+    phone = phone.strip()
+    if normalize_phone(phone) is None:
+        raise ValueError("電話格式不正確")
+    return phone
+
+def classify_identifier(identifier: str) -> Tuple[IdentifierKind, str]:
+    """判定識別碼類型，返回 (類型, 查詢值)；郵箱與電話返回正規化後的值"""
+    identifier = identifier.strip()
+    if _EMAIL_SHAPE.match(identifier):
+        return IdentifierKind.EMAIL, normalize_email(identifier)
+    phone = normalize_phone(identifier)
+    if phone is not None:
+        return IdentifierKind.PHONE, phone
+    return IdentifierKind.USERNAME, identifier
@@ -0,0 +1,124 @@
+"""
+請求層級效能量測
+以 ASGI 中介層記錄各路由延遲、進行中的請求數，並透過 SQLAlchemy 游標事件累計每個請求的資料庫時間與查詢次數，
+同時將每次查詢的耗時交給慢查詢記錄器
+"""
+import contextvars
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.core.query_log import slow_query_log
+
+logger = logging.getLogger(__name__)
+
+REQUEST_DURATION = metrics_registry.histogram(
+    "http_request_duration_seconds", "HTTP 請求處理時間（至回應完成）"
+)
+REQUESTS_IN_FLIGHT = metrics_registry.gauge(
+    "http_requests_in_flight", "正在處理的 HTTP 請求數"
+)
+REQUEST_DB_DURATION = metrics_registry.histogram(
+    "http_request_db_duration_seconds", "每個請求花費在資料庫查詢的時間"
+)
+REQUEST_QUERIES = metrics_registry.histogram(
+    "http_request_db_queries", "每個請求執行的查詢次數",
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200)
+)
+REQUEST_QUERY_EXCESS = metrics_registry.counter(
+    "http_request_excess_queries_total", "查詢次數超過門檻的請求數（可能為 N+1 查詢）"
+)
+
+@dataclass
+class RequestStats:
+    """單一請求的資料庫統計"""
+    
+    db_time: float = 0.0
+    queries: int = 0
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+def current_request_stats() -> Optional[RequestStats]:
+    """目前請求的資料庫統計（不在請求中時為 None）"""
+    return _request_stats.get()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_time += elapsed
+        stats.queries += 1
+    slow_query_log.observe(statement, elapsed)
+
+def _handle_error(exception_context):
+    # 執行失敗時不會觸發 after_cursor_execute，需移除起始時間
+    starts = exception_context.connection.info.get("query_start_time") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def instrument_engine(engine: Engine):
+    """為同步引擎（非同步引擎使用 .sync_engine）掛上查詢計時事件"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+class RequestTimingMiddleware:
+    """記錄每個請求的延遲與資料庫統計，DEBUG 時附加 Server-Timing 標頭"""
+    
+    def __init__(self, app, query_warn_threshold: int = 20, server_timing: bool = False):
+        self.app = app
+        self.query_warn_threshold = query_warn_threshold
+        self.server_timing = server_timing
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start_time = time.perf_counter()
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    elapsed_ms = (time.perf_counter() - start_time) * 1000
+                    timing = (
+                        f'app;dur={elapsed_ms:.1f}, '
+                        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"'
+                    )
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+        
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _request_stats.reset(token)
+            self._record(scope, status_code, time.perf_counter() - start_time, stats)
+    
+    def _record(self, scope, status_code: int, elapsed: float, stats: RequestStats):
+        # 以路由模板為標籤，避免路徑參數造成標籤數量無限增長
+        route = scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        method = scope.get("method", "")
+        REQUEST_DURATION.observe(elapsed, method=method, route=path, status=str(status_code))
+        REQUEST_DB_DURATION.observe(stats.db_time, method=method, route=path)
+        REQUEST_QUERIES.observe(stats.queries, method=method, route=path)
+        if stats.queries > self.query_warn_threshold:
+            REQUEST_QUERY_EXCESS.inc(method=method, route=path)
+            logger.warning("請求執行了 %d 次查詢（可能為 N+1 查詢）: %s %s", stats.queries, method, path)
@@ -0,0 +1,303 @@
+"""
+跨 worker 快取失效匯流排
+服務在資料變更後發布實體變更事件，各進程內快取訂閱主題並清除對應項目；
+事件先在本進程立即分派，再由後端廣播至其他 worker：
+  - local：僅本進程（單 worker）
+  - database：寫入 cache_invalidations 表並輪詢（多主機）
+  - socket：同主機 worker 之間以 Unix datagram socket 互相傳送
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import select, insert, delete, func
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.models.cache_invalidation import CacheInvalidation
+
+logger = logging.getLogger(__name__)
+
+# 實體變更主題
+USER_CHANGED = "user"
+USER_ROLES_CHANGED = "user_roles"
+ROLES_CHANGED = "roles"
+SESSION_REVOKED = "session_revoked"
+DATABASE_CONFIG_CHANGED = "database_config"
+
+INVALIDATIONS_PUBLISHED = metrics_registry.counter(
+    "cache_invalidations_published_total", "發布的快取失效事件數"
+)
+INVALIDATIONS_RECEIVED = metrics_registry.counter(
+    "cache_invalidations_received_total", "自其他 worker 收到的快取失效事件數"
+)
+INVALIDATION_DELAY = metrics_registry.histogram(
+    "cache_invalidation_propagation_seconds", "快取失效事件自發布至其他 worker 套用的延遲",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+INVALIDATION_ERRORS = metrics_registry.counter(
+    "cache_invalidation_errors_total", "快取失效事件處理失敗次數"
+)
+
+# 輪詢時重新檢查最近的 id 範圍：並發交易的自增 id 可能晚於較大的 id 才提交
+POLL_LOOKBACK_IDS = 100
+
+# (主題, 鍵, 發布時間 epoch 秒)
+InvalidationEvent = Tuple[str, Optional[str], float]
+Handler = Callable[[Optional[str]], None]
+
+class InvalidationBackend:
+    """廣播後端介面"""
+    
+    name = "local"
+    
+    def __init__(self):
+        self.origin = f"{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.bus: Optional["InvalidationBus"] = None
+    
+    def publish(self, event: InvalidationEvent):
+        """將事件送往其他 worker（不可阻塞）"""
+    
+    def start(self, bus: "InvalidationBus"):
+        """啟動接收"""
+        self.bus = bus
+    
+    async def stop(self):
+        """停止接收"""
+
+class LocalInvalidationBackend(InvalidationBackend):
+    """僅本進程分派，不廣播"""
+
+class DatabaseInvalidationBackend(InvalidationBackend):
+    """以 cache_invalidations 表傳遞事件，傳遞延遲上限約為兩個輪詢間隔"""
+    
+    name = "database"
+    
+    def __init__(self, poll_interval: float, retention_seconds: float, max_pending: int = 10000):
+        super().__init__()
+        self.poll_interval = poll_interval
+        self.retention = timedelta(seconds=retention_seconds)
+        self.max_pending = max_pending
+        self._pending: List[InvalidationEvent] = []
+        self._last_id: Optional[int] = None
+        self._seen: Set[int] = set()
+        self._last_prune = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    def publish(self, event: InvalidationEvent):
+        # 由背景任務批次寫入；積壓過多時捨棄最舊的事件（快取仍會依 TTL 過期）
+        self._pending.append(event)
+        if len(self._pending) > self.max_pending:
+            del self._pending[:len(self._pending) - self.max_pending]
+            INVALIDATION_ERRORS.inc(backend=self.name, reason="overflow")
+    
+    def start(self, bus: "InvalidationBus"):
+        super().start(bus)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("快取失效事件寫入失敗")
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.flush()
+                await self.poll()
+            except Exception:
+                logger.exception("快取失效事件輪詢失敗")
+                INVALIDATION_ERRORS.inc(backend=self.name, reason="poll")
+            await asyncio.sleep(self.poll_interval)
+    
+    async def flush(self):
+        """以單一多列 INSERT 寫入待廣播的事件"""
+        from app.db import AsyncSessionLocal
+        
+        if not self._pending:
+            return
+        events, self._pending = self._pending, []
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(CacheInvalidation.__table__).values([
+                {
+                    "topic": topic,
+                    "entity_key": key,
+                    "origin": self.origin,
+                    "created_at": datetime.utcfromtimestamp(published_at)
+                }
+                for topic, key, published_at in events
+            ]))
+            await db.commit()
+    
+    async def poll(self):
+        """讀取其他 worker 發布的新事件"""
+        from app.db import AsyncSessionLocal
+        
+        async with AsyncSessionLocal() as db:
+            if self._last_id is None:
+                # 啟動前的事件已反映在資料庫中，從目前位置開始
+                self._last_id = await db.scalar(select(func.max(CacheInvalidation.id))) or 0
+                result = await db.execute(select(CacheInvalidation.id).where(
+                    CacheInvalidation.id > self._last_id - POLL_LOOKBACK_IDS
+                ))
+                self._seen = set(result.scalars().all())
+                return
+            result = await db.execute(
+                select(CacheInvalidation.id, CacheInvalidation.topic, CacheInvalidation.entity_key,
+                       CacheInvalidation.origin, CacheInvalidation.created_at)
+                .where(CacheInvalidation.id > self._last_id - POLL_LOOKBACK_IDS)
+                .order_by(CacheInvalidation.id)
+            )
+            rows = [row for row in result.all() if row.id not in self._seen]
+            if rows:
+                self._last_id = max(self._last_id, rows[-1].id)
+                self._seen.update(row.id for row in rows)
+                self._seen = {row_id for row_id in self._seen if row_id > self._last_id - POLL_LOOKBACK_IDS}
+                now = datetime.utcnow()
+                for row in rows:
+                    if row.origin == self.origin:
+                        continue
+                    INVALIDATION_DELAY.observe(max(0.0, (now - row.created_at).total_seconds()))
+                    self.bus.dispatch(row.topic, row.entity_key, remote=True)
+            
+            if time.monotonic() - self._last_prune > self.retention.total_seconds() / 10:
+                self._last_prune = time.monotonic()
+                await db.execute(delete(CacheInvalidation).where(
+                    CacheInvalidation.created_at < datetime.utcnow() - self.retention
+                ))
+                await db.commit()
+
+class SocketInvalidationBackend(InvalidationBackend):
+    """同主機 worker 之間以 Unix datagram socket 廣播，每個 worker 在共用目錄綁定一個 socket"""
+    
+    name = "socket"
+    
+    def __init__(self, socket_dir: str):
+        super().__init__()
+        self.socket_dir = socket_dir
+        self.path = os.path.join(socket_dir, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        self._socket: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def publish(self, event: InvalidationEvent):
+        if self._socket is None:
+            return
+        payload = json.dumps(event, separators=(",", ":")).encode("utf-8")
+        for peer in glob.glob(os.path.join(self.socket_dir, "*.sock")):
+            if peer == self.path:
+                continue
+            try:
+                self._socket.sendto(payload, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # 已結束的 worker 遺留的 socket 檔
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            except (BlockingIOError, OSError):
+                INVALIDATION_ERRORS.inc(backend=self.name, reason="send")
+    
+    def start(self, bus: "InvalidationBus"):
+        super().start(bus)
+        if self._socket is not None:
+            return
+        os.makedirs(self.socket_dir, exist_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.path)
+        sock.setblocking(False)
+        self._socket = sock
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(sock.fileno(), self._receive)
+    
+    async def stop(self):
+        sock, self._socket = self._socket, None
+        if sock is None:
+            return
+        self._loop.remove_reader(sock.fileno())
+        sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+    
+    def _receive(self):
+        while True:
+            try:
+                payload = self._socket.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                topic, key, published_at = json.loads(payload)
+            except (ValueError, TypeError):
+                INVALIDATION_ERRORS.inc(backend=self.name, reason="decode")
+                continue
+            INVALIDATION_DELAY.observe(max(0.0, time.time() - published_at))
+            self.bus.dispatch(topic, key, remote=True)
+
+class InvalidationBus:
+    """快取失效匯流排"""
+    
+    def __init__(self, backend: InvalidationBackend):
+        self.backend = backend
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+    
+    def subscribe(self, topic: str, handler: Handler):
+        """訂閱主題，handler 收到實體鍵（None 表示整個主題失效）"""
+        self._handlers[topic].append(handler)
+    
+    def publish(self, topic: str, key=None):
+        """發布實體變更：立即套用於本進程，並廣播至其他 worker"""
+        key = None if key is None else str(key)
+        INVALIDATIONS_PUBLISHED.inc(topic=topic)
+        self.dispatch(topic, key)
+        self.backend.publish((topic, key, time.time()))
+    
+    def dispatch(self, topic: str, key: Optional[str], remote: bool = False):
+        """呼叫主題的訂閱者"""
+        if remote:
+            INVALIDATIONS_RECEIVED.inc(topic=topic, backend=self.backend.name)
+        for handler in self._handlers.get(topic, ()):
+            try:
+                handler(key)
+            except Exception:
+                logger.exception("快取失效處理失敗: %s %s", topic, key)
+                INVALIDATION_ERRORS.inc(backend=self.backend.name, reason="handler")
+    
+    def start(self):
+        """啟動後端接收"""
+        self.backend.start(self)
+    
+    async def stop(self):
+        """停止後端接收"""
+        await self.backend.stop()
+
+def create_backend(name: str) -> InvalidationBackend:
+    """依設定建立廣播後端"""
+    if name == "database":
+        return DatabaseInvalidationBackend(
+            poll_interval=settings.INVALIDATION_POLL_SECONDS,
+            retention_seconds=settings.INVALIDATION_RETENTION_SECONDS
+        )
+    if name == "socket":
+        return SocketInvalidationBackend(settings.INVALIDATION_SOCKET_DIR)
+    if name == "local":
+        return LocalInvalidationBackend()
+    raise ValueError(f"不支援的快取失效後端: {name}")
+
+# 全域快取失效匯流排
+invalidation_bus = InvalidationBus(create_backend(settings.INVALIDATION_BACKEND))
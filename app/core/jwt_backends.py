@@ -0,0 +1,72 @@
+"""
+JWT 編解碼後端
+預設使用 python-jose，可透過 JWT_BACKEND 設定切換為 PyJWT
+"""
+from typing import Any, Dict, List
+
+class InvalidTokenError(Exception):
+    """令牌無效（簽章、格式或過期）"""
+
+class JWTBackend:
+    """JWT 後端基礎類"""
+    
+    name = "base"
+    
+    def encode(self, claims: Dict[str, Any], key: str, algorithm: str) -> str:
+        raise NotImplementedError
+    
+    def decode(self, token: str, key: str, algorithms: List[str]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+class JoseJWTBackend(JWTBackend):
+    """python-jose 後端"""
+    
+    name = "jose"
+    
+    def __init__(self):
+        from jose import JWTError, jwt
+        self._jwt = jwt
+        self._error = JWTError
+    
+    def encode(self, claims: Dict[str, Any], key: str, algorithm: str) -> str:
+        return self._jwt.encode(claims, key, algorithm=algorithm)
+    
+    def decode(self, token: str, key: str, algorithms: List[str]) -> Dict[str, Any]:
+        try:
+            return self._jwt.decode(token, key, algorithms=algorithms)
+        except self._error as e:
+            raise InvalidTokenError(str(e)) from e
+
+class PyJWTBackend(JWTBackend):
+    """PyJWT 後端（需額外安裝 PyJWT）"""
+    
+    name = "pyjwt"
+    
+    def __init__(self):
+        import jwt
+        self._jwt = jwt
+        self._error = jwt.PyJWTError
+    
+    def encode(self, claims: Dict[str, Any], key: str, algorithm: str) -> str:
+        return self._jwt.encode(claims, key, algorithm=algorithm)
+    
+    def decode(self, token: str, key: str, algorithms: List[str]) -> Dict[str, Any]:
+        try:
+            return self._jwt.decode(token, key, algorithms=algorithms)
+        except self._error as e:
+            raise InvalidTokenError(str(e)) from e
+
+JWT_BACKENDS = {
+    JoseJWTBackend.name: JoseJWTBackend,
+    PyJWTBackend.name: PyJWTBackend,
+}
+
+def get_jwt_backend(name: str) -> JWTBackend:
+    """依名稱創建 JWT 後端"""
+    backend_class = JWT_BACKENDS.get(name.lower())
+    if backend_class is None:
+        raise ValueError(f"不支援的 JWT 後端: {name}")
+    try:
+        return backend_class()
+    except ImportError as e:
+        raise ValueError(f"JWT 後端 {name} 所需套件未安裝: {e}") from e
@@ -0,0 +1,235 @@
+"""
+登入節流
+以滑動視窗計數 IP、識別碼與 (IP, 識別碼) 的登入失敗次數，超過上限的嘗試在查詢用戶與
+密碼雜湊之前即被拒絕；視窗計數以前後兩個固定視窗加權估計：
+  - memory：本進程記憶體（單 worker）
+  - database：login_throttle_counters 表，以原子遞增維護（多 worker 共用）
+"""
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from app.core.config import settings
+from app.core.identifiers import classify_identifier
+from app.core.metrics import metrics_registry
+from app.models.login_throttle import LoginThrottleCounter
+
+logger = logging.getLogger(__name__)
+
+LOGIN_THROTTLED = metrics_registry.counter(
+    "login_throttled_total", "因登入失敗次數超限而被拒絕的登入嘗試數"
+)
+
+class LoginThrottledError(RuntimeError):
+    """登入嘗試次數超過上限"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__("登入嘗試次數過多，請稍後再試")
+        self.retry_after = retry_after
+
+# (範圍, 雜湊鍵, 上限)
+ThrottleKey = Tuple[str, str, int]
+
+class ThrottleBackend:
+    """計數後端介面"""
+    
+    name = "memory"
+    
+    def __init__(self, window: int):
+        self.window = window
+    
+    async def get(self, keys: List[str], windows: Tuple[int, int]) -> Dict[Tuple[str, int], int]:
+        """讀取各鍵在前一與目前視窗的計數"""
+        raise NotImplementedError
+    
+    async def increment(self, keys: List[str], window_start: int):
+        """各鍵在目前視窗的計數加一"""
+        raise NotImplementedError
+    
+    async def reset(self, keys: List[str]):
+        """清除各鍵的計數"""
+        raise NotImplementedError
+
+class MemoryThrottleBackend(ThrottleBackend):
+    """本進程記憶體計數，鍵數超過上限時淘汰最久未更新的鍵"""
+    
+    def __init__(self, window: int, max_keys: int):
+        super().__init__(window)
+        self.max_keys = max(1, max_keys)
+        self._counters: "OrderedDict[str, Dict[int, int]]" = OrderedDict()
+    
+    async def get(self, keys: List[str], windows: Tuple[int, int]) -> Dict[Tuple[str, int], int]:
+        counts = {}
+        for key in keys:
+            counter = self._counters.get(key, {})
+            for window_start in windows:
+                counts[(key, window_start)] = counter.get(window_start, 0)
+        return counts
+    
+    async def increment(self, keys: List[str], window_start: int):
+        for key in keys:
+            counter = self._counters.pop(key, {})
+            # 只需保留前一與目前視窗
+            counter = {start: count for start, count in counter.items() if start >= window_start - self.window}
+            counter[window_start] = counter.get(window_start, 0) + 1
+            self._counters[key] = counter
+        while len(self._counters) > self.max_keys:
+            self._counters.popitem(last=False)
+    
+    async def reset(self, keys: List[str]):
+        for key in keys:
+            self._counters.pop(key, None)
+
+class DatabaseThrottleBackend(ThrottleBackend):
+    """以 login_throttle_counters 表計數，過期視窗定期清除"""
+    
+    name = "database"
+    
+    def __init__(self, window: int):
+        super().__init__(window)
+        self._last_prune = 0.0
+    
+    async def get(self, keys: List[str], windows: Tuple[int, int]) -> Dict[Tuple[str, int], int]:
+        from app.db import AsyncSessionLocal
+        
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(LoginThrottleCounter.throttle_key, LoginThrottleCounter.window_start, LoginThrottleCounter.attempts)
+                .where(LoginThrottleCounter.throttle_key.in_(keys), LoginThrottleCounter.window_start.in_(windows))
+            )
+            return {(key, window_start): attempts for key, window_start, attempts in result.all()}
+    
+    async def increment(self, keys: List[str], window_start: int):
+        from app.db import AsyncSessionLocal
+        
+        async with AsyncSessionLocal() as db:
+            for key in keys:
+                for _ in range(2):
+                    result = await db.execute(
+                        update(LoginThrottleCounter)
+                        .where(LoginThrottleCounter.throttle_key == key, LoginThrottleCounter.window_start == window_start)
+                        .values(attempts=LoginThrottleCounter.attempts + 1)
+                        .execution_options(synchronize_session=False)
+                    )
+                    if result.rowcount:
+                        break
+                    # 並發建立時以先寫入者為準，再以 UPDATE 遞增
+                    try:
+                        async with db.begin_nested():
+                            db.add(LoginThrottleCounter(throttle_key=key, window_start=window_start, attempts=1))
+                        break
+                    except IntegrityError:
+                        continue
+            await db.commit()
+            
+            if time.time() - self._last_prune >= self.window:
+                self._last_prune = time.time()
+                await db.execute(
+                    delete(LoginThrottleCounter)
+                    .where(LoginThrottleCounter.window_start < window_start - self.window)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+    
+    async def reset(self, keys: List[str]):
+        from app.db import AsyncSessionLocal
+        
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(LoginThrottleCounter)
+                .where(LoginThrottleCounter.throttle_key.in_(keys))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+class LoginThrottle:
+    """登入失敗滑動視窗節流"""
+    
+    def __init__(self, backend: ThrottleBackend, enabled: bool, ip_limit: int, username_limit: int,
+                 ip_username_limit: int):
+        self.backend = backend
+        self.enabled = enabled
+        self.window = backend.window
+        self.ip_limit = ip_limit
+        self.username_limit = username_limit
+        self.ip_username_limit = ip_username_limit
+    
+    def _keys(self, ip_address: Optional[str], identifier: str) -> List[ThrottleKey]:
+        """各範圍的鍵；識別碼先正規化，大小寫或格式不同的同一郵箱/電話共用計數"""
+        _, normalized = classify_identifier(identifier)
+        scopes = [("username", normalized, self.username_limit)]
+        if ip_address:
+            scopes.append(("ip", ip_address, self.ip_limit))
+            scopes.append(("ip_username", f"{ip_address}|{normalized}", self.ip_username_limit))
+        return [
+            (scope, hashlib.sha256(f"{scope}:{value}".encode()).hexdigest(), limit)
+            for scope, value, limit in scopes
+        ]
+    
+    def _windows(self, now: float) -> Tuple[int, int]:
+        current = int(now // self.window * self.window)
+        return current - self.window, current
+    
+    async def check(self, ip_address: Optional[str], identifier: str):
+        """任一範圍的估計失敗次數已達上限時拋出 LoginThrottledError"""
+        if not self.enabled:
+            return
+        keys = self._keys(ip_address, identifier)
+        now = time.time()
+        previous, current = self._windows(now)
+        try:
+            counts = await self.backend.get([key for _, key, _ in keys], (previous, current))
+        except Exception as e:
+            # 計數後端不可用時不阻擋登入（帳號鎖定仍然有效）
+            logger.warning("登入節流計數讀取失敗: %s", e)
+            return
+        
+        # 前一視窗的計數依尚未滑出的比例加權
+        weight = 1 - (now - current) / self.window
+        for scope, key, limit in keys:
+            estimate = counts.get((key, previous), 0) * weight + counts.get((key, current), 0)
+            if estimate >= limit:
+                LOGIN_THROTTLED.inc(scope=scope)
+                raise LoginThrottledError(max(1, math.ceil(current + self.window - now)))
+    
+    async def record_failure(self, ip_address: Optional[str], identifier: str):
+        """記錄一次登入失敗"""
+        if not self.enabled:
+            return
+        _, current = self._windows(time.time())
+        try:
+            await self.backend.increment([key for _, key, _ in self._keys(ip_address, identifier)], current)
+        except Exception as e:
+            logger.warning("登入節流計數寫入失敗: %s", e)
+    
+    async def reset(self, ip_address: Optional[str], identifier: str):
+        """登入成功後清除該識別碼的計數（IP 計數保留）"""
+        if not self.enabled:
+            return
+        keys = [key for scope, key, _ in self._keys(ip_address, identifier) if scope != "ip"]
+        try:
+            await self.backend.reset(keys)
+        except Exception as e:
+            logger.warning("登入節流計數清除失敗: %s", e)
+
+def create_backend(name: str) -> ThrottleBackend:
+    """依設定建立計數後端"""
+    window = max(1, settings.LOGIN_THROTTLE_WINDOW_SECONDS)
+    if name == "database":
+        return DatabaseThrottleBackend(window)
+    if name == "memory":
+        return MemoryThrottleBackend(window, settings.LOGIN_THROTTLE_MAX_KEYS)
+    raise ValueError(f"不支援的登入節流後端: {name}")
+
+# 全域登入節流
+login_throttle = LoginThrottle(
+    create_backend(settings.LOGIN_THROTTLE_BACKEND),
+    enabled=settings.LOGIN_THROTTLE_ENABLED,
+    ip_limit=settings.LOGIN_THROTTLE_IP_LIMIT,
+    username_limit=settings.LOGIN_THROTTLE_USERNAME_LIMIT,
+    ip_username_limit=settings.LOGIN_THROTTLE_IP_USERNAME_LIMIT
+)
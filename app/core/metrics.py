@@ -0,0 +1,192 @@
+"""
+進程內效能指標
+提供計數器、儀表與直方圖，供各模組記錄執行狀況
+"""
+import math
+import threading
+from typing import Dict, Tuple, List, Optional
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# 預設直方圖分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    """將標籤轉為可雜湊的鍵"""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Metric:
+    """指標基礎類"""
+    
+    type_name = "untyped"
+    
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+
+class Counter(Metric):
+    """單調遞增計數器"""
+    
+    type_name = "counter"
+    
+    def __init__(self, name: str, description: str):
+        super().__init__(name, description)
+        self._values: Dict[LabelKey, float] = {}
+    
+    def inc(self, amount: float = 1, **labels):
+        """增加計數"""
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def get(self, **labels) -> float:
+        """獲取目前計數"""
+        return self._values.get(_label_key(labels), 0)
+    
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        """輸出所有樣本"""
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+class Gauge(Metric):
+    """可增可減的儀表"""
+    
+    type_name = "gauge"
+    
+    def __init__(self, name: str, description: str):
+        super().__init__(name, description)
+        self._values: Dict[LabelKey, float] = {}
+    
+    def set(self, value: float, **labels):
+        """設置數值"""
+        with self._lock:
+            self._values[_label_key(labels)] = value
+    
+    def inc(self, amount: float = 1, **labels):
+        """增加數值"""
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount: float = 1, **labels):
+        """減少數值"""
+        self.inc(-amount, **labels)
+    
+    def get(self, **labels) -> float:
+        """獲取目前數值"""
+        return self._values.get(_label_key(labels), 0)
+    
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        """輸出所有樣本"""
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+class Histogram(Metric):
+    """累積分桶直方圖"""
+    
+    type_name = "histogram"
+    
+    def __init__(self, name: str, description: str, buckets: Optional[Tuple[float, ...]] = None):
+        super().__init__(name, description)
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        # 每組標籤: [各分桶計數..., +Inf 計數, 總和]
+        self._values: Dict[LabelKey, List[float]] = {}
+    
+    def observe(self, value: float, **labels):
+        """記錄一次觀測值"""
+        key = _label_key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = [0] * (len(self.buckets) + 2)
+                self._values[key] = data
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[index] += 1
+            data[-2] += 1
+            data[-1] += value
+    
+    def count(self, **labels) -> int:
+        """獲取觀測次數"""
+        data = self._values.get(_label_key(labels))
+        return int(data[-2]) if data else 0
+    
+    def total(self, **labels) -> float:
+        """獲取觀測值總和"""
+        data = self._values.get(_label_key(labels))
+        return data[-1] if data else 0.0
+    
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        """輸出所有樣本（Prometheus 直方圖格式）"""
+        result = []
+        with self._lock:
+            for key, data in self._values.items():
+                for index, bound in enumerate(self.buckets):
+                    result.append((f"{self.name}_bucket", key + (("le", repr(bound)),), data[index]))
+                result.append((f"{self.name}_bucket", key + (("le", "+Inf"),), data[-2]))
+                result.append((f"{self.name}_count", key, data[-2]))
+                result.append((f"{self.name}_sum", key, data[-1]))
+        return result
+
+class MetricsRegistry:
+    """指標註冊表"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+    
+    def _get_or_create(self, cls, name: str, description: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, description, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指標 {name} 已以其他類型註冊")
+            return metric
+    
+    def counter(self, name: str, description: str) -> Counter:
+        """獲取或創建計數器"""
+        return self._get_or_create(Counter, name, description)
+    
+    def gauge(self, name: str, description: str) -> Gauge:
+        """獲取或創建儀表"""
+        return self._get_or_create(Gauge, name, description)
+    
+    def histogram(self, name: str, description: str, buckets: Optional[Tuple[float, ...]] = None) -> Histogram:
+        """獲取或創建直方圖"""
+        return self._get_or_create(Histogram, name, description, buckets=buckets)
+    
+    def all(self) -> List[Metric]:
+        """獲取所有已註冊指標"""
+        with self._lock:
+            return list(self._metrics.values())
+    
+    def render_prometheus(self) -> str:
+        """輸出 Prometheus 文字格式"""
+        lines = []
+        for metric in sorted(self.all(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.description)}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, key, value in metric.samples():
+                if key:
+                    labels = ",".join(f'{k}="{_escape_label(v)}"' for k, v in key)
+                    lines.append(f"{name}{{{labels}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if math.isfinite(value) and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+# 全域指標註冊表
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,48 @@
+"""
+游標分頁工具
+游標為排序鍵值的 base64 JSON，客戶端只需原樣帶回，不應解析其內容
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+from fastapi import Response
+
+# 無法在回應本體中附帶游標的列表端點，改以此標頭返回下一頁游標
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# 整數排序鍵的可接受範圍（BIGINT）
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """將排序鍵值編碼為不透明的分頁游標"""
+    payload = [{"dt": value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> List[Any]:
+    """解碼分頁游標並檢查各值符合排序鍵的型別（int、datetime 或 str），格式錯誤時拋出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(types):
+            raise ValueError
+        values = [datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value for value in payload]
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise ValueError("無效的分頁游標")
+    # 型別不符的值送到資料庫會造成查詢錯誤（例如 PostgreSQL 的 DataError），在此即拒絕
+    if not all(_matches_type(value, expected) for value, expected in zip(values, types)):
+        raise ValueError("無效的分頁游標")
+    return values
+
+def _matches_type(value: Any, expected: type) -> bool:
+    if expected is int:
+        return isinstance(value, int) and not isinstance(value, bool) and INT64_MIN <= value <= INT64_MAX
+    return isinstance(value, expected)
+
+def set_next_cursor(response: Optional[Response], next_cursor: Optional[str]):
+    """將下一頁游標寫入回應標頭"""
+    if response is not None and next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
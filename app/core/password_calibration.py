@@ -0,0 +1,62 @@
+"""
+PBKDF2 迭代次數校準
+量測本機的雜湊耗時，選出最接近目標耗時的迭代次數（不低於設定的下限）；
+可於啟動時自動校準，或以 CLI 量測後寫入 PASSWORD_HASH_ITERATIONS
+
+用法:
+    python -m app.core.password_calibration [目標毫秒數]
+"""
+import logging
+import time
+from app.core.config import settings
+from app.core.security import (
+    PBKDF2_SCHEME, create_password_hash, generate_salt, hash_password_with_salt, password_hash_policy
+)
+
+logger = logging.getLogger(__name__)
+
+# 試算用的迭代次數與量測次數（取最小值以排除排程干擾）
+PROBE_ITERATIONS = 20000
+SAMPLES = 3
+# 迭代次數取整的單位，讓各 worker 的校準結果一致，減少重新雜湊
+ITERATION_STEP = 10000
+
+def measure(iterations: int, samples: int = SAMPLES) -> float:
+    """量測單次 PBKDF2 雜湊耗時（秒）"""
+    salt = generate_salt()
+    durations = []
+    for _ in range(samples):
+        start_time = time.perf_counter()
+        hash_password_with_salt("calibration", salt, iterations)
+        durations.append(time.perf_counter() - start_time)
+    return min(durations)
+
+def calibrate(target_ms: float, minimum: int) -> int:
+    """返回單次雜湊約耗時 target_ms 毫秒的迭代次數"""
+    # PBKDF2 耗時與迭代次數成正比，以試算結果推估後再量測修正一次
+    estimate = int(PROBE_ITERATIONS * target_ms / 1000 / measure(PROBE_ITERATIONS))
+    estimate = max(ITERATION_STEP, estimate)
+    iterations = int(estimate * target_ms / 1000 / measure(estimate))
+    return max(minimum, iterations // ITERATION_STEP * ITERATION_STEP)
+
+def calibrate_password_hashing():
+    """依設定校準目前使用的迭代次數（僅 PBKDF2）"""
+    if password_hash_policy.scheme != PBKDF2_SCHEME or not settings.PASSWORD_HASH_CALIBRATE_ON_STARTUP:
+        return
+    iterations = calibrate(settings.PASSWORD_HASH_TARGET_MS, settings.PASSWORD_HASH_ITERATIONS)
+    password_hash_policy.iterations = iterations
+    logger.info("PBKDF2 迭代次數校準為 %d（目標 %.0f 毫秒）", iterations, settings.PASSWORD_HASH_TARGET_MS)
+
+if __name__ == "__main__":
+    import sys
+    
+    target_ms = float(sys.argv[1]) if len(sys.argv) > 1 else settings.PASSWORD_HASH_TARGET_MS
+    if password_hash_policy.scheme == PBKDF2_SCHEME:
+        iterations = calibrate(target_ms, settings.PASSWORD_HASH_ITERATIONS)
+        print(f"目標耗時: {target_ms:.0f} ms")
+        print(f"建議迭代次數: PASSWORD_HASH_ITERATIONS={iterations}（實測 {measure(iterations) * 1000:.1f} ms）")
+    else:
+        # passlib 演算法的成本參數由 pwd_context 管理，此處只量測耗時
+        start_time = time.perf_counter()
+        create_password_hash("calibration")
+        print(f"{password_hash_policy.scheme} 單次雜湊耗時: {(time.perf_counter() - start_time) * 1000:.1f} ms")
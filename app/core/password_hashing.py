@@ -0,0 +1,88 @@
+"""
+密碼雜湊執行池
+將 PBKDF2 等 CPU 密集的雜湊計算移出事件循環，並限制排隊長度
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+
+# 雜湊相關指標
+HASH_QUEUE_DEPTH = metrics_registry.gauge(
+    "password_hash_queue_depth", "等待或正在執行的密碼雜湊任務數"
+)
+HASH_LATENCY = metrics_registry.histogram(
+    "password_hash_duration_seconds", "單次密碼雜湊耗時（含排隊）"
+)
+HASH_REJECTED = metrics_registry.counter(
+    "password_hash_rejected_total", "因執行池飽和而被拒絕的雜湊任務數"
+)
+
+class PasswordHashingBusyError(RuntimeError):
+    """雜湊執行池已飽和"""
+
+class PasswordHashingPool:
+    """有界的密碼雜湊進程池"""
+    
+    def __init__(self, max_workers: int, queue_size: int):
+        self.max_workers = max(1, max_workers)
+        # 可同時存在的任務上限 = 執行中 + 排隊中
+        self.max_pending = self.max_workers + max(0, queue_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def pending(self) -> int:
+        """目前等待或正在執行的任務數"""
+        return self._pending
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """延遲創建進程池，避免在匯入時啟動子進程"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+    
+    def _acquire(self):
+        """佔用一個排隊名額，已滿時拋出 PasswordHashingBusyError"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                HASH_REJECTED.inc()
+                raise PasswordHashingBusyError("密碼雜湊服務忙碌中，請稍後再試")
+            self._pending += 1
+            HASH_QUEUE_DEPTH.set(self._pending)
+    
+    def _release(self):
+        """釋放排隊名額"""
+        with self._lock:
+            self._pending -= 1
+            HASH_QUEUE_DEPTH.set(self._pending)
+    
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """在進程池中執行雜湊函數"""
+        self._acquire()
+        start_time = time.perf_counter()
+        try:
+            future = self._get_executor().submit(func, *args)
+            return await asyncio.wrap_future(future)
+        finally:
+            HASH_LATENCY.observe(time.perf_counter() - start_time)
+            self._release()
+    
+    def shutdown(self):
+        """關閉進程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+# 全域雜湊執行池
+password_hashing_pool = PasswordHashingPool(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    queue_size=settings.PASSWORD_HASH_QUEUE_SIZE
+)
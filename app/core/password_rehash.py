@@ -0,0 +1,99 @@
+"""
+登入後背景重新雜湊
+登入成功時若密碼雜湊使用過時的演算法或迭代次數，只將明文放入有界佇列，
+由背景任務在雜湊執行池中重新計算並寫回，不增加登入請求的延遲
+"""
+import asyncio
+import logging
+from typing import Optional, Tuple
+from sqlalchemy import update
+from app.core.config import settings
+from app.core.invalidation import invalidation_bus, USER_CHANGED
+from app.core.metrics import metrics_registry
+from app.core.password_hashing import password_hashing_pool, PasswordHashingBusyError
+from app.core.security import create_password_hash, password_hash_policy
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_REHASHED = metrics_registry.counter(
+    "password_rehash_total", "登入後重新雜湊的密碼數"
+)
+PASSWORD_REHASH_SKIPPED = metrics_registry.counter(
+    "password_rehash_skipped_total", "因佇列已滿、執行池忙碌或密碼已變更而略過的重新雜湊數"
+)
+
+class PasswordRehasher:
+    """登入後背景重新雜湊"""
+    
+    def __init__(self, queue_size: int):
+        self.queue_size = max(1, queue_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def submit(self, user_id: int, password: str, password_hash: bytes, iterations: int):
+        """登入成功後呼叫，雜湊參數過時時排入佇列（不等待）"""
+        if self._queue is None or not password_hash_policy.needs_rehash(password_hash, iterations):
+            return
+        try:
+            self._queue.put_nowait((user_id, password, password_hash))
+        except asyncio.QueueFull:
+            # 下次登入時再重新雜湊
+            PASSWORD_REHASH_SKIPPED.inc(reason="queue_full")
+    
+    def start(self):
+        """啟動背景任務"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """停止背景任務（佇列中尚未處理的項目於下次登入時再處理）"""
+        task, self._task = self._task, None
+        self._queue = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    async def _run(self):
+        queue = self._queue
+        while True:
+            item = await queue.get()
+            try:
+                await self.rehash(*item)
+            except Exception:
+                logger.exception("密碼重新雜湊失敗")
+    
+    async def rehash(self, user_id: int, password: str, old_hash: bytes):
+        """重新雜湊並寫回（密碼已在期間變更時不覆寫）"""
+        from app.db import AsyncSessionLocal
+        
+        try:
+            new_hash: Tuple[bytes, bytes, int] = await password_hashing_pool.run(
+                create_password_hash, password, password_hash_policy.iterations
+            )
+        except PasswordHashingBusyError:
+            # 執行池留給登入請求使用
+            PASSWORD_REHASH_SKIPPED.inc(reason="busy")
+            return
+        
+        password_hash, password_salt, password_iters = new_hash
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(User.__table__)
+                .where(User.id == user_id, User.password_hash == old_hash)
+                .values(password_hash=password_hash, password_salt=password_salt, password_iters=password_iters)
+            )
+            await db.commit()
+        if result.rowcount:
+            PASSWORD_REHASHED.inc()
+            invalidation_bus.publish(USER_CHANGED, user_id)
+        else:
+            PASSWORD_REHASH_SKIPPED.inc(reason="changed")
+
+# 全域背景重新雜湊器
+password_rehasher = PasswordRehasher(queue_size=settings.PASSWORD_REHASH_QUEUE_SIZE)
@@ -0,0 +1,107 @@
+"""
+RBAC 權限引擎
+將角色→權限編譯為位元集合，並快取每位使用者的有效權限遮罩，權限檢查直接於記憶體中完成
+"""
+import time
+from typing import Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.invalidation import invalidation_bus, USER_ROLES_CHANGED, ROLES_CHANGED
+from app.core.metrics import metrics_registry
+from app.models.role import Role
+from app.models.permission import Permission
+from app.models.role_permission import RolePermission
+from app.models.user_role import UserRole
+
+MATRIX_RELOADS = metrics_registry.counter(
+    "permission_matrix_reloads_total", "權限矩陣重新編譯次數"
+)
+
+class PermissionEngine:
+    """角色權限矩陣與使用者權限遮罩快取"""
+    
+    def __init__(self, matrix_ttl: float, user_cache_size: int, user_cache_ttl: float):
+        self.matrix_ttl = matrix_ttl
+        self._bits: Dict[str, int] = {}
+        self._role_masks: Dict[int, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._version = 0
+        self._user_masks = TTLCache("user_permissions", maxsize=user_cache_size, ttl=user_cache_ttl)
+    
+    @property
+    def is_loaded(self) -> bool:
+        """權限矩陣是否已編譯且未過期"""
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.matrix_ttl
+    
+    async def load(self, db: AsyncSession):
+        """讀取權限與角色權限關聯，編譯為位元集合"""
+        result = await db.execute(select(Permission.id, Permission.code).order_by(Permission.id))
+        bits: Dict[str, int] = {}
+        permission_bits: Dict[int, int] = {}
+        for index, row in enumerate(result.all()):
+            bits[row.code] = permission_bits[row.id] = index
+        
+        # 停用的角色不授予任何權限
+        result = await db.execute(
+            select(RolePermission.role_id, RolePermission.permission_id)
+            .join(Role, Role.id == RolePermission.role_id)
+            .where(Role.status == 1)
+        )
+        role_masks: Dict[int, int] = {}
+        for row in result.all():
+            bit = permission_bits.get(row.permission_id)
+            if bit is not None:
+                role_masks[row.role_id] = role_masks.get(row.role_id, 0) | (1 << bit)
+        
+        self._bits = bits
+        self._role_masks = role_masks
+        self._version += 1
+        self._loaded_at = time.monotonic()
+        # 位元配置可能已改變，舊的使用者遮罩全部失效
+        self._user_masks.clear()
+        MATRIX_RELOADS.inc()
+    
+    async def get_user_mask(self, db: AsyncSession, user_id: int) -> int:
+        """獲取使用者的有效權限遮罩（所有角色遮罩的聯集）"""
+        # 並發請求可能重複編譯，結果相同，不需加鎖
+        if not self.is_loaded:
+            await self.load(db)
+        
+        cached = self._user_masks.get(user_id)
+        if cached is not None and cached[0] == self._version:
+            return cached[1]
+        
+        version = self._version
+        result = await db.execute(select(UserRole.role_id).where(UserRole.user_id == user_id))
+        mask = 0
+        for role_id in result.scalars().all():
+            mask |= self._role_masks.get(role_id, 0)
+        self._user_masks.set(user_id, (version, mask))
+        return mask
+    
+    async def has_permission(self, db: AsyncSession, user_id: int, code: str) -> bool:
+        """檢查使用者是否擁有權限"""
+        mask = await self.get_user_mask(db, user_id)
+        bit = self._bits.get(code)
+        return bit is not None and bool(mask >> bit & 1)
+    
+    def invalidate_user(self, user_id: int):
+        """使用者角色變更後清除其權限遮罩"""
+        self._user_masks.delete(user_id)
+    
+    def invalidate_all(self):
+        """角色或角色權限變更後，於下次檢查時重新編譯矩陣"""
+        self._loaded_at = None
+        self._user_masks.clear()
+
+# 全域權限引擎
+permission_engine = PermissionEngine(
+    matrix_ttl=settings.PERMISSION_MATRIX_TTL_SECONDS,
+    user_cache_size=settings.PERMISSION_CACHE_MAX_SIZE,
+    user_cache_ttl=settings.PERMISSION_CACHE_TTL_SECONDS
+)
+
+invalidation_bus.subscribe(USER_ROLES_CHANGED, lambda key: permission_engine.invalidate_user(int(key)))
+invalidation_bus.subscribe(ROLES_CHANGED, lambda key: permission_engine.invalidate_all())
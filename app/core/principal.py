@@ -0,0 +1,86 @@
+"""
+已認證使用者的精簡身分（principal）與其快取
+"""
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.invalidation import invalidation_bus, USER_CHANGED, USER_ROLES_CHANGED, ROLES_CHANGED
+from app.models.user import User
+from app.models.role import Role
+from app.models.user_role import UserRole
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """請求期間使用的不可變使用者身分"""
+    
+    id: int
+    username: str
+    status: int
+    email_verified: bool
+    role_codes: Tuple[str, ...] = ()
+    
+    @property
+    def is_active(self) -> bool:
+        """檢查用戶是否活躍"""
+        return self.status == 1
+    
+    @property
+    def is_locked(self) -> bool:
+        """檢查用戶是否被鎖定"""
+        return self.status == -1
+    
+    @property
+    def is_verified(self) -> bool:
+        """檢查用戶是否已驗證郵箱"""
+        return self.email_verified
+    
+    def has_role(self, code: str) -> bool:
+        """檢查是否擁有角色"""
+        return code in self.role_codes
+
+# 以 user id 為鍵的 principal 快取
+principal_cache = TTLCache(
+    "user_principal",
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+async def load_user_principal(db: AsyncSession, user_id: int) -> Optional[UserPrincipal]:
+    """讀取使用者 principal，優先使用快取"""
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    
+    result = await db.execute(
+        select(User.id, User.username, User.status, User.email_verified).where(User.id == user_id)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    
+    roles_result = await db.execute(
+        select(Role.code).join(UserRole, UserRole.role_id == Role.id).where(
+            UserRole.user_id == user_id,
+            Role.status == 1
+        )
+    )
+    principal = UserPrincipal(
+        id=row.id,
+        username=row.username,
+        status=row.status,
+        email_verified=bool(row.email_verified),
+        role_codes=tuple(sorted(roles_result.scalars().all()))
+    )
+    principal_cache.set(user_id, principal)
+    return principal
+
+def invalidate_user_principal(user_id: int):
+    """使用者資料變更後清除其 principal 快取"""
+    principal_cache.delete(user_id)
+
+invalidation_bus.subscribe(USER_CHANGED, lambda key: invalidate_user_principal(int(key)))
+invalidation_bus.subscribe(USER_ROLES_CHANGED, lambda key: invalidate_user_principal(int(key)))
+invalidation_bus.subscribe(ROLES_CHANGED, lambda key: principal_cache.clear())
@@ -0,0 +1,135 @@
+"""
+慢查詢記錄
+取代 echo=True：只記錄超過延遲門檻的語句並抽樣記錄其餘語句，
+以 SQL 指紋（常值與 IN 清單正規化後的語句）彙總，保留前 N 名慢查詢供管理端點查看
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger("app.sql")
+
+SLOW_QUERIES = metrics_registry.counter(
+    "db_slow_queries_total", "超過延遲門檻的查詢次數"
+)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|:\w+|__\[POSTCOMPILE_\w+\])(?:\s*,\s*(?:\?|%s|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> Tuple[str, str]:
+    """正規化 SQL 並返回 (指紋 ID, 正規化語句)"""
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _PLACEHOLDER_LIST.sub("(...)", normalized)
+    normalized = _WHITESPACE.sub(" ", normalized).strip()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16], normalized
+
+class QueryStats:
+    """單一指紋的累計統計"""
+    
+    __slots__ = ("fingerprint", "statement", "count", "total_time", "max_time", "last_seen")
+    
+    def __init__(self, fingerprint_id: str, statement: str):
+        self.fingerprint = fingerprint_id
+        self.statement = statement
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_seen: Optional[datetime] = None
+    
+    def to_dict(self) -> Dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "statement": self.statement,
+            "count": self.count,
+            "total_ms": round(self.total_time * 1000, 2),
+            "avg_ms": round(self.total_time * 1000 / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_time * 1000, 2),
+            "last_seen": self.last_seen
+        }
+
+class SlowQueryLog:
+    """慢查詢記錄器（執行緒安全，同步引擎與非同步引擎共用）"""
+    
+    def __init__(self, enabled: bool, threshold_ms: float, sample_rate: float, top_n: int, max_fingerprints: int = 1000):
+        self.enabled = enabled
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.top_n = max(1, top_n)
+        self.max_fingerprints = max(self.top_n, max_fingerprints)
+        self._stats: Dict[str, QueryStats] = {}
+        self._lock = threading.Lock()
+        self.started_at = datetime.utcnow()
+    
+    def observe(self, statement: str, elapsed: float):
+        """記錄一次查詢；未超過門檻的語句只依抽樣率記錄日誌"""
+        if not self.enabled:
+            return
+        if elapsed < self.threshold:
+            if self.sample_rate > 0 and random.random() < self.sample_rate:
+                fingerprint_id, normalized = fingerprint(statement)
+                logger.info(
+                    "SQL 抽樣 %.1fms [%s] %s", elapsed * 1000, fingerprint_id, normalized,
+                    extra={"sql_fingerprint": fingerprint_id, "duration_ms": round(elapsed * 1000, 2), "sampled": True}
+                )
+            return
+        
+        fingerprint_id, normalized = fingerprint(statement)
+        SLOW_QUERIES.inc()
+        logger.warning(
+            "慢查詢 %.1fms [%s] %s", elapsed * 1000, fingerprint_id, normalized,
+            extra={"sql_fingerprint": fingerprint_id, "duration_ms": round(elapsed * 1000, 2), "sampled": False}
+        )
+        with self._lock:
+            stats = self._stats.get(fingerprint_id)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    self._evict()
+                stats = self._stats[fingerprint_id] = QueryStats(fingerprint_id, normalized)
+            stats.count += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            stats.last_seen = datetime.utcnow()
+    
+    def top(self, limit: Optional[int] = None, order_by: str = "total") -> List[Dict]:
+        """依累計時間（total）、最大時間（max）或次數（count）排序的前 N 名慢查詢"""
+        keys = {
+            "total": lambda stats: stats.total_time,
+            "max": lambda stats: stats.max_time,
+            "count": lambda stats: stats.count,
+        }
+        if order_by not in keys:
+            raise ValueError(f"不支援的排序欄位: {order_by}")
+        with self._lock:
+            entries = sorted(self._stats.values(), key=keys[order_by], reverse=True)
+            return [stats.to_dict() for stats in entries[:min(limit or self.top_n, self.top_n)]]
+    
+    def reset(self):
+        """清除累計統計"""
+        with self._lock:
+            self._stats.clear()
+            self.started_at = datetime.utcnow()
+    
+    def _evict(self):
+        # 指紋數量達上限時移除累計時間最少的一半，避免單一語句反覆被擠出
+        entries = sorted(self._stats.values(), key=lambda stats: stats.total_time)
+        for stats in entries[:len(entries) // 2 or 1]:
+            del self._stats[stats.fingerprint]
+
+# 全域慢查詢記錄器
+slow_query_log = SlowQueryLog(
+    enabled=settings.SLOW_QUERY_LOG_ENABLED,
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    sample_rate=settings.SLOW_QUERY_SAMPLE_RATE,
+    top_n=settings.SLOW_QUERY_TOP_N
+)
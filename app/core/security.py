@@ -2,16 +2,62 @@
 安全相關工具函數
 """
 from datetime import datetime, timedelta
-from typing import Optional, Union, Tuple
+from typing import List, Optional, Union, Tuple
 import secrets
 import hashlib
+import hmac
 import os
+import time
 from passlib.context import CryptContext
-from jose import JWTError, jwt
 from app.core.config import settings
+from app.core.cache import TTLCache
+from app.core.jwt_backends import InvalidTokenError, get_jwt_backend
+from app.core.password_hashing import password_hashing_pool
 
-# 密碼加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# PBKDF2-SHA256（原始位元組格式，鹽值與迭代次數分欄儲存）
+PBKDF2_SCHEME = "pbkdf2_sha256"
+# password_iters 為 0 表示 password_hash 為 passlib 自描述格式（演算法與參數皆包含在雜湊字串中）
+PASSLIB_ITERATIONS = 0
+
+# 密碼加密上下文：設定的演算法為預設，其他演算法視為過時（仍可驗證，登入後重新雜湊）
+pwd_context = CryptContext(
+    schemes=list(dict.fromkeys(
+        scheme for scheme in (settings.PASSWORD_HASH_SCHEME, "bcrypt", "argon2", "scrypt")
+        if scheme != PBKDF2_SCHEME
+    )),
+    deprecated="auto"
+)
+
+class PasswordHashPolicy:
+    """目前的密碼雜湊演算法與 PBKDF2 迭代次數"""
+    
+    def __init__(self, scheme: str, iterations: int):
+        if scheme != PBKDF2_SCHEME and scheme not in pwd_context.schemes():
+            raise ValueError(f"不支援的密碼雜湊演算法: {scheme}")
+        self.scheme = scheme
+        self.iterations = iterations
+    
+    def needs_rehash(self, password_hash: bytes, iterations: int) -> bool:
+        """判斷已儲存的雜湊是否使用過時的演算法或參數"""
+        if self.scheme == PBKDF2_SCHEME:
+            # 只升不降，避免各 worker 校準結果略有差異時來回重新雜湊
+            return iterations == PASSLIB_ITERATIONS or iterations < self.iterations
+        if iterations != PASSLIB_ITERATIONS:
+            return True
+        return pwd_context.needs_update(password_hash.decode("ascii"))
+
+# 全域密碼雜湊參數（迭代次數於啟動時校準）
+password_hash_policy = PasswordHashPolicy(settings.PASSWORD_HASH_SCHEME, settings.PASSWORD_HASH_ITERATIONS)
+
+# JWT 後端
+jwt_backend = get_jwt_backend(settings.JWT_BACKEND)
+
+# 已驗證令牌快取，以令牌 SHA-256 為鍵，存活時間不超過令牌的 exp
+token_cache = TTLCache(
+    "jwt_payload",
+    maxsize=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL_SECONDS
+)
 
 def generate_salt() -> bytes:
     """生成密碼鹽值"""
@@ -24,17 +70,34 @@ def hash_password_with_salt(password: str, salt: bytes, iterations: int = 100000
     return hash_result
 
 def verify_password_with_salt(password: str, salt: bytes, password_hash: bytes, iterations: int) -> bool:
-    """驗證密碼（使用鹽值）"""
+    """驗證密碼（使用鹽值），passlib 格式的雜湊交由 pwd_context 驗證"""
+    if iterations == PASSLIB_ITERATIONS:
+        return pwd_context.verify(password, password_hash.decode("ascii"))
     computed_hash = hash_password_with_salt(password, salt, iterations)
-    return computed_hash == password_hash
+    return hmac.compare_digest(computed_hash, password_hash)
 
-def create_password_hash(password: str) -> Tuple[bytes, bytes, int]:
-    """創建密碼哈希，返回 (hash, salt, iterations)"""
+def create_password_hash(password: str, iterations: Optional[int] = None) -> Tuple[bytes, bytes, int]:
+    """以目前設定的演算法創建密碼哈希，返回 (hash, salt, iterations)"""
+    if password_hash_policy.scheme != PBKDF2_SCHEME:
+        return pwd_context.hash(password).encode("ascii"), b"", PASSLIB_ITERATIONS
     salt = generate_salt()
-    iterations = 100000
+    iterations = iterations or password_hash_policy.iterations
     password_hash = hash_password_with_salt(password, salt, iterations)
     return password_hash, salt, iterations
 
+def create_password_hashes(passwords: List[str], iterations: Optional[int] = None) -> List[Tuple[bytes, bytes, int]]:
+    """批次創建密碼哈希（在雜湊執行池中以單一任務執行，減少進程間往返）"""
+    return [create_password_hash(password, iterations) for password in passwords]
+
+async def verify_password_with_salt_async(password: str, salt: bytes, password_hash: bytes, iterations: int) -> bool:
+    """驗證密碼（使用鹽值），雜湊計算在執行池中進行"""
+    return await password_hashing_pool.run(verify_password_with_salt, password, salt, password_hash, iterations)
+
+async def create_password_hash_async(password: str) -> Tuple[bytes, bytes, int]:
+    """創建密碼哈希，雜湊計算在執行池中進行，返回 (hash, salt, iterations)"""
+    # 執行池子進程不共享校準結果，迭代次數由主進程傳入
+    return await password_hashing_pool.run(create_password_hash, password, password_hash_policy.iterations)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """驗證密碼（bcrypt 兼容）"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -51,17 +114,37 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    # 會話 ID 由令牌雜湊而來，同一秒內的多次登入需以 jti 區分
+    to_encode.update({"exp": expire, "jti": secrets.token_hex(8)})
+    encoded_jwt = jwt_backend.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[dict]:
-    """驗證令牌"""
+def decode_token(token: str) -> Optional[dict]:
+    """解碼並驗證令牌（不使用快取）"""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
-    except JWTError:
+        return jwt_backend.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except InvalidTokenError:
+        return None
+
+def verify_token(token: str) -> Optional[dict]:
+    """驗證令牌，已驗證過的令牌直接讀取快取"""
+    cache_key = hash_token(token)
+    payload = token_cache.get(cache_key)
+    if payload is not None:
+        # 快取存活時間可能因時鐘調整而略長，再次確認 exp
+        if payload.get("exp", 0) > time.time():
+            return dict(payload)
+        token_cache.delete(cache_key)
+        return None
+    
+    payload = decode_token(token)
+    if payload is None:
         return None
+    
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        token_cache.set(cache_key, payload, ttl=exp - time.time())
+    return dict(payload)
 
 def generate_password_reset_token() -> str:
     """生成密碼重設令牌"""
@@ -1,16 +1,205 @@
 """
 會話管理相關功能
 """
+import asyncio
+import hmac
+import logging
+import secrets
+import time
 from datetime import datetime, timedelta
-from typing import Optional
-from sqlalchemy.orm import Session
-from app.models.user_session import UserSession
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import select, update, delete, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user_session import UserSession, ConsumedRefreshToken
+from app.core.config import settings
+from app.core.metrics import metrics_registry
 from app.core.security import hash_token
+from app.core.invalidation import invalidation_bus, USER_CHANGED, SESSION_REVOKED
 
-def create_user_session(user, access_token: str, ip_address: Optional[str], 
-                       user_agent: Optional[str], db: Session) -> UserSession:
+logger = logging.getLogger(__name__)
+
+# 會話閒置超過此時間即視為過期
+SESSION_MAX_IDLE = timedelta(days=30)
+
+# 清除過期的已輪替刷新令牌雜湊的間隔（秒）
+CONSUMED_REFRESH_PRUNE_INTERVAL = 3600
+_consumed_refresh_pruned_at = 0.0
+
+SESSION_ACTIVITY_FLUSHED = metrics_registry.counter(
+    "session_activity_flushed_total", "批次寫入的會話最後活動時間筆數"
+)
+SESSION_REVOKED_SIZE = metrics_registry.gauge(
+    "session_revoked_set_size", "記憶體中已撤銷會話數"
+)
+REFRESH_TOKENS_ROTATED = metrics_registry.counter(
+    "refresh_tokens_rotated_total", "輪替的刷新令牌數"
+)
+REFRESH_TOKEN_REUSE = metrics_registry.counter(
+    "refresh_token_reuse_total", "已輪替的刷新令牌再次使用次數"
+)
+
+class SessionActivityTracker:
+    """會話活動追蹤器
+    
+    最後活動時間先記錄在記憶體，定期以單一 UPDATE ... CASE 批次寫入；
+    已撤銷會話保存在記憶體集合中，依 revoked_at 增量刷新（重疊檢查最近的 lookback 時間）
+    """
+    
+    def __init__(self, flush_interval: float, staleness: float, refresh_interval: float, lookback: float = 0):
+        self.flush_interval = flush_interval
+        self.staleness = timedelta(seconds=staleness)
+        self.refresh_interval = refresh_interval
+        self.lookback = timedelta(seconds=lookback)
+        # 已確認存在的會話 -> 資料庫中的 last_seen_at
+        self._persisted: Dict[str, datetime] = {}
+        # 尚未寫入的最後活動時間
+        self._pending: Dict[str, datetime] = {}
+        # 已撤銷會話 -> revoked_at
+        self._revoked: Dict[str, datetime] = {}
+        self._revoked_watermark: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def is_known(self, session_id: str) -> bool:
+        """會話是否已載入記憶體"""
+        return session_id in self._persisted
+    
+    def is_revoked(self, session_id: str) -> bool:
+        """會話是否已撤銷"""
+        return session_id in self._revoked
+    
+    def last_seen(self, session_id: str) -> Optional[datetime]:
+        """會話的最後活動時間（含尚未寫入的部分）"""
+        return self._pending.get(session_id) or self._persisted.get(session_id)
+    
+    def remember(self, session_id: str, last_seen_at: Optional[datetime]):
+        """記錄從資料庫讀取的會話"""
+        self._persisted[session_id] = last_seen_at or datetime.min
+    
+    def touch(self, session_id: str, now: Optional[datetime] = None):
+        """記錄會話活動，距上次寫入未超過容忍時間時不產生寫入"""
+        now = now or datetime.utcnow()
+        if now - self._persisted.get(session_id, datetime.min) >= self.staleness:
+            self._pending[session_id] = now
+    
+    def mark_revoked(self, session_ids: Iterable[str], revoked_at: Optional[datetime] = None):
+        """將會話加入撤銷集合"""
+        revoked_at = revoked_at or datetime.utcnow()
+        for session_id in session_ids:
+            self._revoked[session_id] = revoked_at
+            self._persisted.pop(session_id, None)
+            self._pending.pop(session_id, None)
+        SESSION_REVOKED_SIZE.set(len(self._revoked))
+    
+    async def flush(self, db: AsyncSession):
+        """以單一 UPDATE ... CASE 寫入所有待更新的最後活動時間"""
+        rows, self._pending = self._pending, {}
+        if not rows:
+            return
+        try:
+            await db.execute(
+                update(UserSession)
+                .where(UserSession.session_id.in_(list(rows)))
+                .values(last_seen_at=case(rows, value=UserSession.session_id))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        except Exception:
+            # 寫入失敗時保留待更新資料，較新的活動時間優先
+            for session_id, seen_at in rows.items():
+                if self._pending.get(session_id, datetime.min) < seen_at:
+                    self._pending[session_id] = seen_at
+            raise
+        for session_id, seen_at in rows.items():
+            if session_id in self._persisted:
+                self._persisted[session_id] = seen_at
+        SESSION_ACTIVITY_FLUSHED.inc(len(rows))
+    
+    async def refresh_revocations(self, db: AsyncSession):
+        """增量讀取自上次刷新後撤銷的會話"""
+        # revoked_at 由撤銷的 worker 在提交前以本機時鐘寫入：較晚提交或來自時鐘較慢主機的撤銷
+        # 可能早於上次刷新的時間，因此每次往回重疊檢查 lookback，已知的撤銷直接略過
+        now = datetime.utcnow()
+        if self._revoked_watermark is None:
+            since = now - SESSION_MAX_IDLE
+        else:
+            since = self._revoked_watermark - self.lookback
+        result = await db.execute(
+            select(UserSession.session_id, UserSession.revoked_at).where(
+                UserSession.revoked_at >= since
+            )
+        )
+        for session_id, revoked_at in result.all():
+            if session_id not in self._revoked:
+                self.mark_revoked([session_id], revoked_at)
+        # 以本次查詢開始的時間為水位，不受其他主機時鐘偏快的 revoked_at 影響
+        self._revoked_watermark = now
+        self._prune()
+    
+    def _prune(self):
+        """移除已超過閒置期限的記錄"""
+        cutoff = datetime.utcnow() - SESSION_MAX_IDLE
+        self._revoked = {k: v for k, v in self._revoked.items() if v >= cutoff}
+        self._persisted = {k: v for k, v in self._persisted.items() if v >= cutoff or k in self._pending}
+        SESSION_REVOKED_SIZE.set(len(self._revoked))
+    
+    def start(self):
+        """啟動背景刷新任務"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """停止背景任務並寫入剩餘活動時間"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._pending:
+            from app.db import AsyncSessionLocal
+            async with AsyncSessionLocal() as db:
+                await self.flush(db)
+    
+    async def _run(self):
+        from app.db import AsyncSessionLocal
+        last_flush = time.monotonic()
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.refresh_revocations(db)
+                    if time.monotonic() - last_flush >= self.flush_interval:
+                        last_flush = time.monotonic()
+                        await self.flush(db)
+            except Exception:
+                logger.exception("會話活動同步失敗")
+            await asyncio.sleep(self.refresh_interval)
+
+# 全域會話活動追蹤器
+session_tracker = SessionActivityTracker(
+    flush_interval=settings.SESSION_ACTIVITY_FLUSH_SECONDS,
+    staleness=settings.SESSION_ACTIVITY_STALENESS_SECONDS,
+    refresh_interval=settings.SESSION_REVOCATION_REFRESH_SECONDS,
+    lookback=settings.SESSION_REVOCATION_LOOKBACK_SECONDS
+)
+
+# 撤銷事件即時同步至其他 worker，增量刷新仍作為後備
+invalidation_bus.subscribe(SESSION_REVOKED, lambda key: session_tracker.mark_revoked([key]))
+
+def generate_session_id() -> str:
+    """生成會話 ID（寫入訪問令牌的 sid，刷新後的令牌沿用同一會話）"""
+    return secrets.token_hex(16)
+
+def create_refresh_token(session_id: str) -> str:
+    """生成刷新令牌，格式為 <session_id>.<隨機值>，以會話 ID 直接定位會話"""
+    return f"{session_id}.{secrets.token_urlsafe(32)}"
+
+async def create_user_session(user, access_token: str, ip_address: Optional[str],
+                       user_agent: Optional[str], db: AsyncSession, session_id: Optional[str] = None,
+                       refresh_token: Optional[str] = None) -> UserSession:
     """創建用戶會話"""
-    session_id = hash_token(access_token)[:32]  # 使用令牌哈希的前32位作為會話ID
+    # 未指定時使用令牌哈希的前32位作為會話ID
+    session_id = session_id or hash_token(access_token)[:32]
     token_signature = hash_token(access_token)
     
     # 轉換 IP 地址為二進制
@@ -34,65 +223,155 @@ def create_user_session(user, access_token: str, ip_address: Optional[str],
         created_at=datetime.utcnow(),
         last_seen_at=datetime.utcnow()
     )
+    if refresh_token:
+        session.refresh_token_hash = hash_token(refresh_token)
+        session.refresh_expires_at = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     
     db.add(session)
-    db.commit()
-    db.refresh(session)
+    await db.commit()
+    await db.refresh(session)
+    session_tracker.remember(session.session_id, session.last_seen_at)
     
     return session
 
-def revoke_user_sessions(user_id: int, db: Session):
+async def revoke_user_sessions(user_id: int, db: AsyncSession):
     """撤銷用戶的所有會話"""
-    sessions = db.query(UserSession).filter(
+    result = await db.execute(select(UserSession).where(
         UserSession.user_id == user_id,
         UserSession.revoked_at.is_(None)
-    ).all()
+    ))
+    sessions = result.scalars().all()
     
     for session in sessions:
         session.revoked_at = datetime.utcnow()
     
-    db.commit()
+    await db.commit()
+    for session in sessions:
+        invalidation_bus.publish(SESSION_REVOKED, session.session_id)
+    invalidation_bus.publish(USER_CHANGED, user_id)
 
-def revoke_session(session_id: str, db: Session):
+async def revoke_session(session_id: str, db: AsyncSession):
     """撤銷特定會話"""
-    session = db.query(UserSession).filter(
+    result = await db.execute(select(UserSession).where(
         UserSession.session_id == session_id,
         UserSession.revoked_at.is_(None)
-    ).first()
+    ))
+    session = result.scalars().first()
     
     if session:
         session.revoked_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
+        invalidation_bus.publish(SESSION_REVOKED, session_id)
 
-def is_session_valid(session_id: str, db: Session) -> bool:
-    """檢查會話是否有效"""
-    session = db.query(UserSession).filter(
-        UserSession.session_id == session_id,
-        UserSession.revoked_at.is_(None)
-    ).first()
+async def rotate_refresh_token(refresh_token: str, db: AsyncSession) -> Tuple[UserSession, str]:
+    """驗證並輪替刷新令牌，返回 (會話, 新刷新令牌)；已輪替的令牌再次使用時撤銷會話"""
+    session_id, _, secret = refresh_token.partition(".")
+    if not session_id or not secret or session_tracker.is_revoked(session_id):
+        raise ValueError("無效的刷新令牌")
+    
+    # 刷新令牌欄位以條件 UPDATE 寫入，重新讀取以免使用會話中快取的舊值
+    result = await db.execute(
+        select(UserSession).where(UserSession.session_id == session_id)
+        .execution_options(populate_existing=True)
+    )
+    session = result.scalars().first()
+    if session is None or session.revoked_at is not None or session.refresh_token_hash is None:
+        raise ValueError("無效的刷新令牌")
+    
+    now = datetime.utcnow()
+    token_hash = hash_token(refresh_token)
+    if not hmac.compare_digest(session.refresh_token_hash, token_hash):
+        consumed = await db.execute(select(ConsumedRefreshToken.id).where(
+            ConsumedRefreshToken.token_hash == token_hash,
+            ConsumedRefreshToken.session_id == session_id
+        ))
+        if consumed.first() is None:
+            raise ValueError("無效的刷新令牌")
+        # 上一個令牌在剛輪替不久後出現，視為同一用戶端的並發刷新
+        grace = timedelta(seconds=settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS)
+        if (
+            session.refresh_token_previous_hash
+            and hmac.compare_digest(session.refresh_token_previous_hash, token_hash)
+            and session.refresh_rotated_at and now - session.refresh_rotated_at <= grace
+        ):
+            raise ValueError("刷新令牌已被使用")
+        # 任何一代已輪替的令牌再次出現，表示令牌可能外洩：撤銷整個會話
+        REFRESH_TOKEN_REUSE.inc()
+        logger.warning("會話 %s 的刷新令牌被重複使用，撤銷會話", session_id)
+        await revoke_session(session_id, db)
+        raise ValueError("刷新令牌已被使用，會話已撤銷")
+    if session.refresh_expires_at is None or session.refresh_expires_at <= now:
+        raise ValueError("刷新令牌已過期")
+    
+    # 以目前的雜湊為條件更新，並發刷新時只有一個請求成功
+    new_refresh_token = create_refresh_token(session_id)
+    result = await db.execute(
+        update(UserSession)
+        .where(
+            UserSession.id == session.id,
+            UserSession.refresh_token_hash == token_hash,
+            UserSession.revoked_at.is_(None)
+        )
+        .values(
+            refresh_token_hash=hash_token(new_refresh_token),
+            refresh_token_previous_hash=token_hash,
+            refresh_expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+            refresh_rotated_at=now,
+            last_seen_at=now
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
+        await db.rollback()
+        raise ValueError("刷新令牌已被使用")
+    db.add(ConsumedRefreshToken(session_id=session_id, token_hash=token_hash, consumed_at=now))
+    await db.commit()
+    await prune_consumed_refresh_tokens(db)
     
-    if not session:
+    REFRESH_TOKENS_ROTATED.inc()
+    session_tracker.remember(session_id, now)
+    return session, new_refresh_token
+
+async def prune_consumed_refresh_tokens(db: AsyncSession):
+    """定期刪除已超過刷新令牌有效期的已輪替令牌雜湊（每個 worker 每小時最多一次）"""
+    global _consumed_refresh_pruned_at
+    if time.time() - _consumed_refresh_pruned_at < CONSUMED_REFRESH_PRUNE_INTERVAL:
+        return
+    _consumed_refresh_pruned_at = time.time()
+    await db.execute(
+        delete(ConsumedRefreshToken)
+        .where(ConsumedRefreshToken.consumed_at < datetime.utcnow() - timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+async def is_session_valid(session_id: str, db: AsyncSession) -> bool:
+    """檢查會話是否有效（已載入的會話不查詢資料庫）"""
+    if session_tracker.is_revoked(session_id):
         return False
     
+    if not session_tracker.is_known(session_id):
+        result = await db.execute(select(UserSession.last_seen_at, UserSession.created_at).where(
+            UserSession.session_id == session_id,
+            UserSession.revoked_at.is_(None)
+        ))
+        row = result.first()
+        if row is None:
+            return False
+        session_tracker.remember(session_id, row.last_seen_at or row.created_at)
+    
     # 檢查會話是否過期（例如30天）
-    if session.last_seen_at < datetime.utcnow() - timedelta(days=30):
-        session.revoked_at = datetime.utcnow()
-        db.commit()
+    now = datetime.utcnow()
+    if session_tracker.last_seen(session_id) < now - SESSION_MAX_IDLE:
+        await revoke_session(session_id, db)
         return False
     
-    # 更新最後訪問時間
-    session.last_seen_at = datetime.utcnow()
-    db.commit()
+    # 更新最後訪問時間（批次寫入）
+    session_tracker.touch(session_id, now)
     
     return True
 
-def update_session_activity(session_id: str, db: Session):
-    """更新會話活動時間"""
-    session = db.query(UserSession).filter(
-        UserSession.session_id == session_id,
-        UserSession.revoked_at.is_(None)
-    ).first()
-    
-    if session:
-        session.last_seen_at = datetime.utcnow()
-        db.commit()
\ No newline at end of file
+async def update_session_activity(session_id: str, db: AsyncSession):
+    """更新會話活動時間（批次寫入）"""
+    if not session_tracker.is_revoked(session_id):
+        session_tracker.touch(session_id)
@@ -0,0 +1,84 @@
+"""
+可合併的延遲分位數草圖
+以對數分桶記錄數值，分位數具有固定的相對誤差，多個草圖可直接相加合併
+"""
+import json
+import math
+from typing import Dict, Optional
+
+class LatencySketch:
+    """對數分桶分位數草圖（相對誤差 relative_accuracy）"""
+    
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+    
+    def add(self, value: float, count: int = 1):
+        """加入觀測值"""
+        if value <= 0:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+    
+    def merge(self, other: "LatencySketch"):
+        """合併另一個草圖（需使用相同的相對誤差）"""
+        if other.gamma != self.gamma:
+            raise ValueError("無法合併相對誤差不同的草圖")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """估算分位數，無資料時返回 None"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # 取分桶的中間值，使相對誤差不超過 relative_accuracy
+                return 2 * self.gamma ** index / (1 + self.gamma)
+        return 2 * self.gamma ** max(self.bins) / (1 + self.gamma)
+    
+    def _collapse(self):
+        """分桶過多時合併最低的分桶，保留高分位數的精度"""
+        indexes = sorted(self.bins)
+        excess = len(indexes) - self.max_bins
+        target = indexes[excess]
+        for index in indexes[:excess]:
+            self.bins[target] += self.bins.pop(index)
+    
+    def to_json(self) -> str:
+        """序列化"""
+        return json.dumps({
+            "a": self.relative_accuracy,
+            "z": self.zero_count,
+            "b": {str(index): count for index, count in self.bins.items()}
+        }, separators=(",", ":"))
+    
+    @classmethod
+    def from_json(cls, data: Optional[str]) -> "LatencySketch":
+        """反序列化"""
+        if not data:
+            return cls()
+        payload = json.loads(data)
+        sketch = cls(relative_accuracy=payload.get("a", 0.01))
+        sketch.zero_count = payload.get("z", 0)
+        sketch.bins = {int(index): count for index, count in payload.get("b", {}).items()}
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
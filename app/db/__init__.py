@@ -1,23 +1,65 @@
 # 數據庫模塊
-from sqlalchemy import create_engine
+import inspect
+from functools import lru_cache
+from fastapi import Depends, Request
+from fastapi.params import Depends as DependsParam
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from app.core.config import settings
+from app.core.instrumentation import instrument_engine
+from app.db.engine_profiles import create_engine_from_profile, create_async_engine_from_profile
+from app.db.routing import ReplicaSet, RoutingSession, prefer_replica, pin_primary, reads_from_replica
 from app.models import Base
 
-# 創建數據庫引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    # MySQL 配置
-    pool_pre_ping=True,  # 檢查連接是否有效
-    echo=True,  # 顯示 SQL 語句（開發時有用）
-    pool_recycle=300,  # 連接回收時間
-    pool_size=10,  # 連接池大小
-    max_overflow=20  # 最大溢出連接數
-)
+# 同步驅動對應的非同步驅動
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def get_async_database_url(database_url: str) -> str:
+    """根據 DATABASE_URL 選擇對應的非同步驅動"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"不支援的資料庫類型: {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+# 創建數據庫引擎（migration、seeder 與腳本使用，連接池參數依資料庫類型見 engine_profiles）
+engine = create_engine_from_profile(settings.DATABASE_URL)
 
 # 創建會話工廠
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 創建非同步數據庫引擎（API 請求使用）
+async_engine = create_async_engine_from_profile(get_async_database_url(settings.DATABASE_URL))
+
+# 唯讀副本（未設定時所有查詢都送往主庫）
+replica_set = ReplicaSet(
+    [
+        create_async_engine_from_profile(get_async_database_url(url), name=f"replica_{index}")
+        for index, url in enumerate(settings.DATABASE_REPLICA_URLS)
+    ],
+    selection=settings.REPLICA_SELECTION,
+    max_lag=settings.REPLICA_MAX_LAG_SECONDS,
+    check_interval=settings.REPLICA_CHECK_INTERVAL_SECONDS,
+    check_timeout=settings.REPLICA_CHECK_TIMEOUT_SECONDS
+)
+
+# 記錄每個請求的查詢時間與次數及慢查詢
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+for replica in replica_set.replicas:
+    instrument_engine(replica.engine.sync_engine)
+
+# 創建非同步會話工廠（提交後不過期，避免在事件循環外觸發延遲載入）
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, sync_session_class=RoutingSession, replicas=replica_set,
+    autoflush=False, expire_on_commit=False
+)
+
 # 數據庫依賴
 def get_db():
     db = SessionLocal()
@@ -26,6 +68,28 @@ def get_db():
     finally:
         db.close()
 
+# 請求範圍的非同步數據庫會話：認證依賴與端點依賴在同一請求中共用（FastAPI 只建立一次），只借出一條連線；
+# 端點宣告 get_async_read_db 時，會話在任何依賴執行前即標記為優先讀取副本，與依賴的宣告順序無關
+async def get_request_db(request: Request):
+    async with AsyncSessionLocal() as db:
+        if _endpoint_reads_replica(request.scope.get("endpoint")):
+            prefer_replica(db)
+        yield db
 
+@lru_cache(maxsize=None)
+def _endpoint_reads_replica(endpoint) -> bool:
+    """端點參數是否宣告 Depends(get_async_read_db)"""
+    if endpoint is None:
+        return False
+    return any(
+        isinstance(parameter.default, DependsParam) and parameter.default.dependency is get_async_read_db
+        for parameter in inspect.signature(endpoint).parameters.values()
+    )
 
+# 非同步數據庫依賴
+async def get_async_db(db: AsyncSession = Depends(get_request_db)) -> AsyncSession:
+    return db
 
+# 唯讀端點使用的非同步數據庫依賴（查詢優先送往唯讀副本）
+async def get_async_read_db(db: AsyncSession = Depends(get_request_db)) -> AsyncSession:
+    return prefer_replica(db)
@@ -0,0 +1,126 @@
+"""
+資料庫引擎設定檔
+依資料庫類型選擇連接池與驅動參數，並記錄連接池飽和度指標：
+  - sqlite：WAL 模式；檔案資料庫使用 NullPool，記憶體資料庫使用 StaticPool
+  - postgresql：連接池與伺服器端預備語句快取（asyncpg）
+  - mysql：連接池，回收時間短於伺服器 wait_timeout
+"""
+import time
+from typing import Any, Dict, Tuple
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, NullPool, StaticPool
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+
+POOL_CHECKED_OUT = metrics_registry.gauge(
+    "db_pool_checked_out", "已借出的資料庫連線數"
+)
+POOL_OVERFLOW = metrics_registry.gauge(
+    "db_pool_overflow", "超出 pool_size 的連線數（負值表示尚未建立的常駐連線）"
+)
+POOL_WAIT = metrics_registry.histogram(
+    "db_pool_wait_seconds", "自連接池取得連線的等待時間（含建立新連線與 pre-ping）",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+POOL_TIMEOUTS = metrics_registry.counter(
+    "db_pool_timeouts_total", "等待連線逾時的次數"
+)
+
+class _InstrumentedPoolMixin:
+    """記錄取得連線的等待時間與借出數（以 pool_logging_name 作為 engine 標籤）"""
+    
+    def connect(self):
+        # 在 connect 而非 _do_get 量測：QueuePool._do_get 於溢出競爭時會遞迴呼叫自身，每次借出只應記錄一次
+        name = self._orig_logging_name or "default"
+        start_time = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc(engine=name)
+            raise
+        POOL_WAIT.observe(time.perf_counter() - start_time, engine=name)
+        self._report(name)
+        return connection
+    
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._report(self._orig_logging_name or "default")
+    
+    def _report(self, name: str):
+        POOL_CHECKED_OUT.set(self.checkedout(), engine=name)
+        POOL_OVERFLOW.set(self.overflow(), engine=name)
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    """記錄飽和度指標的 QueuePool"""
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    """記錄飽和度指標的 AsyncAdaptedQueuePool"""
+
+def engine_options(database_url: str, name: str, is_async: bool = False) -> Tuple[str, Dict[str, Any]]:
+    """依資料庫類型返回 (連線 URL, create_engine 參數)"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    options: Dict[str, Any] = {
+        "echo": settings.SQL_ECHO,
+        "query_cache_size": settings.DB_QUERY_CACHE_SIZE,
+    }
+    
+    if backend == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # 記憶體資料庫只存在於單一連線中，所有使用者共用同一連線
+            options.update(poolclass=StaticPool, connect_args={"check_same_thread": False})
+        else:
+            # 檔案資料庫開啟連線成本低，連接池只會增加寫入鎖競爭
+            options.update(poolclass=NullPool)
+        return url.render_as_string(hide_password=False), options
+    
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_logging_name=name,
+        pool_pre_ping=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    )
+    if backend == "postgresql":
+        options["pool_recycle"] = settings.DB_POOL_RECYCLE_SECONDS
+        if is_async:
+            # asyncpg 以伺服器端預備語句執行查詢，快取已預備的語句避免重複解析
+            url = url.update_query_dict({"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)})
+    elif backend == "mysql":
+        # 在 MySQL wait_timeout 之前回收，避免取得已被伺服器關閉的連線
+        options["pool_recycle"] = min(settings.DB_POOL_RECYCLE_SECONDS, settings.DB_MYSQL_POOL_RECYCLE_SECONDS)
+    else:
+        options["pool_recycle"] = settings.DB_POOL_RECYCLE_SECONDS
+    return url.render_as_string(hide_password=False), options
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        if settings.SQLITE_WAL:
+            # WAL 允許讀取與寫入並行，synchronous=NORMAL 在 WAL 下仍可保證一致性
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    finally:
+        cursor.close()
+
+def _configure(engine: Engine):
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+
+def create_engine_from_profile(database_url: str, name: str = "primary") -> Engine:
+    """以設定檔建立同步引擎"""
+    url, options = engine_options(database_url, name)
+    engine = create_engine(url, **options)
+    _configure(engine)
+    return engine
+
+def create_async_engine_from_profile(database_url: str, name: str = "primary_async") -> AsyncEngine:
+    """以設定檔建立非同步引擎（database_url 需使用非同步驅動）"""
+    url, options = engine_options(database_url, name, is_async=True)
+    engine = create_async_engine(url, **options)
+    _configure(engine.sync_engine)
+    return engine
@@ -0,0 +1,145 @@
+"""
+外部資料庫引擎註冊表
+連接測試重複使用已建立的引擎與連接池，避免每次重新建立引擎及連線握手
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.core.invalidation import invalidation_bus, DATABASE_CONFIG_CHANGED
+
+ENGINES_OPEN = metrics_registry.gauge(
+    "external_engines_open", "已快取的外部資料庫引擎數"
+)
+ENGINES_CREATED = metrics_registry.counter(
+    "external_engines_created_total", "建立的外部資料庫引擎數"
+)
+ENGINES_DISPOSED = metrics_registry.counter(
+    "external_engines_disposed_total", "釋放的外部資料庫引擎數"
+)
+
+EngineKey = Tuple[Optional[int], str]
+
+class EngineRegistry:
+    """以 (配置 ID, 連線資訊雜湊) 為鍵的 LRU 引擎快取（執行緒安全）"""
+    
+    def __init__(self, max_engines: int, idle_seconds: float, pool_size: int, max_overflow: int):
+        self.max_engines = max(1, max_engines)
+        self.idle_seconds = idle_seconds
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self._engines: "OrderedDict[EngineKey, List]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def credentials_hash(connection_string: str) -> str:
+        """連線資訊雜湊，避免以明文密碼作為鍵"""
+        return hashlib.sha256(connection_string.encode('utf-8')).hexdigest()
+    
+    def get_engine(self, config_id: Optional[int], connection_string: str) -> Engine:
+        """獲取（或建立）對應的引擎"""
+        key = (config_id, self.credentials_hash(connection_string))
+        expired = []
+        with self._lock:
+            expired.extend(self._pop_idle())
+            entry = self._engines.get(key)
+            if entry is not None:
+                entry[1] = time.monotonic()
+                self._engines.move_to_end(key)
+                engine = entry[0]
+            else:
+                # 同一配置的連線資訊已變更，舊引擎不再使用
+                if config_id is not None:
+                    expired.extend(self._pop_config(config_id))
+                engine = self._create_engine(connection_string)
+                self._engines[key] = [engine, time.monotonic()]
+                while len(self._engines) > self.max_engines:
+                    expired.append(self._engines.popitem(last=False)[1][0])
+            ENGINES_OPEN.set(len(self._engines))
+        self._dispose(expired)
+        return engine
+    
+    def drop(self, config_id: int):
+        """配置更新或刪除時釋放其引擎"""
+        with self._lock:
+            expired = self._pop_config(config_id)
+            ENGINES_OPEN.set(len(self._engines))
+        self._dispose(expired)
+    
+    def dispose_idle(self):
+        """釋放閒置過久的引擎"""
+        with self._lock:
+            expired = self._pop_idle()
+            ENGINES_OPEN.set(len(self._engines))
+        self._dispose(expired)
+    
+    def dispose_all(self):
+        """釋放所有引擎"""
+        with self._lock:
+            expired = [entry[0] for entry in self._engines.values()]
+            self._engines.clear()
+            ENGINES_OPEN.set(0)
+        self._dispose(expired)
+    
+    def __len__(self) -> int:
+        return len(self._engines)
+    
+    @staticmethod
+    def connect_args(connection_string: str, timeout: float) -> Dict[str, Any]:
+        """依驅動設定連線與讀寫逾時，無回應的主機不會讓驅動呼叫無限佔用執行緒"""
+        backend = make_url(connection_string).get_backend_name()
+        if backend == "sqlite":
+            return {"timeout": timeout}
+        if backend == "mysql":
+            return {"connect_timeout": timeout, "read_timeout": timeout, "write_timeout": timeout}
+        if backend == "postgresql":
+            # libpq 的 connect_timeout 為整數秒（最小 2 秒），查詢逾時交由伺服器端 statement_timeout
+            return {
+                "connect_timeout": max(2, math.ceil(timeout)),
+                "options": f"-c statement_timeout={int(timeout * 1000)}"
+            }
+        return {}
+    
+    def _create_engine(self, connection_string: str) -> Engine:
+        timeout = settings.CONNECTION_TEST_TIMEOUT_SECONDS
+        options = {
+            "pool_pre_ping": True,
+            "pool_recycle": 300,
+            "connect_args": self.connect_args(connection_string, timeout),
+        }
+        if not connection_string.startswith("sqlite"):
+            options.update(pool_size=self.pool_size, max_overflow=self.max_overflow, pool_timeout=timeout)
+        ENGINES_CREATED.inc()
+        return create_engine(connection_string, **options)
+    
+    def _pop_config(self, config_id: int) -> List[Engine]:
+        keys = [key for key in self._engines if key[0] == config_id]
+        return [self._engines.pop(key)[0] for key in keys]
+    
+    def _pop_idle(self) -> List[Engine]:
+        cutoff = time.monotonic() - self.idle_seconds
+        keys = [key for key, entry in self._engines.items() if entry[1] < cutoff]
+        return [self._engines.pop(key)[0] for key in keys]
+    
+    @staticmethod
+    def _dispose(engines: List[Engine]):
+        # 在鎖外釋放，避免關閉連線時阻塞其他請求
+        for engine in engines:
+            engine.dispose()
+            ENGINES_DISPOSED.inc()
+
+# 全域外部資料庫引擎註冊表
+engine_registry = EngineRegistry(
+    max_engines=settings.TEST_ENGINE_MAX_ENGINES,
+    idle_seconds=settings.TEST_ENGINE_IDLE_SECONDS,
+    pool_size=settings.TEST_ENGINE_POOL_SIZE,
+    max_overflow=settings.TEST_ENGINE_MAX_OVERFLOW
+)
+
+invalidation_bus.subscribe(DATABASE_CONFIG_CHANGED, lambda key: engine_registry.drop(int(key)))
@@ -0,0 +1,49 @@
+"""
+添加資料庫配置背景探測欄位
+"""
+from app.db.migrations.base import BaseMigration
+
+class AddDatabaseConfigProbeColumns(BaseMigration):
+    """添加資料庫配置背景探測欄位"""
+    
+    def __init__(self):
+        super().__init__()
+        self.version = "005"
+        self.description = "添加資料庫配置背景探測欄位"
+    
+    columns = [
+        ("next_probe_at", "TIMESTAMP NULL"),
+        ("probe_failures", "INTEGER NOT NULL DEFAULT 0"),
+        ("probe_lease_owner", "VARCHAR(64) NULL"),
+        ("probe_lease_expires_at", "TIMESTAMP NULL"),
+    ]
+    
+    def up(self, db):
+        """執行遷移"""
+        if not self.table_exists(db, "database_configs"):
+            print("[SKIP] database_configs 表不存在，跳過遷移")
+            return
+        
+        for column_name, column_type in self.columns:
+            if self.column_exists(db, "database_configs", column_name):
+                print(f"[SKIP] {column_name} 欄位已存在")
+                continue
+            self.execute_sql(db, f"ALTER TABLE database_configs ADD COLUMN {column_name} {column_type}")
+        
+        if not self.index_exists(db, "database_configs", "ix_database_configs_next_probe_at"):
+            self.execute_sql(db, """
+            CREATE INDEX ix_database_configs_next_probe_at
+            ON database_configs (next_probe_at)
+            """)
+    
+    def down(self, db):
+        """回滾遷移"""
+        from app.core.config import settings
+        
+        if settings.DATABASE_URL.startswith("mysql"):
+            self.execute_sql(db, "DROP INDEX ix_database_configs_next_probe_at ON database_configs")
+        else:
+            self.execute_sql(db, "DROP INDEX ix_database_configs_next_probe_at")
+        
+        for column_name, _ in reversed(self.columns):
+            self.execute_sql(db, f"ALTER TABLE database_configs DROP COLUMN {column_name}")
@@ -0,0 +1,64 @@
+"""
+創建連接測試延遲彙總表，並以既有測試日誌回填
+"""
+from app.db.migrations.base import BaseMigration
+
+class CreateConnectionTestRollups(BaseMigration):
+    """創建連接測試延遲彙總表"""
+    
+    def __init__(self):
+        super().__init__()
+        self.version = "006"
+        self.description = "創建連接測試延遲彙總表"
+    
+    def up(self, db):
+        """執行遷移"""
+        from app.models.connection_test_rollup import ConnectionTestRollup
+        
+        if not self.table_exists(db, "connection_test_rollups"):
+            ConnectionTestRollup.__table__.create(bind=db.bind)
+        
+        if self.table_exists(db, "connection_test_logs"):
+            self.backfill(db)
+    
+    def backfill(self, db):
+        """將既有測試日誌寫入彙總，避免保留期限清理時遺失歷史"""
+        import asyncio
+        from sqlalchemy import select, func
+        from app.db import AsyncSessionLocal
+        from app.models.database_config import ConnectionTestLog, TestResult
+        from app.models.connection_test_rollup import ConnectionTestRollup
+        from app.services.latency_rollup_service import LatencyRollupService
+        
+        if db.execute(select(func.count()).select_from(ConnectionTestRollup)).scalar():
+            print("[SKIP] 彙總表已有資料，跳過回填")
+            return
+        
+        async def run():
+            service = LatencyRollupService()
+            last_id = 0
+            async with AsyncSessionLocal() as async_db:
+                while True:
+                    result = await async_db.execute(
+                        select(ConnectionTestLog.id, ConnectionTestLog.connection_id,
+                               ConnectionTestLog.response_time_ms, ConnectionTestLog.status,
+                               ConnectionTestLog.tested_at)
+                        .where(ConnectionTestLog.id > last_id, ConnectionTestLog.tested_at.is_not(None))
+                        .order_by(ConnectionTestLog.id)
+                        .limit(5000)
+                    )
+                    rows = result.all()
+                    if not rows:
+                        return
+                    await service.record(async_db, [
+                        (row.connection_id, row.response_time_ms, row.status == TestResult.SUCCESS, row.tested_at)
+                        for row in rows
+                    ])
+                    await async_db.commit()
+                    last_id = rows[-1].id
+        
+        asyncio.run(run())
+    
+    def down(self, db):
+        """回滾遷移"""
+        self.execute_sql(db, "DROP TABLE connection_test_rollups")
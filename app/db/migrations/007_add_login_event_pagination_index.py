@@ -0,0 +1,36 @@
+"""
+添加登入日誌分頁索引
+"""
+from app.db.migrations.base import BaseMigration
+
+class AddLoginEventPaginationIndex(BaseMigration):
+    """添加登入日誌分頁索引"""
+    
+    def __init__(self):
+        super().__init__()
+        self.version = "007"
+        self.description = "添加登入日誌分頁索引"
+    
+    def up(self, db):
+        """執行遷移"""
+        if not self.table_exists(db, "user_login_events"):
+            print("[SKIP] user_login_events 表不存在，跳過遷移")
+            return
+        
+        if self.index_exists(db, "user_login_events", "ix_user_login_events_user_occurred"):
+            print("[SKIP] ix_user_login_events_user_occurred 索引已存在")
+            return
+        
+        self.execute_sql(db, """
+        CREATE INDEX ix_user_login_events_user_occurred
+        ON user_login_events (user_id, occurred_at, id)
+        """)
+    
+    def down(self, db):
+        """回滾遷移"""
+        from app.core.config import settings
+        
+        if settings.DATABASE_URL.startswith("mysql"):
+            self.execute_sql(db, "DROP INDEX ix_user_login_events_user_occurred ON user_login_events")
+        else:
+            self.execute_sql(db, "DROP INDEX ix_user_login_events_user_occurred")
@@ -0,0 +1,36 @@
+"""
+創建使用者資源計數表，並以既有資料回填
+"""
+from app.db.migrations.base import BaseMigration
+
+class CreateUserResourceCounters(BaseMigration):
+    """創建使用者資源計數表"""
+    
+    def __init__(self):
+        super().__init__()
+        self.version = "008"
+        self.description = "創建使用者資源計數表"
+    
+    def up(self, db):
+        """執行遷移"""
+        from app.models.user_resource_counter import UserResourceCounter
+        
+        if self.table_exists(db, "user_resource_counters"):
+            print("[SKIP] user_resource_counters 表已存在")
+            return
+        UserResourceCounter.__table__.create(bind=db.bind)
+        
+        # 未回填的使用者會在首次讀取時以 COUNT 補建
+        if self.table_exists(db, "servers") and self.table_exists(db, "database_configs"):
+            self.execute_sql(db, """
+            INSERT INTO user_resource_counters (user_id, server_count, database_config_count, updated_at)
+            SELECT u.id,
+                   (SELECT COUNT(*) FROM servers s WHERE s.user_id = u.id),
+                   (SELECT COUNT(*) FROM database_configs c WHERE c.user_id = u.id),
+                   CURRENT_TIMESTAMP
+            FROM users u
+            """)
+    
+    def down(self, db):
+        """回滾遷移"""
+        self.execute_sql(db, "DROP TABLE user_resource_counters")
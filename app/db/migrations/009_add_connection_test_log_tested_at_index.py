@@ -0,0 +1,36 @@
+"""
+添加連接測試日誌測試時間索引
+"""
+from app.db.migrations.base import BaseMigration
+
+class AddConnectionTestLogTestedAtIndex(BaseMigration):
+    """添加連接測試日誌測試時間索引（匯出時間範圍查詢與保留期限清理使用）"""
+    
+    def __init__(self):
+        super().__init__()
+        self.version = "009"
+        self.description = "添加連接測試日誌測試時間索引"
+    
+    def up(self, db):
+        """執行遷移"""
+        if not self.table_exists(db, "connection_test_logs"):
+            print("[SKIP] connection_test_logs 表不存在，跳過遷移")
+            return
+        
+        if self.index_exists(db, "connection_test_logs", "ix_connection_test_logs_tested_at"):
+            print("[SKIP] ix_connection_test_logs_tested_at 索引已存在")
+            return
+        
+        self.execute_sql(db, """
+        CREATE INDEX ix_connection_test_logs_tested_at
+        ON connection_test_logs (tested_at)
+        """)
+    
+    def down(self, db):
+        """回滾遷移"""
+        from app.core.config import settings
+        
+        if settings.DATABASE_URL.startswith("mysql"):
+            self.execute_sql(db, "DROP INDEX ix_connection_test_logs_tested_at ON connection_test_logs")
+        else:
+            self.execute_sql(db, "DROP INDEX ix_connection_test_logs_tested_at")
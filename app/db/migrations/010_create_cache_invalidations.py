@@ -0,0 +1,25 @@
+"""
+創建跨 worker 快取失效事件表
+"""
+from app.db.migrations.base import BaseMigration
+
+class CreateCacheInvalidations(BaseMigration):
+    """創建跨 worker 快取失效事件表"""
+    
+    def __init__(self):
+        super().__init__()
+        self.version = "010"
+        self.description = "創建跨 worker 快取失效事件表"
+    
+    def up(self, db):
+        """執行遷移"""
+        from app.models.cache_invalidation import CacheInvalidation
+        
+        if self.table_exists(db, "cache_invalidations"):
+            print("[SKIP] cache_invalidations 表已存在")
+            return
+        CacheInvalidation.__table__.create(bind=db.bind)
+    
+    def down(self, db):
+        """回滾遷移"""
+        self.execute_sql(db, "DROP TABLE cache_invalidations")
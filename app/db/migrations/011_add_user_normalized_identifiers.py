@@ -0,0 +1,103 @@
+"""
+添加用戶正規化識別碼欄位（郵箱 casefold、電話 E.164），回填既有資料後建立唯一索引
+"""
+from sqlalchemy import text
+from app.db.migrations.base import BaseMigration
+
+class AddUserNormalizedIdentifiers(BaseMigration):
+    """添加用戶正規化識別碼欄位"""
+    
+    def __init__(self):
+        super().__init__()
+        self.version = "011"
+        self.description = "添加用戶正規化識別碼欄位"
+    
+    columns = [
+        ("email_normalized", "VARCHAR(191) NULL", 191),
+        ("phone_normalized", "VARCHAR(20) NULL", 20),
+    ]
+    
+    # 每批回填的資料列數
+    batch_size = 1000
+    
+    def up(self, db):
+        """執行遷移"""
+        if not self.table_exists(db, "users"):
+            print("[SKIP] users 表不存在，跳過遷移")
+            return
+        
+        for column_name, column_type, _ in self.columns:
+            if self.column_exists(db, "users", column_name):
+                print(f"[SKIP] {column_name} 欄位已存在")
+                continue
+            self.execute_sql(db, f"ALTER TABLE users ADD COLUMN {column_name} {column_type}")
+        
+        self.backfill(db)
+        
+        for column_name, _, _ in self.columns:
+            self.clear_duplicates(db, column_name)
+            index_name = f"ix_users_{column_name}"
+            if self.index_exists(db, "users", index_name):
+                print(f"[SKIP] {index_name} 索引已存在")
+                continue
+            self.execute_sql(db, f"CREATE UNIQUE INDEX {index_name} ON users ({column_name})")
+    
+    def backfill(self, db):
+        """依主鍵分批回填尚未正規化的資料列"""
+        from app.core.identifiers import normalize_email, normalize_phone
+        
+        max_lengths = {column_name: max_length for column_name, _, max_length in self.columns}
+        last_id = 0
+        while True:
+            rows = db.execute(text("""
+            SELECT id, email, phone FROM users
+            WHERE id > :last_id
+            AND ((email IS NOT NULL AND email_normalized IS NULL) OR (phone IS NOT NULL AND phone_normalized IS NULL))
+            ORDER BY id
+            LIMIT :limit
+            """), {"last_id": last_id, "limit": self.batch_size}).fetchall()
+            if not rows:
+                break
+            
+            values = []
+            for user_id, email, phone in rows:
+                normalized = {"email_normalized": normalize_email(email), "phone_normalized": normalize_phone(phone)}
+                # 超出欄位長度的值不回填
+                values.append({"id": user_id, **{
+                    column_name: value if value and len(value) <= max_lengths[column_name] else None
+                    for column_name, value in normalized.items()
+                }})
+            db.execute(text("""
+            UPDATE users SET email_normalized = :email_normalized, phone_normalized = :phone_normalized
+            WHERE id = :id
+            """), values)
+            db.commit()
+            last_id = rows[-1][0]
+    
+    def clear_duplicates(self, db, column_name: str):
+        """正規化後重複的值只保留最早的用戶，其餘清空（UserService.identifier_queries 對正規化值為空的用戶以原始欄位比對）"""
+        duplicates = db.execute(text(f"""
+        SELECT {column_name} FROM users
+        WHERE {column_name} IS NOT NULL
+        GROUP BY {column_name}
+        HAVING COUNT(*) > 1
+        """)).scalars().all()
+        for value in duplicates:
+            user_ids = db.execute(text(f"""
+            SELECT id FROM users WHERE {column_name} = :value ORDER BY id
+            """), {"value": value}).scalars().all()
+            print(f"[WARN] {column_name} 正規化後重複: {value}（用戶 {', '.join(map(str, user_ids))}），僅保留用戶 {user_ids[0]}")
+            self.execute_sql(db, f"""
+            UPDATE users SET {column_name} = NULL WHERE {column_name} = :value AND id <> :keep_id
+            """, {"value": value, "keep_id": user_ids[0]})
+    
+    def down(self, db):
+        """回滾遷移"""
+        from app.core.config import settings
+        
+        for column_name, _, _ in reversed(self.columns):
+            if settings.DATABASE_URL.startswith("mysql"):
+                self.execute_sql(db, f"DROP INDEX ix_users_{column_name} ON users")
+            else:
+                self.execute_sql(db, f"DROP INDEX ix_users_{column_name}")
+            self.execute_sql(db, f"ALTER TABLE users DROP COLUMN {column_name}")
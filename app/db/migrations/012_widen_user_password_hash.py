@@ -0,0 +1,32 @@
+"""
+加寬用戶密碼雜湊欄位，以容納 passlib 格式的雜湊字串與校準後的 PBKDF2 迭代次數
+"""
+from app.db.migrations.base import BaseMigration
+
+class WidenUserPasswordHash(BaseMigration):
+    """加寬用戶密碼雜湊欄位"""
+    
+    def __init__(self):
+        super().__init__()
+        self.version = "012"
+        self.description = "加寬用戶密碼雜湊欄位"
+    
+    def up(self, db):
+        """執行遷移"""
+        from app.core.config import settings
+        
+        if not self.table_exists(db, "users"):
+            print("[SKIP] users 表不存在，跳過遷移")
+            return
+        
+        # SQLite 不限制長度，PostgreSQL 的 BYTEA 沒有長度上限
+        if not settings.DATABASE_URL.startswith("mysql"):
+            print("[SKIP] 非 MySQL 資料庫，欄位長度無需調整")
+            return
+        self.execute_sql(db, "ALTER TABLE users MODIFY password_hash VARBINARY(255) NOT NULL")
+        self.execute_sql(db, "ALTER TABLE users MODIFY password_iters INT NOT NULL DEFAULT 100000")
+    
+    def down(self, db):
+        """回滾遷移"""
+        # 縮短欄位會截斷已寫入的 passlib 雜湊，不做回滾
+        print("[SKIP] 加寬的欄位不回滾")
@@ -0,0 +1,25 @@
+"""
+創建登入節流計數表
+"""
+from app.db.migrations.base import BaseMigration
+
+class CreateLoginThrottleCounters(BaseMigration):
+    """創建登入節流計數表"""
+    
+    def __init__(self):
+        super().__init__()
+        self.version = "013"
+        self.description = "創建登入節流計數表"
+    
+    def up(self, db):
+        """執行遷移"""
+        from app.models.login_throttle import LoginThrottleCounter
+        
+        if self.table_exists(db, "login_throttle_counters"):
+            print("[SKIP] login_throttle_counters 表已存在")
+            return
+        LoginThrottleCounter.__table__.create(bind=db.bind)
+    
+    def down(self, db):
+        """回滾遷移"""
+        self.execute_sql(db, "DROP TABLE login_throttle_counters")
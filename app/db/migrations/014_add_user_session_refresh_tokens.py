@@ -0,0 +1,36 @@
+"""
+添加用戶會話刷新令牌欄位
+"""
+from app.db.migrations.base import BaseMigration
+
+class AddUserSessionRefreshTokens(BaseMigration):
+    """添加用戶會話刷新令牌欄位"""
+    
+    def __init__(self):
+        super().__init__()
+        self.version = "014"
+        self.description = "添加用戶會話刷新令牌欄位"
+    
+    columns = [
+        ("refresh_token_hash", "VARCHAR(64) NULL"),
+        ("refresh_token_previous_hash", "VARCHAR(64) NULL"),
+        ("refresh_expires_at", "TIMESTAMP NULL"),
+        ("refresh_rotated_at", "TIMESTAMP NULL"),
+    ]
+    
+    def up(self, db):
+        """執行遷移"""
+        if not self.table_exists(db, "user_sessions"):
+            print("[SKIP] user_sessions 表不存在，跳過遷移")
+            return
+        
+        for column_name, column_type in self.columns:
+            if self.column_exists(db, "user_sessions", column_name):
+                print(f"[SKIP] {column_name} 欄位已存在")
+                continue
+            self.execute_sql(db, f"ALTER TABLE user_sessions ADD COLUMN {column_name} {column_type}")
+    
+    def down(self, db):
+        """回滾遷移"""
+        for column_name, _ in reversed(self.columns):
+            self.execute_sql(db, f"ALTER TABLE user_sessions DROP COLUMN {column_name}")
@@ -0,0 +1,25 @@
+"""
+創建已輪替刷新令牌表
+"""
+from app.db.migrations.base import BaseMigration
+
+class CreateConsumedRefreshTokens(BaseMigration):
+    """創建已輪替刷新令牌表"""
+    
+    def __init__(self):
+        super().__init__()
+        self.version = "015"
+        self.description = "創建已輪替刷新令牌表"
+    
+    def up(self, db):
+        """執行遷移"""
+        from app.models.user_session import ConsumedRefreshToken
+        
+        if self.table_exists(db, "consumed_refresh_tokens"):
+            print("[SKIP] consumed_refresh_tokens 表已存在")
+            return
+        ConsumedRefreshToken.__table__.create(bind=db.bind)
+    
+    def down(self, db):
+        """回滾遷移"""
+        self.execute_sql(db, "DROP TABLE consumed_refresh_tokens")
@@ -10,8 +10,8 @@ def get_migration_classes():
     migrations = []
     migration_dir = os.path.dirname(__file__)
     
-    for filename in os.listdir(migration_dir):
-        if filename.startswith(('001_', '002_', '003_')) and filename.endswith('.py'):
+    for filename in sorted(os.listdir(migration_dir)):
+        if filename[:3].isdigit() and filename[3:4] == '_' and filename.endswith('.py'):
             module_name = filename[:-3]  # 移除 .py
             try:
                 module = importlib.import_module(f'.{module_name}', package=__name__)
@@ -92,4 +92,34 @@ class BaseMigration:
                     return True
             return False
         
+        return result.scalar() > 0
+    
+    def index_exists(self, db: Session, table_name: str, index_name: str) -> bool:
+        """檢查索引是否存在"""
+        if settings.DATABASE_URL.startswith("mysql"):
+            result = db.execute(text(f"""
+                SELECT COUNT(*) 
+                FROM information_schema.statistics 
+                WHERE table_schema = DATABASE() 
+                AND table_name = '{table_name}'
+                AND index_name = '{index_name}'
+            """))
+        elif settings.DATABASE_URL.startswith("postgresql"):
+            result = db.execute(text(f"""
+                SELECT COUNT(*) 
+                FROM pg_indexes 
+                WHERE schemaname = 'public' 
+                AND tablename = '{table_name}'
+                AND indexname = '{index_name}'
+            """))
+        else:
+            # SQLite
+            result = db.execute(text(f"""
+                SELECT COUNT(*) 
+                FROM sqlite_master 
+                WHERE type='index' 
+                AND tbl_name='{table_name}'
+                AND name='{index_name}'
+            """))
+        
         return result.scalar() > 0
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+唯讀副本路由
+標記為優先讀取副本的會話，其 SELECT 依選擇策略送往健康且延遲在容許範圍內的副本；
+會話一旦寫入（flush 或 DML），之後的查詢一律回到主庫，確保同一請求讀得到自己的寫入
+"""
+import asyncio
+import itertools
+import logging
+import time
+from typing import List, Optional
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+from app.core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+REPLICA_QUERIES = metrics_registry.counter(
+    "db_replica_queries_total", "送往唯讀副本的查詢數"
+)
+REPLICA_FALLBACKS = metrics_registry.counter(
+    "db_replica_fallbacks_total", "沒有可用副本而改由主庫處理的查詢數"
+)
+REPLICA_LAG = metrics_registry.gauge(
+    "db_replica_lag_seconds", "唯讀副本複寫延遲"
+)
+REPLICA_HEALTHY = metrics_registry.gauge(
+    "db_replica_healthy", "唯讀副本是否可用（1 可用 / 0 不可用）"
+)
+
+# 會話 info 鍵
+USE_REPLICA = "use_replica"
+HAS_WRITTEN = "has_written"
+
+# 各資料庫查詢複寫延遲（秒）的語句，主庫或無法判斷時返回 0
+LAG_QUERIES = {
+    "postgresql": (
+        "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    ),
+}
+
+class Replica:
+    """唯讀副本與其健康狀態"""
+    
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        # 首次健康檢查通過前不使用
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.latency: Optional[float] = None
+
+class ReplicaSet:
+    """唯讀副本集合，定期檢查連線延遲與複寫延遲"""
+    
+    def __init__(self, engines: List[AsyncEngine], selection: str, max_lag: float,
+                 check_interval: float, check_timeout: float):
+        if selection not in ("round_robin", "least_latency"):
+            raise ValueError(f"不支援的副本選擇策略: {selection}")
+        self.replicas = [Replica(f"replica_{index}", engine) for index, engine in enumerate(engines)]
+        self.selection = selection
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._counter = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+    
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+    
+    def choose(self) -> Optional[Replica]:
+        """選擇一個可用副本，沒有可用副本時返回 None"""
+        candidates = [replica for replica in self.replicas if replica.healthy]
+        if not candidates:
+            return None
+        if self.selection == "least_latency":
+            return min(candidates, key=lambda replica: replica.latency or 0.0)
+        return candidates[next(self._counter) % len(candidates)]
+    
+    async def check(self):
+        """檢查所有副本"""
+        await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+    
+    async def _check(self, replica: Replica):
+        try:
+            start_time = time.perf_counter()
+            lag = await asyncio.wait_for(self._measure_lag(replica.engine), self.check_timeout)
+            latency = time.perf_counter() - start_time
+        except Exception as e:
+            if replica.healthy:
+                logger.warning("唯讀副本 %s 無法使用: %s", replica.name, e)
+            replica.healthy = False
+            REPLICA_HEALTHY.set(0, replica=replica.name)
+            return
+        
+        # 連線延遲取指數移動平均，避免單次抖動造成選擇來回切換
+        replica.latency = latency if replica.latency is None else 0.7 * replica.latency + 0.3 * latency
+        replica.lag = lag
+        healthy = lag is not None and lag <= self.max_lag
+        if healthy != replica.healthy:
+            logger.info("唯讀副本 %s %s（延遲 %s 秒）", replica.name, "恢復使用" if healthy else "延遲過高，暫停使用", lag)
+        replica.healthy = healthy
+        REPLICA_HEALTHY.set(1 if healthy else 0, replica=replica.name)
+        if lag is not None:
+            REPLICA_LAG.set(lag, replica=replica.name)
+    
+    @staticmethod
+    async def _measure_lag(engine: AsyncEngine) -> Optional[float]:
+        """返回複寫延遲秒數（複寫已停止時為 None）"""
+        async with engine.connect() as conn:
+            dialect = engine.dialect.name
+            if dialect == "mysql":
+                row = (await conn.execute(text("SHOW REPLICA STATUS"))).mappings().first()
+                if row is None:
+                    return 0.0
+                seconds = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+                return None if seconds is None else float(seconds)
+            if dialect in LAG_QUERIES:
+                return float(await conn.scalar(text(LAG_QUERIES[dialect])) or 0)
+            await conn.execute(text("SELECT 1"))
+            return 0.0
+    
+    def start(self):
+        """啟動健康檢查背景任務"""
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """停止健康檢查並釋放副本引擎"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        for replica in self.replicas:
+            await replica.engine.dispose()
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("唯讀副本健康檢查失敗")
+            await asyncio.sleep(self.check_interval)
+
+class RoutingSession(Session):
+    """依會話標記將唯讀查詢送往副本的 Session（作為 AsyncSession 的 sync_session_class）"""
+    
+    def __init__(self, *args, replicas: Optional[ReplicaSet] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+    
+    def get_bind(self, mapper=None, clause=None, **kwargs) -> Engine:
+        if isinstance(clause, UpdateBase):
+            self.info[HAS_WRITTEN] = True
+        elif (
+            self.replicas
+            and self.info.get(USE_REPLICA)
+            and not self.info.get(HAS_WRITTEN)
+            and not self._flushing
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+        ):
+            replica = self.replicas.choose()
+            if replica is not None:
+                REPLICA_QUERIES.inc(replica=replica.name)
+                return replica.engine.sync_engine
+            REPLICA_FALLBACKS.inc()
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_written(session, flush_context):
+    session.info[HAS_WRITTEN] = True
+
+def prefer_replica(db: AsyncSession) -> AsyncSession:
+    """將會話標記為優先讀取副本（寫入後自動回到主庫）"""
+    db.sync_session.info[USE_REPLICA] = True
+    return db
+
+def reads_from_replica(db: AsyncSession) -> bool:
+    """會話目前的唯讀查詢是否可能送往副本"""
+    session = db.sync_session
+    return bool(getattr(session, "replicas", None)) and session.info.get(USE_REPLICA) and not session.info.get(HAS_WRITTEN)
+
+def pin_primary(db: AsyncSession) -> AsyncSession:
+    """之後的查詢一律送往主庫（讀取結果將用於寫入時使用）"""
+    db.sync_session.info[HAS_WRITTEN] = True
+    return db
@@ -25,13 +25,17 @@ class CreateAdminUserSeeder(BaseSeeder):
             print("管理員用戶已存在，跳過創建")
             return
         
-        # 創建管理員用戶
-        admin_user = self.user_service.create_user(
-            db=db,
+        # 創建管理員用戶（seeder 為同步流程，直接在本進程計算雜湊）
+        password_hash, password_salt, password_iters = create_password_hash("Admin123!@#")
+        admin_user = self.user_service.create(
+            db,
             username="admin",
             email="admin@lazy.com",
             phone="+886912345678",
-            password="Admin123!@#"
+            password_hash=password_hash,
+            password_salt=password_salt,
+            password_iters=password_iters,
+            status=1
         )
         
         # 獲取管理員角色
@@ -1,13 +1,55 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import api_router
 from app.core.config import settings
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.instrumentation import RequestTimingMiddleware
+from app.core.metrics import metrics_registry
+from app.core.dependencies import metrics_access
+from app.core.password_hashing import password_hashing_pool
+from app.core.password_calibration import calibrate_password_hashing
+from app.core.password_rehash import password_rehasher
+from app.core.audit import login_event_sink
+from app.core.invalidation import invalidation_bus
+from app.core.session import session_tracker
+from app.db import replica_set
+from app.db.engine_registry import engine_registry
+from app.services.database_config_service import connection_test_executor
+from app.services.health_probe_service import health_prober
+from app.services.latency_rollup_service import rollup_retention_job
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """應用生命週期：啟動與關閉背景資源"""
+    calibrate_password_hashing()
+    invalidation_bus.start()
+    replica_set.start()
+    login_event_sink.start()
+    session_tracker.start()
+    password_rehasher.start()
+    if settings.PROBER_ENABLED:
+        health_prober.start()
+    rollup_retention_job.start()
+    yield
+    await rollup_retention_job.stop()
+    await health_prober.stop()
+    await password_rehasher.stop()
+    await session_tracker.stop()
+    await login_event_sink.stop()
+    await replica_set.stop()
+    await invalidation_bus.stop()
+    connection_test_executor.shutdown(wait=False, cancel_futures=True)
+    engine_registry.dispose_all()
+    password_hashing_pool.shutdown()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     description="LAZY FastAPI Backend",
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # 添加安全配置到 OpenAPI
@@ -56,8 +98,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# 請求延遲與資料庫時間量測
+if settings.METRICS_ENABLED:
+    app.add_middleware(
+        RequestTimingMiddleware,
+        query_warn_threshold=settings.REQUEST_QUERY_WARN_THRESHOLD,
+        server_timing=settings.DEBUG
+    )
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -69,6 +120,12 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False, dependencies=[Depends(metrics_access())])
+    async def metrics():
+        """Prometheus 格式的效能指標"""
+        return PlainTextResponse(metrics_registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
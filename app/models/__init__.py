@@ -6,13 +6,19 @@ from app.models.role import Role
 from app.models.permission import Permission
 from app.models.user_role import UserRole
 from app.models.role_permission import RolePermission
-from app.models.user_session import UserSession
+from app.models.user_session import UserSession, ConsumedRefreshToken
 from app.models.server import Server
 from app.models.database_config import DatabaseConfig, ConnectionTestLog
+from app.models.connection_test_rollup import ConnectionTestRollup
+from app.models.user_resource_counter import UserResourceCounter
+from app.models.cache_invalidation import CacheInvalidation
+from app.models.login_throttle import LoginThrottleCounter
 
 __all__ = [
     "Base", "User", "UserLoginEvent", 
     "PasswordReset", "Role", "Permission", 
-    "UserRole", "RolePermission", "UserSession",
-    "Server", "DatabaseConfig", "ConnectionTestLog"
+    "UserRole", "RolePermission", "UserSession", "ConsumedRefreshToken",
+    "Server", "DatabaseConfig", "ConnectionTestLog",
+    "ConnectionTestRollup", "UserResourceCounter", "CacheInvalidation",
+    "LoginThrottleCounter"
 ]
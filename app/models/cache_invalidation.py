@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from app.models.base import Base
+
+class CacheInvalidation(Base):
+    """跨 worker 快取失效事件（由各 worker 依 id 遞增輪詢）"""
+    __tablename__ = "cache_invalidations"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    topic = Column(String(50), nullable=False, comment="實體變更主題")
+    entity_key = Column(String(100), nullable=True, comment="實體鍵，空值表示整個主題失效")
+    origin = Column(String(64), nullable=False, comment="發布事件的 worker")
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f"<CacheInvalidation(id={self.id}, topic='{self.topic}', key='{self.entity_key}')>"
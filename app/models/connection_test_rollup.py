@@ -0,0 +1,77 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, UniqueConstraint
+from sqlalchemy.orm import relationship
+from app.models.base import Base
+from datetime import datetime
+from typing import Optional, List
+from pydantic import BaseModel, Field
+import enum
+
+class RollupResolution(str, enum.Enum):
+    """彙總粒度枚舉"""
+    MINUTE = "minute"
+    HOUR = "hour"
+    DAY = "day"
+
+class ConnectionTestRollup(Base):
+    """連接測試延遲彙總模型（每個配置、每個時間桶一筆）"""
+    __tablename__ = "connection_test_rollups"
+    __table_args__ = (
+        UniqueConstraint("connection_id", "resolution", "bucket_start", name="uq_connection_test_rollup_bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    connection_id = Column(Integer, ForeignKey("database_configs.id", ondelete="CASCADE"), nullable=False, index=True)
+    resolution = Column(String(8), nullable=False, comment="彙總粒度: minute/hour/day")
+    bucket_start = Column(DateTime, nullable=False, index=True, comment="時間桶起始時間")
+    count = Column(Integer, nullable=False, default=0, comment="測試次數")
+    failures = Column(Integer, nullable=False, default=0, comment="失敗次數")
+    min_ms = Column(Integer, nullable=True, comment="最小響應時間(毫秒)")
+    max_ms = Column(Integer, nullable=True, comment="最大響應時間(毫秒)")
+    sum_ms = Column(Integer, nullable=False, default=0, comment="響應時間總和(毫秒)")
+    sketch = Column(Text, nullable=True, comment="分位數草圖(JSON)")
+    
+    # 關聯關係
+    database_config = relationship("DatabaseConfig", back_populates="latency_rollups")
+    
+    def __repr__(self):
+        return f"<ConnectionTestRollup(connection_id={self.connection_id}, resolution='{self.resolution}', bucket_start='{self.bucket_start}')>"
+
+# Pydantic 模型
+class LatencyBucket(BaseModel):
+    bucket_start: datetime
+    count: int
+    failures: int
+    min_ms: Optional[int] = None
+    max_ms: Optional[int] = None
+    avg_ms: Optional[float] = None
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+
+class LatencyHistoryResponse(BaseModel):
+    resolution: RollupResolution
+    config_id: Optional[int] = None
+    server_id: Optional[int] = None
+    buckets: List[LatencyBucket]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "resolution": "hour",
+                "config_id": 1,
+                "server_id": None,
+                "buckets": [
+                    {
+                        "bucket_start": "2024-01-01T12:00:00",
+                        "count": 12,
+                        "failures": 1,
+                        "min_ms": 8,
+                        "max_ms": 130,
+                        "avg_ms": 21.5,
+                        "p50_ms": 15.1,
+                        "p95_ms": 97.2,
+                        "p99_ms": 129.4
+                    }
+                ]
+            }
+        }
@@ -50,6 +50,10 @@ class DatabaseConfig(Base):
     last_tested_at = Column(DateTime, nullable=True, comment="最後測試時間")
     test_status = Column(Enum(TestStatus), default=TestStatus.NEVER_TESTED, comment="測試狀態")
     test_error_message = Column(Text, comment="測試錯誤訊息")
+    next_probe_at = Column(DateTime, nullable=True, index=True, comment="下次背景探測時間")
+    probe_failures = Column(Integer, nullable=False, default=0, comment="連續探測失敗次數")
+    probe_lease_owner = Column(String(64), nullable=True, comment="探測租約持有者")
+    probe_lease_expires_at = Column(DateTime, nullable=True, comment="探測租約到期時間")
     created_at = Column(DateTime, default=func.now(), comment="創建時間")
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), comment="更新時間")
     
@@ -57,6 +61,7 @@ class DatabaseConfig(Base):
     user = relationship("User", back_populates="database_configs")
     server = relationship("Server", back_populates="database_configs")
     test_logs = relationship("ConnectionTestLog", back_populates="database_config", cascade="all, delete-orphan")
+    latency_rollups = relationship("ConnectionTestRollup", back_populates="database_config", cascade="all, delete-orphan")
     
     def __repr__(self):
         return f"<DatabaseConfig(id={self.id}, name='{self.config_name}', host='{self.host}')>"
@@ -73,7 +78,7 @@ class ConnectionTestLog(Base):
     response_time_ms = Column(Integer, nullable=True, comment="響應時間(毫秒)")
     error_message = Column(Text, nullable=True, comment="錯誤訊息")
     error_code = Column(String(50), nullable=True, comment="錯誤代碼")
-    tested_at = Column(DateTime, default=func.now(), comment="測試時間")
+    tested_at = Column(DateTime, default=func.now(), index=True, comment="測試時間")
     
     # 關聯關係
     database_config = relationship("DatabaseConfig", back_populates="test_logs")
@@ -174,8 +179,9 @@ class DatabaseConfigResponse(BaseModel):
         }
 
 class DatabaseConfigListResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # include_total=false 時不計算
     configs: List[DatabaseConfigResponse]
+    next_cursor: Optional[str] = None
     
     class Config:
         json_schema_extra = {
@@ -247,3 +253,30 @@ class DatabaseConfigTestResponse(BaseModel):
                 "error_code": None
             }
         }
+
+class DatabaseConfigBatchTestRequest(BaseModel):
+    config_ids: Optional[List[int]] = Field(None, example=[1, 2, 3])
+    server_id: Optional[int] = Field(None, example=1)
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "config_ids": [1, 2, 3],
+                "server_id": None
+            }
+        }
+
+class DatabaseConfigBatchTestResult(DatabaseConfigTestResponse):
+    config_id: int
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "config_id": 1,
+                "success": True,
+                "message": "連接測試成功",
+                "response_time_ms": 150,
+                "error_message": None,
+                "error_code": None
+            }
+        }
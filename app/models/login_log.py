@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Boolean, VARBINARY, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Boolean, VARBINARY, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from pydantic import BaseModel
 from datetime import datetime
@@ -7,6 +7,10 @@ from app.models.base import Base
 
 class UserLoginEvent(Base):
     __tablename__ = "user_login_events"
+    __table_args__ = (
+        # 登入日誌游標分頁 (occurred_at, id) 由新到舊
+        Index("ix_user_login_events_user_occurred", "user_id", "occurred_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, BigInteger
+from app.models.base import Base
+
+class LoginThrottleCounter(Base):
+    """登入失敗滑動視窗計數（資料庫節流後端，多個 worker 共用）"""
+    __tablename__ = "login_throttle_counters"
+    
+    throttle_key = Column(String(64), primary_key=True, comment="範圍與識別值的 SHA-256")
+    window_start = Column(BigInteger, primary_key=True, index=True, comment="視窗起始 epoch 秒")
+    attempts = Column(Integer, nullable=False, default=0, comment="視窗內的失敗次數")
+    
+    def __repr__(self):
+        return f"<LoginThrottleCounter(key='{self.throttle_key[:8]}', window={self.window_start}, attempts={self.attempts})>"
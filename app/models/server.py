@@ -77,8 +77,9 @@ class ServerResponse(ServerBase):
         }
 
 class ServerListResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # include_total=false 時不計算
     servers: List[ServerResponse]
+    next_cursor: Optional[str] = None
     
     class Config:
         json_schema_extra = {
@@ -0,0 +1,40 @@
+"""
+慢查詢統計模型
+"""
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+# Pydantic 模型
+class SlowQueryStat(BaseModel):
+    fingerprint: str
+    statement: str
+    count: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+    last_seen: Optional[datetime] = None
+
+class SlowQueryListResponse(BaseModel):
+    threshold_ms: float
+    since: datetime
+    queries: List[SlowQueryStat]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "threshold_ms": 200,
+                "since": "2024-01-01T00:00:00",
+                "queries": [
+                    {
+                        "fingerprint": "3f2a9c0d1b7e4a55",
+                        "statement": "SELECT servers.id, servers.name FROM servers WHERE servers.user_id = ? LIMIT ? OFFSET ?",
+                        "count": 12,
+                        "total_ms": 4210.5,
+                        "avg_ms": 350.88,
+                        "max_ms": 812.3,
+                        "last_seen": "2024-01-01T12:00:00"
+                    }
+                ]
+            }
+        }
@@ -1,9 +1,10 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, BigInteger, SmallInteger, VARBINARY
+from sqlalchemy import event, inspect, Column, Integer, String, DateTime, Boolean, Text, BigInteger, SmallInteger, VARBINARY
 from sqlalchemy.orm import relationship
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from app.models.base import Base
+from app.core.identifiers import normalize_email, normalize_phone
 
 class User(Base):
     __tablename__ = "users"
@@ -16,8 +17,12 @@ class User(Base):
     email = Column(String(191), unique=True, index=True, nullable=True)
     phone = Column(String(20), unique=True, index=True, nullable=True)
     
+    # 正規化識別碼（郵箱 casefold、電話 E.164），登入時以單一索引等值查詢
+    email_normalized = Column(String(191), unique=True, index=True, nullable=True)
+    phone_normalized = Column(String(20), unique=True, index=True, nullable=True)
+    
     # 密碼相關 (使用鹽值和迭代次數)
-    password_hash = Column(VARBINARY(64), nullable=False)
+    password_hash = Column(VARBINARY(255), nullable=False)  # PBKDF2 原始位元組或 passlib 格式字串
     password_salt = Column(VARBINARY(32), nullable=False)
     password_iters = Column(Integer, nullable=False, default=100000)
     
@@ -72,6 +77,22 @@ class User(Base):
         """檢查用戶是否已驗證郵箱"""
         return self.email_verified
 
+@event.listens_for(User, "before_insert")
+def _init_normalized_identifiers(mapper, connection, target):
+    """新增前填入正規化識別碼欄位"""
+    target.email_normalized = normalize_email(target.email)
+    target.phone_normalized = normalize_phone(target.phone)
+
+@event.listens_for(User, "before_update")
+def _sync_normalized_identifiers(mapper, connection, target):
+    """郵箱或電話變更時同步正規化識別碼欄位"""
+    # 只在原始欄位變更時重算：遷移時因正規化後重複而清空的值，不會在無關的更新中被寫回
+    state = inspect(target)
+    if state.attrs.email.history.has_changes():
+        target.email_normalized = normalize_email(target.email)
+    if state.attrs.phone.history.has_changes():
+        target.phone_normalized = normalize_phone(target.phone)
+
 class UserBase(BaseModel):
     username: str
     email: Optional[str] = None
@@ -84,6 +105,9 @@ class UserLogin(BaseModel):
     username: str  # 可以是用戶名、郵箱或電話
     password: str
 
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
 class UserResponse(UserBase):
     id: int
     status: int
@@ -128,4 +152,19 @@ class UserRegisterResponse(BaseModel):
     message: str
     user_id: int
     email: str
-    verification_required: bool = True
\ No newline at end of file
+    verification_required: bool = True
+
+class UserImportRowResult(BaseModel):
+    """批次匯入單列結果"""
+    row: int
+    username: Optional[str] = None
+    status: str  # created / failed
+    user_id: Optional[int] = None
+    error: Optional[str] = None
+
+class UserImportResponse(BaseModel):
+    """批次匯入響應模型"""
+    total: int
+    created: int
+    failed: int
+    results: List[UserImportRowResult]
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from datetime import datetime
+from app.models.base import Base
+
+class UserResourceCounter(Base):
+    """使用者資源計數（與資源的新增/刪除在同一交易中維護，列表總數不需掃描全表）"""
+    __tablename__ = "user_resource_counters"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    server_count = Column(Integer, nullable=False, default=0, comment="伺服器數")
+    database_config_count = Column(Integer, nullable=False, default=0, comment="資料庫配置數")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<UserResourceCounter(user_id={self.user_id}, servers={self.server_count}, configs={self.database_config_count})>"
@@ -18,9 +18,24 @@ class UserSession(Base):
     last_seen_at = Column(DateTime, nullable=True, index=True)
     revoked_at = Column(DateTime, nullable=True)
     
+    # 刷新令牌（僅儲存雜湊；上一個雜湊用於判斷並發刷新的寬限期，更早的令牌見 ConsumedRefreshToken）
+    refresh_token_hash = Column(String(64), nullable=True)
+    refresh_token_previous_hash = Column(String(64), nullable=True)
+    refresh_expires_at = Column(DateTime, nullable=True)
+    refresh_rotated_at = Column(DateTime, nullable=True)
+    
     # 關聯
     user = relationship("User", back_populates="user_sessions")
 
+class ConsumedRefreshToken(Base):
+    """已輪替的刷新令牌雜湊，任何一代再次使用時撤銷所屬會話"""
+    __tablename__ = "consumed_refresh_tokens"
+    
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    session_id = Column(String(64), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False, unique=True)
+    consumed_at = Column(DateTime, nullable=False, index=True, default=datetime.utcnow)
+
 class UserSessionResponse(BaseModel):
     id: int
     user_id: int
@@ -2,83 +2,93 @@
 認證相關商務邏輯
 """
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-from sqlalchemy.orm import Session
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import User
+from app.core.principal import UserPrincipal, load_user_principal
 from app.models.login_log import UserLoginEvent
 from app.models.user_session import UserSession
 from app.services.user_service import UserService
+from app.services.base_service import BaseService
 from app.core.security import create_access_token, generate_password_reset_token, hash_token
-from app.core.session import create_user_session, revoke_user_sessions, is_session_valid
+from app.core.session import (
+    create_user_session, revoke_user_sessions, revoke_session, is_session_valid,
+    generate_session_id, create_refresh_token, rotate_refresh_token
+)
 from app.core.config import settings
+from app.core.audit import login_event_sink
+from app.core.login_throttle import login_throttle
+from app.core.identifiers import normalize_email, normalize_phone
 
 class AuthService:
     """認證服務類"""
     
     def __init__(self):
         self.user_service = UserService()
+        self.login_event_service = BaseService(UserLoginEvent)
     
-    def login(self, db: Session, username: str, password: str, 
+    async def login(self, db: AsyncSession, username: str, password: str, 
               ip_address: Optional[str], user_agent: Optional[str]) -> Dict[str, Any]:
         """用戶登入"""
         
-        # 查找用戶
-        user = self.user_service.get_by_username_or_email_or_phone(db, username, username, username)
+        # 失敗次數超限時在查詢用戶與密碼雜湊之前拒絕
+        await login_throttle.check(ip_address, username)
         
-        # 記錄登入嘗試
-        login_event = self._create_login_event(db, user, False, "用戶不存在", ip_address, user_agent)
+        # 查找用戶
+        user = await self.user_service.get_by_identifier(db, username)
         
+        # 用戶不存在時不記錄（user_id 不可為空）
         if not user:
+            await login_throttle.record_failure(ip_address, username)
             raise ValueError("使用者名稱或密碼錯誤")
         
         # 檢查用戶是否被鎖定
         if user.is_locked:
-            login_event.succeeded = False
-            login_event.reason = 4  # 帳號鎖定
-            login_event.user_id = user.id
-            db.commit()
+            await login_throttle.record_failure(ip_address, username)
+            self._record_login_event(user, False, 4, ip_address, user_agent)  # 帳號鎖定
             raise ValueError("帳號已被鎖定，請稍後再試")
         
         # 驗證密碼
-        if not self.user_service.authenticate_user(db, username, password):
-            login_event.user_id = user.id
-            login_event.reason = 2  # 密碼錯誤
-            db.commit()
+        if not await self.user_service.authenticate_user(db, username, password):
+            await login_throttle.record_failure(ip_address, username)
+            self._record_login_event(user, False, 2, ip_address, user_agent)  # 密碼錯誤
             raise ValueError("使用者名稱或密碼錯誤")
         
         # 檢查用戶是否活躍
         if not user.is_active:
-            login_event.user_id = user.id
-            login_event.reason = 4  # 帳號停用
-            db.commit()
+            self._record_login_event(user, False, 4, ip_address, user_agent)  # 帳號停用
             raise ValueError("帳號已被停用")
         
         # 檢查郵箱是否已驗證（暫時禁用用於測試）
         # if not user.is_verified:
-        #     login_event.user_id = user.id
-        #     login_event.reason = 5  # 郵箱未驗證
-        #     db.commit()
+        #     self._record_login_event(user, False, 5, ip_address, user_agent)  # 郵箱未驗證
         #     raise ValueError("請先驗證郵箱後再登入")
         
         # 登入成功
-        self.user_service.reset_failed_login_count(db, user, ip_address)
+        await self.user_service.reset_failed_login_count(db, user, ip_address)
+        await login_throttle.reset(ip_address, username)
         
-        # 創建訪問令牌
-        access_token = self._create_access_token(user)
+        # 創建訪問令牌與刷新令牌（之後以刷新令牌換發訪問令牌，不需重新驗證密碼）
+        session_id = generate_session_id()
+        access_token = self._create_access_token(user, session_id)
+        refresh_token = create_refresh_token(session_id)
         
         # 創建會話
-        session = create_user_session(user, access_token, ip_address, user_agent, db)
+        session = await create_user_session(
+            user, access_token, ip_address, user_agent, db,
+            session_id=session_id, refresh_token=refresh_token
+        )
         
         # 記錄成功登入
-        login_event.succeeded = True
-        login_event.reason = 1  # 成功
-        login_event.user_id = user.id
-        db.commit()
+        self._record_login_event(user, True, 1, ip_address, user_agent)  # 成功
         
         return {
             "access_token": access_token,
             "token_type": "bearer",
             "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+            "refresh_token": refresh_token,
+            "refresh_expires_in": settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400,
             "user": {
                 "id": user.id,
                 "username": user.username,
@@ -91,28 +101,45 @@ class AuthService:
             "session_id": session.session_id
         }
     
-    def logout(self, db: Session, user: User, session_id: Optional[str] = None):
+    async def refresh(self, db: AsyncSession, refresh_token: str) -> Dict[str, Any]:
+        """以刷新令牌換發訪問令牌（刷新令牌同時輪替）"""
+        session, new_refresh_token = await rotate_refresh_token(refresh_token, db)
+        
+        user = await load_user_principal(db, session.user_id)
+        if user is None or not user.is_active:
+            await revoke_session(session.session_id, db)
+            raise ValueError("帳號已被停用")
+        
+        return {
+            "access_token": self._create_access_token(user, session.session_id),
+            "token_type": "bearer",
+            "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+            "refresh_token": new_refresh_token,
+            "refresh_expires_in": settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400,
+            "session_id": session.session_id
+        }
+    
+    async def logout(self, db: AsyncSession, user: UserPrincipal, session_id: Optional[str] = None):
         """用戶登出"""
         if session_id:
             # 撤銷特定會話
-            from app.core.session import revoke_session
-            revoke_session(session_id, db)
+            await revoke_session(session_id, db)
         else:
             # 撤銷用戶所有會話
-            revoke_user_sessions(user.id, db)
+            await revoke_user_sessions(user.id, db)
         
         return {"message": "登出成功"}
     
-    def request_password_reset(self, db: Session, username: str) -> Dict[str, str]:
+    async def request_password_reset(self, db: AsyncSession, username: str) -> Dict[str, str]:
         """請求密碼重設"""
-        user = self.user_service.get_by_username_or_email_or_phone(db, username, username, username)
+        user = await self.user_service.get_by_identifier(db, username)
         
         if not user:
             # 為了安全，即使用戶不存在也返回成功消息
             return {"message": "如果該郵箱存在，重設密碼的郵件已發送"}
         
         # 生成重設令牌
-        token = self.user_service.set_password_reset_token(db, user)
+        token = await self.user_service.set_password_reset_token(db, user)
         
         # 在實際應用中，這裡應該發送郵件
         # 現在我們只是記錄令牌（僅用於開發測試）
@@ -120,16 +147,16 @@ class AuthService:
         
         return {"message": "如果該郵箱存在，重設密碼的郵件已發送"}
     
-    def confirm_password_reset(self, db: Session, token: str, new_password: str) -> Dict[str, str]:
+    async def confirm_password_reset(self, db: AsyncSession, token: str, new_password: str) -> Dict[str, str]:
         """確認密碼重設"""
-        success = self.user_service.reset_password_with_token(db, token, new_password)
+        success = await self.user_service.reset_password_with_token(db, token, new_password)
         
         if not success:
             raise ValueError("無效或已過期的重設令牌")
         
         return {"message": "密碼重設成功"}
     
-    def verify_token(self, db: Session, token: str) -> Optional[User]:
+    async def verify_token(self, db: AsyncSession, token: str) -> Optional[User]:
         """驗證令牌並返回用戶"""
         from app.core.security import verify_token
         payload = verify_token(token)
@@ -141,29 +168,31 @@ class AuthService:
         if not user_id:
             return None
         
-        user = self.user_service.get_by_id(db, int(user_id))
+        user = await self.user_service.get_by_id_async(db, int(user_id))
         if not user or not user.is_active:
             return None
         
         return user
     
-    def get_user_login_logs(self, db: Session, user_id: int, skip: int = 0, limit: int = 100):
-        """獲取用戶登入日誌"""
-        return db.query(UserLoginEvent).filter(
-            UserLoginEvent.user_id == user_id
-        ).order_by(UserLoginEvent.occurred_at.desc()).offset(skip).limit(limit).all()
+    async def get_user_login_logs(self, db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100,
+                                  cursor: Optional[str] = None) -> Tuple[List[UserLoginEvent], Optional[str]]:
+        """獲取用戶登入日誌（新到舊），返回 (日誌, 下一頁游標)"""
+        return await self.login_event_service.paginate_async(
+            db, select(UserLoginEvent).where(UserLoginEvent.user_id == user_id), cursor, skip, limit,
+            keys=(UserLoginEvent.occurred_at, UserLoginEvent.id), descending=True
+        )
     
-    def _create_access_token(self, user: User) -> str:
-        """創建訪問令牌"""
+    def _create_access_token(self, user: User, session_id: str) -> str:
+        """創建訪問令牌（sid 為所屬會話）"""
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         return create_access_token(
-            data={"sub": str(user.id), "username": user.username},
+            data={"sub": str(user.id), "username": user.username, "sid": session_id},
             expires_delta=access_token_expires
         )
     
-    def _create_login_event(self, db: Session, user: Optional[User], succeeded: bool, 
-                          reason: str, ip_address: Optional[str], user_agent: Optional[str]) -> UserLoginEvent:
-        """創建登入事件記錄"""
+    def _record_login_event(self, user: User, succeeded: bool, reason: int,
+                            ip_address: Optional[str], user_agent: Optional[str]):
+        """記錄登入事件（交由稽核寫入器批次寫入）"""
         # 轉換 IP 地址為二進制
         ip_binary = None
         if ip_address:
@@ -176,22 +205,16 @@ class AuthService:
             except socket.error:
                 pass
         
-        # 轉換原因為數字
-        reason_code = 1 if succeeded else 2  # 1: 成功, 2: 失敗
-        
-        login_event = UserLoginEvent(
-            user_id=user.id if user else None,
-            succeeded=succeeded,
-            reason=reason_code,
-            ip=ip_binary,
-            user_agent=user_agent[:255] if user_agent else None,
-            occurred_at=datetime.utcnow()
-        )
-        
-        db.add(login_event)
-        return login_event
+        login_event_sink.record({
+            "user_id": user.id,
+            "succeeded": succeeded,
+            "reason": reason,
+            "ip": ip_binary,
+            "user_agent": user_agent[:255] if user_agent else None,
+            "occurred_at": datetime.utcnow()
+        })
     
-    def register_user(self, db: Session, username: str, email: str, phone: Optional[str], 
+    async def register_user(self, db: AsyncSession, username: str, email: str, phone: Optional[str], 
                      password: str, confirm_password: str) -> Dict[str, Any]:
         """用戶註冊"""
         
@@ -200,17 +223,17 @@ class AuthService:
             raise ValueError("密碼和確認密碼不匹配")
         
         # 檢查用戶名、郵箱、電話是否已存在
-        existing_user = self.user_service.get_by_username_or_email_or_phone(db, username, email, phone)
+        existing_user = await self.user_service.get_by_username_or_email_or_phone(db, username, email, phone)
         if existing_user:
             if existing_user.username == username:
                 raise ValueError("用戶名已存在")
-            elif existing_user.email == email:
+            elif email and existing_user.email_normalized == normalize_email(email):
                 raise ValueError("郵箱已被註冊")
-            elif existing_user.phone == phone:
+            elif phone and existing_user.phone_normalized == normalize_phone(phone):
                 raise ValueError("電話號碼已被註冊")
         
         # 創建用戶（未驗證狀態）
-        user = self.user_service.create_user(
+        user = await self.user_service.create_user(
             db=db,
             username=username,
             email=email,
@@ -223,13 +246,13 @@ class AuthService:
         user.status = 0  # 停用狀態，等待郵箱驗證
         
         # 生成郵箱驗證令牌
-        verification_token = self.user_service.set_email_verification_token(db, user)
+        verification_token = await self.user_service.set_email_verification_token(db, user)
         
         # 在實際應用中，這裡應該發送郵件
         # 現在我們只是記錄令牌（僅用於開發測試）
         print(f"郵箱驗證令牌 (僅開發用): {verification_token}")
         
-        db.commit()
+        await db.commit()
         
         return {
             "message": "註冊成功，請檢查郵箱進行驗證",
@@ -238,9 +261,9 @@ class AuthService:
             "verification_required": True
         }
     
-    def verify_email(self, db: Session, token: str) -> Dict[str, str]:
+    async def verify_email(self, db: AsyncSession, token: str) -> Dict[str, str]:
         """驗證郵箱"""
-        success = self.user_service.verify_email_with_token(db, token)
+        success = await self.user_service.verify_email_with_token(db, token)
         
         if not success:
             raise ValueError("無效或已過期的驗證令牌")
@@ -1,10 +1,13 @@
 """
 基礎 Service 類
 """
-from typing import Type, TypeVar, Generic, List, Optional, Dict, Any
+from typing import Type, TypeVar, Generic, List, Optional, Dict, Any, Sequence, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, select, func
+from sqlalchemy.sql import Select
 from app.db import get_db
+from app.core.pagination import encode_cursor, decode_cursor
 
 T = TypeVar('T')
 
@@ -57,3 +60,76 @@ class BaseService(Generic[T]):
     def exists(self, db: Session, id: int) -> bool:
         """檢查記錄是否存在"""
         return db.query(self.model_class).filter(self.model_class.id == id).first() is not None
+    
+    async def create_async(self, db: AsyncSession, **kwargs) -> T:
+        """創建記錄（非同步）"""
+        obj = self.model_class(**kwargs)
+        db.add(obj)
+        await db.commit()
+        await db.refresh(obj)
+        return obj
+    
+    async def get_by_id_async(self, db: AsyncSession, id: int) -> Optional[T]:
+        """根據 ID 獲取記錄（非同步）"""
+        result = await db.execute(select(self.model_class).where(self.model_class.id == id))
+        return result.scalars().first()
+    
+    async def get_all_async(self, db: AsyncSession, skip: int = 0, limit: int = 100,
+                            cursor: Optional[str] = None) -> Tuple[List[T], Optional[str]]:
+        """獲取所有記錄（非同步），返回 (記錄, 下一頁游標)"""
+        return await self.paginate_async(db, select(self.model_class), cursor, skip, limit)
+    
+    async def paginate_async(self, db: AsyncSession, query: Select, cursor: Optional[str] = None,
+                             skip: int = 0, limit: int = 100, keys: Optional[Sequence[Any]] = None,
+                             descending: bool = False) -> Tuple[List[T], Optional[str]]:
+        """鍵集（游標）分頁，返回 (記錄, 下一頁游標)；未提供游標時退回 offset 分頁"""
+        keys = list(keys) if keys is not None else [self.model_class.id]
+        if cursor:
+            # (k1, k2) > (v1, v2) 展開為 k1 > v1 OR (k1 = v1 AND k2 > v2)，各資料庫皆可使用索引
+            values = decode_cursor(cursor, [key.type.python_type for key in keys])
+            clauses = []
+            for index, key in enumerate(keys):
+                bound = key < values[index] if descending else key > values[index]
+                clauses.append(and_(*[keys[i] == values[i] for i in range(index)], bound))
+            query = query.where(or_(*clauses))
+        elif skip:
+            query = query.offset(skip)
+        query = query.order_by(*[key.desc() if descending else key.asc() for key in keys])
+        
+        # 多取一筆判斷是否還有下一頁
+        result = await db.execute(query.limit(limit + 1))
+        items = list(result.scalars().all())
+        if len(items) <= limit:
+            return items, None
+        items = items[:limit]
+        return items, encode_cursor([getattr(items[-1], key.key) for key in keys])
+    
+    async def update_async(self, db: AsyncSession, id: int, **kwargs) -> Optional[T]:
+        """更新記錄（非同步）"""
+        obj = await self.get_by_id_async(db, id)
+        if obj:
+            for key, value in kwargs.items():
+                if hasattr(obj, key):
+                    setattr(obj, key, value)
+            await db.commit()
+            await db.refresh(obj)
+        return obj
+    
+    async def delete_async(self, db: AsyncSession, id: int) -> bool:
+        """刪除記錄（非同步）"""
+        obj = await self.get_by_id_async(db, id)
+        if obj:
+            await db.delete(obj)
+            await db.commit()
+            return True
+        return False
+    
+    async def count_async(self, db: AsyncSession) -> int:
+        """統計記錄數量（非同步）"""
+        result = await db.execute(select(func.count()).select_from(self.model_class))
+        return result.scalar_one()
+    
+    async def exists_async(self, db: AsyncSession, id: int) -> bool:
+        """檢查記錄是否存在（非同步）"""
+        result = await db.execute(select(self.model_class.id).where(self.model_class.id == id))
+        return result.first() is not None
@@ -1,37 +1,61 @@
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from sqlalchemy import create_engine
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select, update, insert, text, func
 from sqlalchemy.exc import SQLAlchemyError
+from fastapi.concurrency import run_in_threadpool
 from cryptography.fernet import Fernet
+import asyncio
 import base64
+import hashlib
 import time
 import logging
+from datetime import datetime
 from app.models.database_config import (
     DatabaseConfig, DatabaseConfigCreate, DatabaseConfigUpdate, 
     DatabaseType, TestStatus, TestType, TestResult, ConnectionTestLog
 )
+from app.core.config import settings
 from app.services.base_service import BaseService
+from app.services.latency_rollup_service import LatencyRollupService
+from app.services.resource_counter_service import ResourceCounterService
+from app.db.engine_registry import engine_registry
+from app.core.invalidation import invalidation_bus, DATABASE_CONFIG_CHANGED
 
 logger = logging.getLogger(__name__)
 
+# 連接測試使用的有界執行緒池（批次測試與背景探測共用）；asyncio.wait_for 逾時只會放棄等待，
+# 執行緒要等驅動呼叫返回才會釋放，因此引擎另以 connect_args 設定驅動層的連線與讀寫逾時（見 engine_registry）
+connection_test_executor = ThreadPoolExecutor(
+    max_workers=settings.CONNECTION_TEST_BATCH_CONCURRENCY,
+    thread_name_prefix="db-connection-test"
+)
+
+def get_encryption_key() -> bytes:
+    """獲取配置密碼加密密鑰，未設定時由 SECRET_KEY 推導，確保各實例及重啟後一致"""
+    if settings.DATABASE_CONFIG_ENCRYPTION_KEY:
+        return settings.DATABASE_CONFIG_ENCRYPTION_KEY.encode('utf-8')
+    digest = hashlib.sha256(settings.SECRET_KEY.encode('utf-8')).digest()
+    return base64.urlsafe_b64encode(digest)
+
 class DatabaseConfigService(BaseService[DatabaseConfig]):
     """資料庫配置服務"""
     
     def __init__(self):
         super().__init__(DatabaseConfig)
-        # 生成加密密鑰（實際應用中應該從環境變數或配置文件中讀取）
-        # 這裡為了演示方便直接生成，實際應保持一致
-        self.encryption_key = Fernet.generate_key() 
+        self.encryption_key = get_encryption_key()
         self.cipher_suite = Fernet(self.encryption_key)
+        self.rollup_service = LatencyRollupService()
+        self.counter_service = ResourceCounterService()
     
-    def create_config(self, db: Session, user_id: int, config_data: DatabaseConfigCreate) -> DatabaseConfig:
+    async def create_config(self, db: AsyncSession, user_id: int, config_data: DatabaseConfigCreate) -> DatabaseConfig:
         """創建資料庫配置"""
         # 檢查配置名稱是否已存在於該伺服器下
-        existing_config = db.query(DatabaseConfig).filter(
+        result = await db.execute(select(DatabaseConfig).where(
             and_(DatabaseConfig.server_id == config_data.server_id, 
                  DatabaseConfig.config_name == config_data.config_name)
-        ).first()
+        ))
+        existing_config = result.scalars().first()
         if existing_config:
             raise ValueError("配置名稱已存在於該伺服器下")
         
@@ -40,57 +64,82 @@ class DatabaseConfigService(BaseService[DatabaseConfig]):
         
         # 如果設為預設，先取消其他配置的預設狀態
         if config_data.is_default:
-            db.query(DatabaseConfig).filter(
+            await db.execute(update(DatabaseConfig).where(
                 and_(DatabaseConfig.server_id == config_data.server_id, 
                      DatabaseConfig.is_default == True)
-            ).update({"is_default": False})
+            ).values(is_default=False))
         
         config_dict = config_data.dict()
         config_dict.pop('password')  # 移除原始密碼
         config_dict['password_hash'] = encrypted_password
         
-        config = self.create(db, user_id=user_id, **config_dict)
+        # 計數與新增在同一交易中提交
+        await self.counter_service.adjust(db, user_id, database_configs=1)
+        config = await self.create_async(db, user_id=user_id, **config_dict)
         return config
     
-    def get_user_configs(self, db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[DatabaseConfig]:
-        """獲取使用者所有資料庫配置"""
-        return db.query(DatabaseConfig).filter(DatabaseConfig.user_id == user_id).offset(skip).limit(limit).all()
+    async def get_user_configs(self, db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100,
+                               cursor: Optional[str] = None) -> Tuple[List[DatabaseConfig], Optional[str]]:
+        """獲取使用者所有資料庫配置，返回 (配置, 下一頁游標)"""
+        query = select(DatabaseConfig).where(DatabaseConfig.user_id == user_id)
+        return await self.paginate_async(db, query, cursor, skip, limit)
     
-    def get_server_configs(self, db: Session, server_id: int, user_id: int, skip: int = 0, limit: int = 100) -> List[DatabaseConfig]:
-        """獲取指定伺服器的資料庫配置"""
-        return db.query(DatabaseConfig).filter(
+    async def get_server_configs(self, db: AsyncSession, server_id: int, user_id: int, skip: int = 0, limit: int = 100,
+                                 cursor: Optional[str] = None) -> Tuple[List[DatabaseConfig], Optional[str]]:
+        """獲取指定伺服器的資料庫配置，返回 (配置, 下一頁游標)"""
+        query = select(DatabaseConfig).where(
             and_(DatabaseConfig.server_id == server_id, DatabaseConfig.user_id == user_id)
-        ).offset(skip).limit(limit).all()
+        )
+        return await self.paginate_async(db, query, cursor, skip, limit)
+    
+    async def count_user_configs(self, db: AsyncSession, user_id: int) -> int:
+        """使用者資料庫配置總數（讀取計數快取）"""
+        return await self.counter_service.get_database_config_total(db, user_id)
     
-    def get_config_by_id(self, db: Session, config_id: int, user_id: int) -> Optional[DatabaseConfig]:
+    async def count_server_configs(self, db: AsyncSession, server_id: int, user_id: int) -> int:
+        """指定伺服器的資料庫配置總數（以 server_id 索引計數，範圍限於單一伺服器）"""
+        return await db.scalar(select(func.count()).select_from(DatabaseConfig).where(
+            and_(DatabaseConfig.server_id == server_id, DatabaseConfig.user_id == user_id)
+        ))
+    
+    async def get_server_config_ids(self, db: AsyncSession, server_id: int, user_id: int) -> List[int]:
+        """獲取指定伺服器下所有配置的 ID"""
+        result = await db.execute(select(DatabaseConfig.id).where(
+            and_(DatabaseConfig.server_id == server_id, DatabaseConfig.user_id == user_id)
+        ))
+        return list(result.scalars().all())
+    
+    async def get_config_by_id(self, db: AsyncSession, config_id: int, user_id: int) -> Optional[DatabaseConfig]:
         """根據ID獲取資料庫配置，並驗證使用者權限"""
-        return db.query(DatabaseConfig).filter(
+        result = await db.execute(select(DatabaseConfig).where(
             and_(DatabaseConfig.id == config_id, DatabaseConfig.user_id == user_id)
-        ).first()
+        ))
+        return result.scalars().first()
     
-    def update_config(self, db: Session, config_id: int, user_id: int, update_data: DatabaseConfigUpdate) -> Optional[DatabaseConfig]:
+    async def update_config(self, db: AsyncSession, config_id: int, user_id: int, update_data: DatabaseConfigUpdate) -> Optional[DatabaseConfig]:
         """更新資料庫配置"""
-        config = self.get_config_by_id(db, config_id, user_id)
+        config = await self.get_config_by_id(db, config_id, user_id)
         if not config:
             return None
         
         # 檢查更新後的配置名稱是否與其他配置衝突
         if update_data.config_name and update_data.config_name != config.config_name:
-            existing_config = db.query(DatabaseConfig).filter(
+            result = await db.execute(select(DatabaseConfig).where(
                 and_(DatabaseConfig.server_id == config.server_id, 
                      DatabaseConfig.config_name == update_data.config_name, 
                      DatabaseConfig.id != config_id)
-            ).first()
+            ))
+            existing_config = result.scalars().first()
             if existing_config:
                 raise ValueError("配置名稱已存在於該伺服器下")
         
         # 如果設為預設，先取消其他配置的預設狀態
         if update_data.is_default:
-            db.query(DatabaseConfig).filter(
+            await db.execute(update(DatabaseConfig).where(
                 and_(DatabaseConfig.server_id == config.server_id, 
                      DatabaseConfig.is_default == True,
                      DatabaseConfig.id != config_id)
-            ).update({"is_default": False})
+            ).values(is_default=False))
         
         update_dict = update_data.dict(exclude_unset=True)
         
@@ -99,37 +148,43 @@ class DatabaseConfigService(BaseService[DatabaseConfig]):
             update_dict['password_hash'] = self._encrypt_password(update_dict['password'])
             update_dict.pop('password')
         
-        updated_config = self.update(db, config_id, **update_dict)
+        updated_config = await self.update_async(db, config_id, **update_dict)
+        invalidation_bus.publish(DATABASE_CONFIG_CHANGED, config_id)
         return updated_config
     
-    def delete_config(self, db: Session, config_id: int, user_id: int) -> bool:
+    async def delete_config(self, db: AsyncSession, config_id: int, user_id: int) -> bool:
         """刪除資料庫配置"""
-        config = self.get_config_by_id(db, config_id, user_id)
+        config = await self.get_config_by_id(db, config_id, user_id)
         if not config:
             return False
-        return self.delete(db, config_id)
+        await self.counter_service.adjust(db, user_id, database_configs=-1)
+        deleted = await self.delete_async(db, config_id)
+        invalidation_bus.publish(DATABASE_CONFIG_CHANGED, config_id)
+        return deleted
     
-    def get_default_config(self, db: Session, server_id: int, user_id: int) -> Optional[DatabaseConfig]:
+    async def get_default_config(self, db: AsyncSession, server_id: int, user_id: int) -> Optional[DatabaseConfig]:
         """獲取指定伺服器的預設資料庫配置"""
-        return db.query(DatabaseConfig).filter(
+        result = await db.execute(select(DatabaseConfig).where(
             and_(DatabaseConfig.server_id == server_id, 
                  DatabaseConfig.user_id == user_id,
                  DatabaseConfig.is_default == True)
-        ).first()
+        ))
+        return result.scalars().first()
     
-    def test_connection(self, db: Session, config_id: int, user_id: int) -> Dict[str, Any]:
+    async def test_connection(self, db: AsyncSession, config_id: int, user_id: int) -> Dict[str, Any]:
         """測試資料庫連接（保存結果）"""
-        config = self.get_config_by_id(db, config_id, user_id)
+        config = await self.get_config_by_id(db, config_id, user_id)
         if not config:
             raise ValueError("配置不存在或無權限訪問")
         
         # 解密密碼
         decrypted_password = self._decrypt_password(config.password_hash)
         
-        # 測試連接
-        test_result = self._test_database_connection(
+        # 測試連接（阻塞的驅動呼叫在執行緒池中進行）
+        test_result = await run_in_threadpool(
+            self._test_database_connection,
             config.host, config.port, config.database_name, 
-            config.username, decrypted_password, config.db_type
+            config.username, decrypted_password, config.db_type, config_id
         )
         
         # 更新配置的測試狀態
@@ -138,19 +193,116 @@ class DatabaseConfigService(BaseService[DatabaseConfig]):
         config.test_error_message = test_result.get('error_message')
         
         # 記錄測試日誌
-        self._log_test_result(db, config_id, user_id, TestType.CONNECTION, test_result)
+        await self._log_test_result(db, config_id, user_id, TestType.CONNECTION, test_result)
         
-        db.commit()
+        await db.commit()
         
         return test_result
     
-    def test_connection_without_save(self, test_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def test_connection_without_save(self, test_data: Dict[str, Any]) -> Dict[str, Any]:
         """測試資料庫連接（不保存結果）"""
-        return self._test_database_connection(
+        return await run_in_threadpool(
+            self._test_database_connection,
             test_data['host'], test_data['port'], test_data['database_name'],
             test_data['username'], test_data['password'], test_data['db_type']
         )
     
+    async def get_batch_test_configs(self, db: AsyncSession, user_id: int, config_ids: Optional[List[int]] = None,
+                                     server_id: Optional[int] = None) -> List[DatabaseConfig]:
+        """獲取批次測試的配置（僅限使用者自己的配置）"""
+        query = select(DatabaseConfig).where(DatabaseConfig.user_id == user_id)
+        if config_ids is not None:
+            query = query.where(DatabaseConfig.id.in_(config_ids))
+        if server_id is not None:
+            query = query.where(DatabaseConfig.server_id == server_id)
+        result = await db.execute(query.order_by(DatabaseConfig.id))
+        return list(result.scalars().all())
+    
+    async def test_connections_batch(self, configs: List[DatabaseConfig], user_id: int) -> AsyncIterator[Dict[str, Any]]:
+        """並行測試多個資料庫連接，依完成順序逐筆返回結果，最後批次保存"""
+        # 先取出測試所需欄位，測試期間不再存取 ORM 物件
+        targets = [
+            (config.id, config.host, config.port, config.database_name, config.username,
+             self._decrypt_password(config.password_hash), config.db_type)
+            for config in configs
+        ]
+        semaphore = asyncio.Semaphore(settings.CONNECTION_TEST_BATCH_CONCURRENCY)
+        
+        async def run_test(target) -> Dict[str, Any]:
+            async with semaphore:
+                result = await self.run_connection_test(*target)
+            return {'config_id': target[0], **result}
+        
+        results = []
+        tasks = [asyncio.ensure_future(run_test(target)) for target in targets]
+        try:
+            for future in asyncio.as_completed(tasks):
+                result = await future
+                results.append(result)
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            if results:
+                await self._save_batch_results(user_id, results)
+    
+    async def run_connection_test(self, config_id: Optional[int], host: str, port: int, database_name: str,
+                                  username: str, password: str, db_type: DatabaseType) -> Dict[str, Any]:
+        """在有界執行緒池中測試連接，超過 CONNECTION_TEST_TIMEOUT_SECONDS 視為失敗"""
+        loop = asyncio.get_running_loop()
+        start_time = time.time()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(
+                    connection_test_executor, self._test_database_connection,
+                    host, port, database_name, username, password, db_type, config_id
+                ),
+                timeout=settings.CONNECTION_TEST_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            return {
+                'success': False,
+                'message': '連接測試逾時',
+                'response_time_ms': int((time.time() - start_time) * 1000),
+                'tested_at': datetime.utcnow(),
+                'error_message': f"超過 {settings.CONNECTION_TEST_TIMEOUT_SECONDS} 秒未回應",
+                'error_code': 'TimeoutError'
+            }
+    
+    async def _save_batch_results(self, user_id: int, results: List[Dict[str, Any]]):
+        """以單次批量插入保存測試日誌，並更新各配置的測試狀態"""
+        # 串流回應期間請求的資料庫會話可能已關閉，使用獨立會話
+        from app.db import AsyncSessionLocal
+        
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(ConnectionTestLog), [
+                {
+                    'connection_id': result['config_id'],
+                    'user_id': user_id,
+                    'test_type': TestType.CONNECTION,
+                    'status': TestResult.SUCCESS if result['success'] else TestResult.FAILED,
+                    'response_time_ms': result.get('response_time_ms'),
+                    'error_message': result.get('error_message'),
+                    'error_code': result.get('error_code'),
+                    'tested_at': result['tested_at']
+                }
+                for result in results
+            ])
+            await db.execute(update(DatabaseConfig), [
+                {
+                    'id': result['config_id'],
+                    'test_status': TestStatus.SUCCESS if result['success'] else TestStatus.FAILED,
+                    'last_tested_at': result['tested_at'],
+                    'test_error_message': result.get('error_message')
+                }
+                for result in results
+            ])
+            await self.rollup_service.record(db, [
+                (result['config_id'], result.get('response_time_ms'), result['success'], result['tested_at'])
+                for result in results
+            ])
+            await db.commit()
+    
     def _encrypt_password(self, password: str) -> str:
         """加密密碼"""
         password_bytes = password.encode('utf-8')
@@ -168,8 +320,9 @@ class DatabaseConfigService(BaseService[DatabaseConfig]):
             return ""
     
     def _test_database_connection(self, host: str, port: int, database_name: str, 
-                                 username: str, password: str, db_type: DatabaseType) -> Dict[str, Any]:
-        """測試資料庫連接"""
+                                 username: str, password: str, db_type: DatabaseType,
+                                 config_id: Optional[int] = None) -> Dict[str, Any]:
+        """測試資料庫連接（重複使用引擎註冊表中的連接池）"""
         start_time = time.time()
         
         try:
@@ -183,15 +336,12 @@ class DatabaseConfigService(BaseService[DatabaseConfig]):
             else:
                 raise ValueError(f"不支援的資料庫類型: {db_type}")
             
-            # 創建引擎並測試連接
-            engine = create_engine(connection_string, pool_pre_ping=True)
+            # 獲取快取的引擎並測試連接
+            engine = engine_registry.get_engine(config_id, connection_string)
             
             with engine.connect() as connection:
                 # 執行簡單查詢測試連接
-                if db_type == DatabaseType.SQLITE:
-                    connection.execute("SELECT 1")
-                else:
-                    connection.execute("SELECT 1")
+                connection.execute(text("SELECT 1"))
             
             response_time = int((time.time() - start_time) * 1000)
             
@@ -199,7 +349,7 @@ class DatabaseConfigService(BaseService[DatabaseConfig]):
                 'success': True,
                 'message': '連接測試成功',
                 'response_time_ms': response_time,
-                'tested_at': time.time(),
+                'tested_at': datetime.utcnow(),
                 'error_message': None,
                 'error_code': None
             }
@@ -215,12 +365,12 @@ class DatabaseConfigService(BaseService[DatabaseConfig]):
                 'success': False,
                 'message': '連接測試失敗',
                 'response_time_ms': response_time,
-                'tested_at': time.time(),
+                'tested_at': datetime.utcnow(),
                 'error_message': error_message,
                 'error_code': error_code
             }
     
-    def _log_test_result(self, db: Session, config_id: int, user_id: int, 
+    async def _log_test_result(self, db: AsyncSession, config_id: int, user_id: int, 
                         test_type: TestType, test_result: Dict[str, Any]):
         """記錄測試結果"""
         test_log = ConnectionTestLog(
@@ -230,8 +380,12 @@ class DatabaseConfigService(BaseService[DatabaseConfig]):
             status=TestResult.SUCCESS if test_result['success'] else TestResult.FAILED,
             response_time_ms=test_result.get('response_time_ms'),
             error_message=test_result.get('error_message'),
-            error_code=test_result.get('error_code')
+            error_code=test_result.get('error_code'),
+            tested_at=test_result['tested_at']
         )
         
         db.add(test_log)
-        db.commit()
+        await self.rollup_service.record(db, [
+            (config_id, test_result.get('response_time_ms'), test_result['success'], test_result['tested_at'])
+        ])
+        await db.commit()
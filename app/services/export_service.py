@@ -0,0 +1,133 @@
+"""
+日誌匯出服務
+以伺服器端游標（yield_per）分批讀取，逐批編碼為 NDJSON 或 CSV 並可選 gzip 壓縮，記憶體用量不隨資料列數增長
+"""
+import csv
+import enum
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, List, Optional, Sequence
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.models.login_log import UserLoginEvent
+from app.models.database_config import ConnectionTestLog
+
+EXPORT_ROWS = metrics_registry.counter(
+    "log_export_rows_total", "已匯出的日誌資料列數"
+)
+
+class ExportFormat(str, enum.Enum):
+    """匯出格式枚舉"""
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+}
+
+LOGIN_EVENT_COLUMNS = ["id", "user_id", "succeeded", "reason", "ip", "user_agent", "occurred_at"]
+CONNECTION_TEST_LOG_COLUMNS = [
+    "id", "connection_id", "user_id", "test_type", "status",
+    "response_time_ms", "error_message", "error_code", "tested_at"
+]
+
+def _export_value(value: Any) -> Any:
+    """轉換為可序列化的值"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+class ExportService:
+    """日誌匯出服務"""
+    
+    def login_events(self, fmt: ExportFormat, compress: bool, user_id: Optional[int] = None,
+                     start: Optional[datetime] = None, end: Optional[datetime] = None) -> AsyncIterator[bytes]:
+        """匯出登入稽核事件"""
+        query = select(*[getattr(UserLoginEvent, column) for column in LOGIN_EVENT_COLUMNS])
+        if user_id is not None:
+            query = query.where(UserLoginEvent.user_id == user_id)
+        query = self._time_range(query, UserLoginEvent.occurred_at, start, end)
+        query = query.order_by(UserLoginEvent.occurred_at, UserLoginEvent.id)
+        return self._stream("login_events", query, LOGIN_EVENT_COLUMNS, fmt, compress)
+    
+    def connection_test_logs(self, fmt: ExportFormat, compress: bool, user_id: Optional[int] = None,
+                             config_id: Optional[int] = None, start: Optional[datetime] = None,
+                             end: Optional[datetime] = None) -> AsyncIterator[bytes]:
+        """匯出連接測試日誌"""
+        query = select(*[getattr(ConnectionTestLog, column) for column in CONNECTION_TEST_LOG_COLUMNS])
+        if user_id is not None:
+            query = query.where(ConnectionTestLog.user_id == user_id)
+        if config_id is not None:
+            query = query.where(ConnectionTestLog.connection_id == config_id)
+        query = self._time_range(query, ConnectionTestLog.tested_at, start, end)
+        query = query.order_by(ConnectionTestLog.tested_at, ConnectionTestLog.id)
+        return self._stream("connection_test_logs", query, CONNECTION_TEST_LOG_COLUMNS, fmt, compress)
+    
+    @staticmethod
+    def _time_range(query: Select, column, start: Optional[datetime], end: Optional[datetime]) -> Select:
+        if start is not None and end is not None and start >= end:
+            raise ValueError("開始時間必須早於結束時間")
+        if start is not None:
+            query = query.where(column >= start)
+        if end is not None:
+            query = query.where(column < end)
+        return query
+    
+    async def _stream(self, dataset: str, query: Select, columns: List[str],
+                      fmt: ExportFormat, compress: bool) -> AsyncIterator[bytes]:
+        # 回應串流期間不依賴請求的 session，使用獨立連線
+        from app.db import AsyncSessionLocal
+        
+        encode = _csv_encoder(columns) if fmt == ExportFormat.CSV else _ndjson_encoder(columns)
+        # wbits=31 產生 gzip 標頭
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        
+        def emit(chunk: bytes) -> bytes:
+            return compressor.compress(chunk) if compressor else chunk
+        
+        header = encode(None)
+        if header:
+            yield emit(header)
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+            async for rows in result.partitions():
+                chunk = emit(encode(rows))
+                EXPORT_ROWS.inc(len(rows), dataset=dataset, format=fmt.value)
+                if chunk:
+                    yield chunk
+        if compressor:
+            yield compressor.flush()
+
+def _ndjson_encoder(columns: List[str]) -> Callable[[Optional[Sequence]], bytes]:
+    def encode(rows: Optional[Sequence]) -> bytes:
+        if rows is None:
+            return b""
+        return "".join(
+            json.dumps(dict(zip(columns, map(_export_value, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8")
+    return encode
+
+def _csv_encoder(columns: List[str]) -> Callable[[Optional[Sequence]], bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    def encode(rows: Optional[Sequence]) -> bytes:
+        if rows is None:
+            writer.writerow(columns)
+        else:
+            writer.writerows([_export_value(value) for value in row] for row in rows)
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data.encode("utf-8")
+    return encode
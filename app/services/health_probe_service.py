@@ -0,0 +1,261 @@
+"""
+背景健康探測服務
+持續重新測試啟用中的資料庫配置，透過資料庫租約在多個 worker 間分配工作
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_, select, update, insert, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.models.database_config import (
+    DatabaseConfig, ConnectionTestLog, TestStatus, TestType, TestResult
+)
+from app.models.server import Server
+from app.services.database_config_service import DatabaseConfigService
+
+logger = logging.getLogger(__name__)
+
+PROBE_LAG = metrics_registry.gauge(
+    "prober_lag_seconds", "最近一批探測中最大的延遲（實際探測時間 - 預定時間）"
+)
+PROBE_LAG_HISTOGRAM = metrics_registry.histogram(
+    "prober_lag_distribution_seconds", "各配置探測延遲分佈",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+PROBES_TOTAL = metrics_registry.counter(
+    "prober_probes_total", "完成的背景探測次數"
+)
+PROBE_BATCH_DURATION = metrics_registry.histogram(
+    "prober_batch_duration_seconds", "每批背景探測耗時"
+)
+PROBE_IN_FLIGHT = metrics_registry.gauge(
+    "prober_in_flight", "正在執行的背景探測數"
+)
+
+ProbeTarget = Tuple[int, int, str, int, str, str, str, Any, int, datetime]
+
+class HealthProber:
+    """資料庫配置背景探測器"""
+    
+    def __init__(self, interval: float, max_backoff: float, jitter_ratio: float, concurrency: int,
+                 batch_size: int, poll_seconds: float, lease_seconds: float):
+        self.interval = interval
+        self.max_backoff = max(interval, max_backoff)
+        self.jitter_ratio = jitter_ratio
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()[:32]}:{os.getpid()}"
+        self.db_config_service = DatabaseConfigService()
+        self._task: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    def jittered(self, seconds: float) -> float:
+        """加入隨機抖動，避免大量目標同時到期"""
+        return seconds * random.uniform(1 - self.jitter_ratio, 1 + self.jitter_ratio)
+    
+    def next_delay(self, failures: int) -> float:
+        """下次探測間隔，連續失敗時指數退避"""
+        if failures <= 0:
+            return self.jittered(self.interval)
+        return self.jittered(min(self.interval * (2 ** failures), self.max_backoff))
+    
+    async def claim_batch(self, db: AsyncSession) -> Tuple[str, List[DatabaseConfig]]:
+        """以租約取得一批到期的配置，返回 (租約持有者, 配置)；已被其他 worker 持有的配置會被跳過"""
+        now = datetime.utcnow()
+        lease_free = or_(
+            DatabaseConfig.probe_lease_expires_at.is_(None),
+            DatabaseConfig.probe_lease_expires_at < now
+        )
+        result = await db.execute(
+            select(DatabaseConfig.id)
+            .join(Server, Server.id == DatabaseConfig.server_id)
+            .where(
+                DatabaseConfig.is_active == True,
+                Server.is_active == True,
+                or_(DatabaseConfig.next_probe_at.is_(None), DatabaseConfig.next_probe_at <= now),
+                lease_free
+            )
+            .order_by(DatabaseConfig.next_probe_at)
+            .limit(self.batch_size)
+        )
+        ids = list(result.scalars().all())
+        if not ids:
+            return "", []
+        
+        # 條件更新：只有租約仍空閒時才能取得，並發的 worker 不會拿到同一筆；
+        # 每次取得使用新的持有者標記再以標記查回（到期時間在 MySQL 上會被捨入，不能用來比對）
+        lease_owner = f"{self.worker_id}:{uuid.uuid4().hex[:16]}"
+        lease_expires_at = now + timedelta(seconds=self.lease_seconds)
+        await db.execute(
+            update(DatabaseConfig)
+            .where(DatabaseConfig.id.in_(ids), lease_free)
+            .values(
+                probe_lease_owner=lease_owner,
+                probe_lease_expires_at=lease_expires_at,
+                updated_at=DatabaseConfig.updated_at
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        
+        result = await db.execute(select(DatabaseConfig).where(
+            DatabaseConfig.id.in_(ids),
+            DatabaseConfig.probe_lease_owner == lease_owner
+        ))
+        return lease_owner, list(result.scalars().all())
+    
+    async def run_once(self) -> int:
+        """執行一批探測，返回取得的配置數"""
+        from app.db import AsyncSessionLocal
+        
+        start_time = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            lease_owner, configs = await self.claim_batch(db)
+            if not configs:
+                return 0
+            now = datetime.utcnow()
+            targets: List[ProbeTarget] = [
+                (config.id, config.user_id, config.host, config.port, config.database_name, config.username,
+                 self.db_config_service._decrypt_password(config.password_hash), config.db_type,
+                 config.probe_failures or 0, config.next_probe_at or now)
+                for config in configs
+            ]
+        
+        max_lag = 0.0
+        for target in targets:
+            lag = max(0.0, (now - target[9]).total_seconds())
+            PROBE_LAG_HISTOGRAM.observe(lag)
+            max_lag = max(max_lag, lag)
+        PROBE_LAG.set(max_lag)
+        
+        results = await asyncio.gather(*(self._probe(target) for target in targets))
+        
+        async with AsyncSessionLocal() as db:
+            await self._save_results(db, lease_owner, results)
+        PROBE_BATCH_DURATION.observe(time.perf_counter() - start_time)
+        return len(configs)
+    
+    async def _probe(self, target: ProbeTarget) -> Dict[str, Any]:
+        config_id, user_id, host, port, database_name, username, password, db_type, failures, _ = target
+        async with self._semaphore:
+            PROBE_IN_FLIGHT.inc()
+            try:
+                result = await self.db_config_service.run_connection_test(
+                    config_id, host, port, database_name, username, password, db_type
+                )
+            finally:
+                PROBE_IN_FLIGHT.dec()
+        failures = 0 if result['success'] else failures + 1
+        PROBES_TOTAL.inc(result="success" if result['success'] else "failed")
+        return {
+            'config_id': config_id,
+            'user_id': user_id,
+            'failures': failures,
+            'next_probe_at': datetime.utcnow() + timedelta(seconds=self.next_delay(failures)),
+            **result
+        }
+    
+    async def _save_results(self, db: AsyncSession, lease_owner: str, results: List[Dict[str, Any]]):
+        """批量寫入測試日誌並更新配置狀態，同時釋放租約"""
+        # 探測期間被刪除的配置不再寫入日誌
+        existing = await db.execute(select(DatabaseConfig.id).where(
+            DatabaseConfig.id.in_([result['config_id'] for result in results])
+        ))
+        existing_ids = set(existing.scalars().all())
+        results = [result for result in results if result['config_id'] in existing_ids]
+        if not results:
+            return
+        
+        await db.execute(insert(ConnectionTestLog), [
+            {
+                'connection_id': result['config_id'],
+                'user_id': result['user_id'],
+                'test_type': TestType.CONNECTION,
+                'status': TestResult.SUCCESS if result['success'] else TestResult.FAILED,
+                'response_time_ms': result.get('response_time_ms'),
+                'error_message': result.get('error_message'),
+                'error_code': result.get('error_code'),
+                'tested_at': result['tested_at']
+            }
+            for result in results
+        ])
+        
+        table = DatabaseConfig.__table__
+        await db.execute(
+            update(table)
+            .where(and_(table.c.id == bindparam('b_id'), table.c.probe_lease_owner == lease_owner))
+            .values(
+                test_status=bindparam('b_test_status'),
+                last_tested_at=bindparam('b_tested_at'),
+                test_error_message=bindparam('b_error_message'),
+                probe_failures=bindparam('b_failures'),
+                next_probe_at=bindparam('b_next_probe_at'),
+                probe_lease_owner=None,
+                probe_lease_expires_at=None,
+                updated_at=table.c.updated_at
+            ),
+            [
+                {
+                    'b_id': result['config_id'],
+                    'b_test_status': TestStatus.SUCCESS if result['success'] else TestStatus.FAILED,
+                    'b_tested_at': result['tested_at'],
+                    'b_error_message': result.get('error_message'),
+                    'b_failures': result['failures'],
+                    'b_next_probe_at': result['next_probe_at']
+                }
+                for result in results
+            ]
+        )
+        await self.db_config_service.rollup_service.record(db, [
+            (result['config_id'], result.get('response_time_ms'), result['success'], result['tested_at'])
+            for result in results
+        ])
+        await db.commit()
+    
+    def start(self):
+        """啟動背景探測任務"""
+        if self._task is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """停止背景探測任務（未完成批次的租約會自然到期）"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.run_once()
+            except Exception:
+                logger.exception("背景健康探測失敗")
+                claimed = 0
+            # 取滿一批時代表仍有積壓，立即繼續
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.jittered(self.poll_seconds))
+
+# 全域背景探測器
+health_prober = HealthProber(
+    interval=settings.PROBER_INTERVAL_SECONDS,
+    max_backoff=settings.PROBER_MAX_BACKOFF_SECONDS,
+    jitter_ratio=settings.PROBER_JITTER_RATIO,
+    concurrency=settings.PROBER_CONCURRENCY,
+    batch_size=settings.PROBER_BATCH_SIZE,
+    poll_seconds=settings.PROBER_POLL_SECONDS,
+    lease_seconds=settings.PROBER_LEASE_SECONDS
+)
@@ -0,0 +1,276 @@
+"""
+連接測試延遲彙總服務
+寫入測試日誌時同步更新分鐘/小時/日彙總，並定期清理已彙總的原始日誌
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, case, or_, select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.core.sketch import LatencySketch
+from app.models.database_config import ConnectionTestLog
+from app.models.connection_test_rollup import ConnectionTestRollup, RollupResolution, LatencyBucket
+
+logger = logging.getLogger(__name__)
+
+ROWS_PRUNED = metrics_registry.counter(
+    "latency_rollup_pruned_rows_total", "保留期限到期而刪除的資料列數"
+)
+ROLLUP_WRITE_FAILURES = metrics_registry.counter(
+    "latency_rollup_write_failures_total", "寫入失敗而遺失的延遲彙總批次數"
+)
+
+# (配置 ID, 延遲毫秒, 是否成功, 測試時間)
+LatencySample = Tuple[int, Optional[int], bool, datetime]
+
+# 每次刪除的資料列數，避免長時間鎖表
+PRUNE_CHUNK_SIZE = 5000
+# 每條 upsert 寫入的時間桶數（受 SQLite 綁定參數數量上限限制）
+RECORD_CHUNK_SIZE = 100
+
+def bucket_start(timestamp: datetime, resolution: RollupResolution) -> datetime:
+    """計算時間所屬時間桶的起始時間"""
+    if resolution == RollupResolution.MINUTE:
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == RollupResolution.HOUR:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _merge_min(current, new):
+    return case((current.is_(None), new), (new.is_(None), current), (new < current, new), else_=current)
+
+def _merge_max(current, new):
+    return case((current.is_(None), new), (new.is_(None), current), (new > current, new), else_=current)
+
+def _upsert_statement(dialect: str, rows: List[Dict[str, Any]]):
+    """新增彙總列，時間桶已存在時原子累加計數欄位（分位數草圖另行合併）"""
+    table = ConnectionTestRollup.__table__
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table).values(rows)
+        new = statement.inserted
+        return statement.on_duplicate_key_update(
+            count=table.c.count + new.count,
+            failures=table.c.failures + new.failures,
+            sum_ms=table.c.sum_ms + new.sum_ms,
+            min_ms=_merge_min(table.c.min_ms, new.min_ms),
+            max_ms=_merge_max(table.c.max_ms, new.max_ms)
+        )
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f"不支援的資料庫類型: {dialect}")
+    statement = insert(table).values(rows)
+    new = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.connection_id, table.c.resolution, table.c.bucket_start],
+        set_={
+            "count": table.c.count + new.count,
+            "failures": table.c.failures + new.failures,
+            "sum_ms": table.c.sum_ms + new.sum_ms,
+            "min_ms": _merge_min(table.c.min_ms, new.min_ms),
+            "max_ms": _merge_max(table.c.max_ms, new.max_ms),
+        }
+    )
+
+class LatencyRollupService:
+    """延遲彙總服務"""
+    
+    async def record(self, db: AsyncSession, samples: Iterable[LatencySample]):
+        """依測試結果增量更新各粒度彙總（由呼叫端提交）"""
+        groups: Dict[Tuple[int, str, datetime], Dict[str, Any]] = {}
+        for config_id, response_time_ms, success, tested_at in samples:
+            for resolution in RollupResolution:
+                key = (config_id, resolution.value, bucket_start(tested_at, resolution))
+                group = groups.setdefault(key, {"count": 0, "failures": 0, "values": []})
+                group["count"] += 1
+                if not success:
+                    group["failures"] += 1
+                if response_time_ms is not None:
+                    group["values"].append(response_time_ms)
+        if not groups:
+            return
+        
+        # 探測器、單筆測試與批次測試會並發寫入同一時間桶；彙總在 savepoint 中寫入，
+        # 失敗時只記錄日誌，不影響同一交易中測試日誌與配置狀態的寫入
+        keys = sorted(groups)
+        try:
+            async with db.begin_nested():
+                for start in range(0, len(keys), RECORD_CHUNK_SIZE):
+                    await self._apply(db, {key: groups[key] for key in keys[start:start + RECORD_CHUNK_SIZE]})
+        except Exception:
+            ROLLUP_WRITE_FAILURES.inc()
+            logger.exception("連接測試延遲彙總寫入失敗")
+    
+    async def _apply(self, db: AsyncSession, groups: Dict[Tuple[int, str, datetime], Dict[str, Any]]):
+        """計數欄位以 upsert 原子累加，分位數草圖在鎖定資料列後合併"""
+        # 依鍵排序寫入，並發交易以相同順序鎖定資料列，避免死結
+        keys = sorted(groups)
+        dialect = db.get_bind().dialect.name
+        await db.execute(_upsert_statement(dialect, [
+            {
+                "connection_id": key[0], "resolution": key[1], "bucket_start": key[2],
+                "count": groups[key]["count"], "failures": groups[key]["failures"],
+                "sum_ms": sum(groups[key]["values"]),
+                "min_ms": min(groups[key]["values"], default=None),
+                "max_ms": max(groups[key]["values"], default=None),
+            }
+            for key in keys
+        ]))
+        
+        keys = [key for key in keys if groups[key]["values"]]
+        if not keys:
+            return
+        # upsert 已持有列鎖；FOR UPDATE 確保讀到的草圖在提交前不會被其他交易覆寫
+        result = await db.execute(
+            select(ConnectionTestRollup.id, ConnectionTestRollup.connection_id, ConnectionTestRollup.resolution,
+                   ConnectionTestRollup.bucket_start, ConnectionTestRollup.sketch)
+            .where(or_(*[
+                and_(ConnectionTestRollup.connection_id == key[0], ConnectionTestRollup.resolution == key[1],
+                     ConnectionTestRollup.bucket_start == key[2])
+                for key in keys
+            ]))
+            .order_by(ConnectionTestRollup.id)
+            .with_for_update()
+        )
+        updates = []
+        for row in result.all():
+            group = groups.get((row.connection_id, row.resolution, row.bucket_start))
+            if group is None:
+                continue
+            sketch = LatencySketch.from_json(row.sketch)
+            for value in group["values"]:
+                sketch.add(value)
+            updates.append({"id": row.id, "sketch": sketch.to_json()})
+        if updates:
+            await db.execute(update(ConnectionTestRollup), updates)
+    
+    async def get_history(self, db: AsyncSession, config_ids: List[int], resolution: RollupResolution,
+                          start: datetime, end: datetime) -> List[LatencyBucket]:
+        """獲取延遲歷史，多個配置時逐桶合併"""
+        if not config_ids:
+            return []
+        result = await db.execute(
+            select(ConnectionTestRollup).where(
+                ConnectionTestRollup.connection_id.in_(config_ids),
+                ConnectionTestRollup.resolution == resolution.value,
+                ConnectionTestRollup.bucket_start >= bucket_start(start, resolution),
+                ConnectionTestRollup.bucket_start <= end
+            ).order_by(ConnectionTestRollup.bucket_start)
+        )
+        
+        merged: Dict[datetime, Dict[str, Any]] = {}
+        for row in result.scalars().all():
+            bucket = merged.get(row.bucket_start)
+            if bucket is None:
+                bucket = merged[row.bucket_start] = {
+                    "count": 0, "failures": 0, "sum_ms": 0,
+                    "min_ms": None, "max_ms": None, "sketch": LatencySketch()
+                }
+            bucket["count"] += row.count
+            bucket["failures"] += row.failures
+            bucket["sum_ms"] += row.sum_ms or 0
+            if row.min_ms is not None:
+                bucket["min_ms"] = row.min_ms if bucket["min_ms"] is None else min(bucket["min_ms"], row.min_ms)
+            if row.max_ms is not None:
+                bucket["max_ms"] = row.max_ms if bucket["max_ms"] is None else max(bucket["max_ms"], row.max_ms)
+            bucket["sketch"].merge(LatencySketch.from_json(row.sketch))
+        
+        buckets = []
+        for start_at, bucket in merged.items():
+            sketch = bucket["sketch"]
+            buckets.append(LatencyBucket(
+                bucket_start=start_at,
+                count=bucket["count"],
+                failures=bucket["failures"],
+                min_ms=bucket["min_ms"],
+                max_ms=bucket["max_ms"],
+                avg_ms=round(bucket["sum_ms"] / sketch.count, 2) if sketch.count else None,
+                p50_ms=_round(sketch.quantile(0.50)),
+                p95_ms=_round(sketch.quantile(0.95)),
+                p99_ms=_round(sketch.quantile(0.99))
+            ))
+        return buckets
+    
+    async def prune(self, db: AsyncSession, now: Optional[datetime] = None) -> Dict[str, int]:
+        """刪除超過保留期限的原始日誌與彙總"""
+        now = now or datetime.utcnow()
+        pruned = {"raw": 0}
+        if settings.CONNECTION_TEST_LOG_RETENTION_DAYS > 0:
+            # 原始日誌寫入時即已彙總，到期後可直接刪除
+            pruned["raw"] = await self._delete_in_chunks(
+                db, ConnectionTestLog,
+                ConnectionTestLog.tested_at < now - timedelta(days=settings.CONNECTION_TEST_LOG_RETENTION_DAYS)
+            )
+        retention_days = {
+            RollupResolution.MINUTE: settings.ROLLUP_MINUTE_RETENTION_DAYS,
+            RollupResolution.HOUR: settings.ROLLUP_HOUR_RETENTION_DAYS,
+            RollupResolution.DAY: settings.ROLLUP_DAY_RETENTION_DAYS,
+        }
+        for resolution, days in retention_days.items():
+            pruned[resolution.value] = 0
+            if days > 0:
+                pruned[resolution.value] = await self._delete_in_chunks(
+                    db, ConnectionTestRollup,
+                    ConnectionTestRollup.resolution == resolution.value,
+                    ConnectionTestRollup.bucket_start < now - timedelta(days=days)
+                )
+        return pruned
+    
+    async def _delete_in_chunks(self, db: AsyncSession, model, *conditions) -> int:
+        total = 0
+        while True:
+            result = await db.execute(select(model.id).where(*conditions).limit(PRUNE_CHUNK_SIZE))
+            ids = list(result.scalars().all())
+            if not ids:
+                return total
+            await db.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+            await db.commit()
+            total += len(ids)
+            ROWS_PRUNED.inc(len(ids), table=model.__tablename__)
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+class RollupRetentionJob:
+    """定期執行保留期限清理的背景任務"""
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.rollup_service = LatencyRollupService()
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """啟動背景任務"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """停止背景任務"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    async def _run(self):
+        from app.db import AsyncSessionLocal
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    pruned = await self.rollup_service.prune(db)
+                if any(pruned.values()):
+                    logger.info("連接測試日誌清理完成: %s", pruned)
+            except Exception:
+                logger.exception("連接測試日誌清理失敗")
+            await asyncio.sleep(self.interval)
+
+# 全域保留期限清理任務
+rollup_retention_job = RollupRetentionJob(interval=settings.ROLLUP_RETENTION_INTERVAL_SECONDS)
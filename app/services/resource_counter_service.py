@@ -0,0 +1,78 @@
+"""
+使用者資源計數服務
+計數列在資源新增/刪除的同一交易中以原子增減維護；缺少計數列時以 COUNT 補建一次
+"""
+from typing import Optional
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.routing import pin_primary
+from app.models.server import Server
+from app.models.database_config import DatabaseConfig
+from app.models.user_resource_counter import UserResourceCounter
+
+class ResourceCounterService:
+    """使用者資源計數服務"""
+    
+    async def adjust(self, db: AsyncSession, user_id: int, servers: int = 0, database_configs: int = 0):
+        """增減計數（由呼叫端提交，需在資源變更寫入前呼叫）"""
+        if not servers and not database_configs:
+            return
+        for _ in range(2):
+            result = await db.execute(
+                update(UserResourceCounter)
+                .where(UserResourceCounter.user_id == user_id)
+                .values(
+                    server_count=UserResourceCounter.server_count + servers,
+                    database_config_count=UserResourceCounter.database_config_count + database_configs
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                return
+            await self._seed(db, user_id)
+    
+    async def get_counts(self, db: AsyncSession, user_id: int) -> UserResourceCounter:
+        """獲取計數，計數列不存在時補建"""
+        counter = await self._get(db, user_id)
+        if counter is None:
+            await self._seed(db, user_id)
+            await db.commit()
+            counter = await self._get(db, user_id)
+        return counter
+    
+    async def get_server_total(self, db: AsyncSession, user_id: int) -> int:
+        """使用者的伺服器總數"""
+        return (await self.get_counts(db, user_id)).server_count
+    
+    async def get_database_config_total(self, db: AsyncSession, user_id: int) -> int:
+        """使用者的資料庫配置總數"""
+        return (await self.get_counts(db, user_id)).database_config_count
+    
+    async def remove(self, db: AsyncSession, user_id: int):
+        """刪除使用者時一併刪除計數列（由呼叫端提交）"""
+        await db.execute(delete(UserResourceCounter).where(UserResourceCounter.user_id == user_id))
+    
+    async def _get(self, db: AsyncSession, user_id: int) -> Optional[UserResourceCounter]:
+        result = await db.execute(
+            select(UserResourceCounter)
+            .where(UserResourceCounter.user_id == user_id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().first()
+    
+    async def _seed(self, db: AsyncSession, user_id: int):
+        """以目前資料計算並建立計數列；並發建立時以先寫入者為準"""
+        # 唯讀副本可能落後，計數必須以主庫資料為準
+        pin_primary(db)
+        server_count = await db.scalar(select(func.count()).select_from(Server).where(Server.user_id == user_id))
+        config_count = await db.scalar(
+            select(func.count()).select_from(DatabaseConfig).where(DatabaseConfig.user_id == user_id)
+        )
+        try:
+            async with db.begin_nested():
+                db.add(UserResourceCounter(
+                    user_id=user_id, server_count=server_count, database_config_count=config_count
+                ))
+        except IntegrityError:
+            pass
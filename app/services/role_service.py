@@ -5,6 +5,7 @@ from typing import Optional, List
 from sqlalchemy.orm import Session
 from app.models.role import Role
 from app.services.base_service import BaseService
+from app.core.invalidation import invalidation_bus, USER_ROLES_CHANGED, ROLES_CHANGED
 
 class RoleService(BaseService[Role]):
     """角色服務類"""
@@ -38,6 +39,7 @@ class RoleService(BaseService[Role]):
         db.add(user_role)
         db.commit()
         db.refresh(user_role)
+        invalidation_bus.publish(USER_ROLES_CHANGED, user_id)
         
         return True
     
@@ -55,9 +57,58 @@ class RoleService(BaseService[Role]):
         
         db.delete(user_role)
         db.commit()
+        invalidation_bus.publish(USER_ROLES_CHANGED, user_id)
         
         return True
     
+    def grant_permission_to_role(self, db: Session, role_id: int, permission_id: int) -> bool:
+        """為角色授予權限"""
+        from app.models.role_permission import RolePermission
+        
+        existing = db.query(RolePermission).filter(
+            RolePermission.role_id == role_id,
+            RolePermission.permission_id == permission_id
+        ).first()
+        
+        if existing:
+            return True
+        
+        db.add(RolePermission(role_id=role_id, permission_id=permission_id))
+        db.commit()
+        invalidation_bus.publish(ROLES_CHANGED)
+        
+        return True
+    
+    def revoke_permission_from_role(self, db: Session, role_id: int, permission_id: int) -> bool:
+        """撤銷角色權限"""
+        from app.models.role_permission import RolePermission
+        
+        role_permission = db.query(RolePermission).filter(
+            RolePermission.role_id == role_id,
+            RolePermission.permission_id == permission_id
+        ).first()
+        
+        if not role_permission:
+            return False
+        
+        db.delete(role_permission)
+        db.commit()
+        invalidation_bus.publish(ROLES_CHANGED)
+        
+        return True
+    
+    def update(self, db: Session, id: int, **kwargs) -> Optional[Role]:
+        """更新角色（狀態變更會影響權限矩陣）"""
+        role = super().update(db, id, **kwargs)
+        invalidation_bus.publish(ROLES_CHANGED)
+        return role
+    
+    def delete(self, db: Session, id: int) -> bool:
+        """刪除角色"""
+        deleted = super().delete(db, id)
+        invalidation_bus.publish(ROLES_CHANGED)
+        return deleted
+    
     def get_user_roles(self, db: Session, user_id: int) -> List[Role]:
         """獲取用戶的角色列表"""
         from app.models.user_role import UserRole
@@ -1,55 +1,73 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from typing import List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select, func
 from app.models.server import Server, ServerCreate, ServerUpdate
+from app.models.database_config import DatabaseConfig
 from app.services.base_service import BaseService
+from app.services.resource_counter_service import ResourceCounterService
 
 class ServerService(BaseService[Server]):
     """伺服器服務"""
     
     def __init__(self):
         super().__init__(Server)
+        self.counter_service = ResourceCounterService()
     
-    def create_server(self, db: Session, user_id: int, server_data: ServerCreate) -> Server:
+    async def create_server(self, db: AsyncSession, user_id: int, server_data: ServerCreate) -> Server:
         """創建新伺服器"""
         # 檢查伺服器名稱是否已存在於該使用者下
-        existing_server = db.query(Server).filter(
+        result = await db.execute(select(Server).where(
             and_(Server.user_id == user_id, Server.server_name == server_data.server_name)
-        ).first()
+        ))
+        existing_server = result.scalars().first()
         if existing_server:
             raise ValueError("伺服器名稱已存在")
         
-        server = self.create(db, user_id=user_id, **server_data.dict())
+        # 計數與新增在同一交易中提交
+        await self.counter_service.adjust(db, user_id, servers=1)
+        server = await self.create_async(db, user_id=user_id, **server_data.dict())
         return server
     
-    def get_user_servers(self, db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[Server]:
-        """獲取使用者所有伺服器"""
-        return db.query(Server).filter(Server.user_id == user_id).offset(skip).limit(limit).all()
+    async def get_user_servers(self, db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100,
+                               cursor: Optional[str] = None) -> Tuple[List[Server], Optional[str]]:
+        """獲取使用者所有伺服器，返回 (伺服器, 下一頁游標)"""
+        return await self.paginate_async(db, select(Server).where(Server.user_id == user_id), cursor, skip, limit)
     
-    def get_server_by_id(self, db: Session, server_id: int, user_id: int) -> Optional[Server]:
+    async def count_user_servers(self, db: AsyncSession, user_id: int) -> int:
+        """使用者伺服器總數（讀取計數快取）"""
+        return await self.counter_service.get_server_total(db, user_id)
+    
+    async def get_server_by_id(self, db: AsyncSession, server_id: int, user_id: int) -> Optional[Server]:
         """根據ID獲取伺服器，並驗證使用者權限"""
-        return db.query(Server).filter(and_(Server.id == server_id, Server.user_id == user_id)).first()
+        result = await db.execute(select(Server).where(and_(Server.id == server_id, Server.user_id == user_id)))
+        return result.scalars().first()
     
-    def update_server(self, db: Session, server_id: int, user_id: int, update_data: ServerUpdate) -> Optional[Server]:
+    async def update_server(self, db: AsyncSession, server_id: int, user_id: int, update_data: ServerUpdate) -> Optional[Server]:
         """更新伺服器信息"""
-        server = self.get_server_by_id(db, server_id, user_id)
+        server = await self.get_server_by_id(db, server_id, user_id)
         if not server:
             return None
         
         # 檢查更新後的伺服器名稱是否與其他伺服器衝突
         if update_data.server_name and update_data.server_name != server.server_name:
-            existing_server = db.query(Server).filter(
+            result = await db.execute(select(Server).where(
                 and_(Server.user_id == user_id, Server.server_name == update_data.server_name, Server.id != server_id)
-            ).first()
+            ))
+            existing_server = result.scalars().first()
             if existing_server:
                 raise ValueError("伺服器名稱已存在")
         
-        updated_server = self.update(db, server_id, **update_data.dict(exclude_unset=True))
+        updated_server = await self.update_async(db, server_id, **update_data.dict(exclude_unset=True))
         return updated_server
     
-    def delete_server(self, db: Session, server_id: int, user_id: int) -> bool:
+    async def delete_server(self, db: AsyncSession, server_id: int, user_id: int) -> bool:
         """刪除伺服器"""
-        server = self.get_server_by_id(db, server_id, user_id)
+        server = await self.get_server_by_id(db, server_id, user_id)
         if not server:
             return False
-        return self.delete(db, server_id)
+        # 伺服器下的資料庫配置會一併刪除
+        config_count = await db.scalar(
+            select(func.count()).select_from(DatabaseConfig).where(DatabaseConfig.server_id == server_id)
+        )
+        await self.counter_service.adjust(db, user_id, servers=-1, database_configs=-config_count)
+        return await self.delete_async(db, server_id)
@@ -0,0 +1,252 @@
+"""
+用戶批次匯入服務
+整批以少量 IN 查詢檢查用戶名/郵箱/電話衝突，於雜湊執行池中分批平行計算密碼雜湊，
+再以多列 INSERT 分段寫入，並返回每一列的處理結果
+"""
+import asyncio
+import csv
+import enum
+import io
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.identifiers import normalize_email, normalize_phone, validate_email, validate_phone
+from app.core.metrics import metrics_registry
+from app.core.password_hashing import password_hashing_pool, PasswordHashingBusyError
+from app.core.security import create_password_hashes, is_password_strong, password_hash_policy
+from app.models.user import User, UserImportResponse, UserImportRowResult
+
+USERS_IMPORTED = metrics_registry.counter(
+    "user_import_rows_total", "批次匯入處理的資料列數"
+)
+
+class ImportFormat(str, enum.Enum):
+    """匯入格式枚舉"""
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+IMPORT_FIELDS = ("username", "email", "phone", "password")
+
+# 欄位長度上限與衝突時的錯誤訊息（與單筆創建一致）
+FIELD_MAX_LENGTHS = {"username": 50, "email": 191, "phone": 20}
+CONFLICT_MESSAGES = {"username": "用戶名已存在", "email": "郵箱已存在", "phone": "電話已存在"}
+
+# 重複與衝突以正規化值比對（郵箱與電話已通過與單筆創建相同的格式檢查，必定可正規化）
+NORMALIZERS = {"email": normalize_email, "phone": normalize_phone}
+CONFLICT_COLUMNS = {"username": User.username, "email": User.email_normalized, "phone": User.phone_normalized}
+
+# 每個 IN 查詢的值數量上限
+IN_QUERY_CHUNK_SIZE = 500
+
+class UserImportService:
+    """用戶批次匯入服務"""
+    
+    def parse(self, data: bytes, fmt: ImportFormat) -> List[Dict[str, Optional[str]]]:
+        """解析匯入檔案，返回各列的欄位值"""
+        try:
+            text = data.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise ValueError("匯入檔案必須為 UTF-8 編碼")
+        
+        if fmt == ImportFormat.CSV:
+            reader = csv.DictReader(io.StringIO(text))
+            if not reader.fieldnames or "username" not in reader.fieldnames or "password" not in reader.fieldnames:
+                raise ValueError("CSV 必須包含 username 與 password 欄位")
+            records = list(reader)
+        else:
+            records = []
+            for line_number, line in enumerate(text.splitlines(), start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise ValueError(f"第 {line_number} 行不是有效的 JSON")
+                if not isinstance(record, dict):
+                    raise ValueError(f"第 {line_number} 行必須是 JSON 物件")
+                records.append(record)
+        
+        if len(records) > settings.USER_IMPORT_MAX_ROWS:
+            raise ValueError(f"單次最多匯入 {settings.USER_IMPORT_MAX_ROWS} 筆用戶")
+        
+        rows = []
+        for record in records:
+            row = {}
+            for field in IMPORT_FIELDS:
+                value = record.get(field)
+                value = str(value).strip() if value is not None else ""
+                # 密碼保留原始內容，其他欄位空字串視為未提供
+                row[field] = value if value or field == "password" else None
+            rows.append(row)
+        return rows
+    
+    async def import_users(self, db: AsyncSession, data: bytes, fmt: ImportFormat) -> UserImportResponse:
+        """匯入用戶，無效或衝突的列不影響其他列"""
+        rows = self.parse(data, fmt)
+        results: List[UserImportRowResult] = [
+            UserImportRowResult(row=index + 1, username=row["username"], status="pending")
+            for index, row in enumerate(rows)
+        ]
+        
+        valid = self._validate(rows, results)
+        valid = await self._check_conflicts(db, rows, results, valid)
+        hashes = await self._hash_passwords([rows[index]["password"] for index in valid])
+        entries = []
+        for index, password_hash in zip(valid, hashes):
+            rows[index]["password"] = None
+            if password_hash is None:
+                self._fail(results[index], "密碼雜湊服務忙碌中，請稍後重新匯入")
+            else:
+                entries.append((index, password_hash))
+        await self._insert(db, rows, results, entries)
+        
+        created = sum(1 for result in results if result.status == "created")
+        USERS_IMPORTED.inc(created, result="created")
+        USERS_IMPORTED.inc(len(results) - created, result="failed")
+        return UserImportResponse(
+            total=len(results),
+            created=created,
+            failed=len(results) - created,
+            results=results
+        )
+    
+    def _validate(self, rows: List[Dict[str, Optional[str]]], results: List[UserImportRowResult]) -> List[int]:
+        """檢查欄位格式與檔案內重複，返回通過的列索引"""
+        seen: Dict[str, Dict[str, int]] = {field: {} for field in FIELD_MAX_LENGTHS}
+        valid = []
+        for index, row in enumerate(rows):
+            error = None
+            if not row["username"]:
+                error = "缺少用戶名"
+            else:
+                for field, max_length in FIELD_MAX_LENGTHS.items():
+                    if row[field] and len(row[field]) > max_length:
+                        error = f"{field} 長度不可超過 {max_length} 個字符"
+                        break
+            if error is None:
+                try:
+                    row["email"] = validate_email(row["email"])
+                    row["phone"] = validate_phone(row["phone"])
+                except ValueError as e:
+                    error = str(e)
+            if error is None:
+                is_strong, message = is_password_strong(row["password"])
+                if not is_strong:
+                    error = message
+            if error is None:
+                for field in FIELD_MAX_LENGTHS:
+                    value = self._key(field, row[field])
+                    if value and value in seen[field]:
+                        error = f"{field} 與第 {seen[field][value] + 1} 列重複"
+                        break
+            if error is not None:
+                self._fail(results[index], error)
+                continue
+            for field in FIELD_MAX_LENGTHS:
+                if row[field]:
+                    seen[field][self._key(field, row[field])] = index
+            valid.append(index)
+        return valid
+    
+    async def _check_conflicts(self, db: AsyncSession, rows: List[Dict[str, Optional[str]]],
+                               results: List[UserImportRowResult], valid: List[int]) -> List[int]:
+        """以 IN 查詢找出已存在的用戶名/郵箱/電話"""
+        conflicts: Dict[int, str] = {}
+        for field, column in CONFLICT_COLUMNS.items():
+            keys = {index: self._key(field, rows[index][field]) for index in valid if rows[index][field]}
+            values = list(keys.values())
+            existing = set()
+            for start in range(0, len(values), IN_QUERY_CHUNK_SIZE):
+                result = await db.execute(select(column).where(column.in_(values[start:start + IN_QUERY_CHUNK_SIZE])))
+                existing.update(result.scalars().all())
+            for index, key in keys.items():
+                if index not in conflicts and key in existing:
+                    conflicts[index] = CONFLICT_MESSAGES[field]
+        for index, message in conflicts.items():
+            self._fail(results[index], message)
+        return [index for index in valid if index not in conflicts]
+    
+    async def _hash_passwords(self, passwords: List[str]) -> List[Optional[Tuple[bytes, bytes, int]]]:
+        """分批在雜湊執行池中平行計算，保留部分 worker 給登入請求；執行池持續忙碌而逾時的列返回 None"""
+        chunk_size = max(1, settings.USER_IMPORT_HASH_CHUNK_SIZE)
+        semaphore = asyncio.Semaphore(max(1, settings.USER_IMPORT_HASH_CONCURRENCY))
+        loop = asyncio.get_running_loop()
+        
+        async def hash_chunk(chunk: List[str]) -> List[Optional[Tuple[bytes, bytes, int]]]:
+            async with semaphore:
+                deadline = loop.time() + settings.USER_IMPORT_HASH_BUSY_TIMEOUT_SECONDS
+                while True:
+                    try:
+                        return await password_hashing_pool.run(
+                            create_password_hashes, chunk, password_hash_policy.iterations
+                        )
+                    except PasswordHashingBusyError:
+                        # 登入尖峰時執行池已滿，稍後再送出；持續忙碌超過時間上限時放棄這一批
+                        if loop.time() >= deadline:
+                            return [None] * len(chunk)
+                        await asyncio.sleep(0.1)
+        
+        chunks = await asyncio.gather(*(
+            hash_chunk(passwords[start:start + chunk_size])
+            for start in range(0, len(passwords), chunk_size)
+        ))
+        return [password_hash for chunk in chunks for password_hash in chunk]
+    
+    async def _insert(self, db: AsyncSession, rows: List[Dict[str, Optional[str]]],
+                      results: List[UserImportRowResult], entries: List[Tuple[int, Tuple[bytes, bytes, int]]]):
+        """以多列 INSERT 分段寫入並逐段提交"""
+        chunk_size = max(1, settings.USER_IMPORT_INSERT_CHUNK_SIZE)
+        for start in range(0, len(entries), chunk_size):
+            chunk = entries[start:start + chunk_size]
+            values = [self._values(rows[index], password_hash) for index, password_hash in chunk]
+            try:
+                async with db.begin_nested():
+                    await db.execute(insert(User.__table__).values(values))
+            except IntegrityError:
+                # 檢查後才由其他請求建立的用戶：逐列重試找出衝突的列
+                for (index, _), row_values in zip(chunk, values):
+                    try:
+                        async with db.begin_nested():
+                            await db.execute(insert(User.__table__).values(row_values))
+                    except IntegrityError:
+                        self._fail(results[index], "用戶已存在")
+            await db.commit()
+            
+            pending = {rows[index]["username"]: index for index, _ in chunk if results[index].status == "pending"}
+            result = await db.execute(select(User.id, User.username).where(User.username.in_(list(pending))))
+            for user_id, username in result.all():
+                results[pending[username]].status = "created"
+                results[pending[username]].user_id = user_id
+        for result in results:
+            if result.status == "pending":
+                self._fail(result, "寫入失敗")
+    
+    @staticmethod
+    def _values(row: Dict[str, Optional[str]], password_hash: Tuple[bytes, bytes, int]) -> Dict[str, Any]:
+        hashed, salt, iterations = password_hash
+        return {
+            "username": row["username"],
+            "email": row["email"],
+            "phone": row["phone"],
+            "email_normalized": normalize_email(row["email"]),
+            "phone_normalized": normalize_phone(row["phone"]),
+            "password_hash": hashed,
+            "password_salt": salt,
+            "password_iters": iterations,
+            "status": 1
+        }
+    
+    @staticmethod
+    def _key(field: str, value: Optional[str]) -> Optional[str]:
+        """比對重複與衝突用的值"""
+        if not value or field not in NORMALIZERS:
+            return value
+        return NORMALIZERS[field](value)
+    
+    @staticmethod
+    def _fail(result: UserImportRowResult, error: str):
+        result.status = "failed"
+        result.error = error
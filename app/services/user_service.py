@@ -3,37 +3,43 @@
 """
 from datetime import datetime, timedelta
 from typing import Optional, Tuple, List
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, case, select, update
+from sqlalchemy.sql import Select
 from app.models.user import User
 from app.services.base_service import BaseService
-from app.core.security import create_password_hash, verify_password_with_salt, hash_token
+from app.services.resource_counter_service import ResourceCounterService
+from app.core.security import create_password_hash_async, verify_password_with_salt_async, hash_token
 from app.core.session import create_user_session, revoke_user_sessions
+from app.core.invalidation import invalidation_bus, USER_CHANGED
+from app.core.password_rehash import password_rehasher
+from app.core.identifiers import IdentifierKind, classify_identifier, normalize_email, normalize_phone
 
 class UserService(BaseService[User]):
     """用戶服務類"""
     
     def __init__(self):
         super().__init__(User)
+        self.counter_service = ResourceCounterService()
     
-    def create_user(self, db: Session, username: str, email: Optional[str], 
+    async def create_user(self, db: AsyncSession, username: str, email: Optional[str],
                    phone: Optional[str], password: str) -> User:
         """創建新用戶"""
         # 檢查用戶名、郵箱、電話是否已存在
-        existing_user = self.get_by_username_or_email_or_phone(db, username, email, phone)
+        existing_user = await self.get_by_username_or_email_or_phone(db, username, email, phone)
         if existing_user:
             if existing_user.username == username:
                 raise ValueError("用戶名已存在")
-            elif existing_user.email == email:
+            elif email and existing_user.email_normalized == normalize_email(email):
                 raise ValueError("郵箱已存在")
-            elif existing_user.phone == phone:
+            elif phone and existing_user.phone_normalized == normalize_phone(phone):
                 raise ValueError("電話已存在")
         
         # 創建密碼哈希
-        password_hash, password_salt, password_iters = create_password_hash(password)
+        password_hash, password_salt, password_iters = await create_password_hash_async(password)
         
         # 創建用戶
-        return self.create(
+        return await self.create_async(
             db,
             username=username,
             email=email,
@@ -44,20 +50,70 @@ class UserService(BaseService[User]):
             status=1  # 活躍狀態
         )
     
-    def get_by_username_or_email_or_phone(self, db: Session, username: str, 
+    async def update_async(self, db: AsyncSession, id: int, **kwargs) -> Optional[User]:
+        """更新用戶並發布用戶變更事件"""
+        user = await super().update_async(db, id, **kwargs)
+        invalidation_bus.publish(USER_CHANGED, id)
+        return user
+    
+    async def delete_async(self, db: AsyncSession, id: int) -> bool:
+        """刪除用戶並發布用戶變更事件"""
+        await self.counter_service.remove(db, id)
+        deleted = await super().delete_async(db, id)
+        invalidation_bus.publish(USER_CHANGED, id)
+        return deleted
+    
+    async def get_by_username_or_email_or_phone(self, db: AsyncSession, username: str,
                                         email: Optional[str], phone: Optional[str]) -> Optional[User]:
-        """根據用戶名、郵箱或電話查找用戶"""
+        """根據用戶名、郵箱或電話查找用戶（郵箱與電話比對正規化值，用於新增時的衝突檢查）"""
         conditions = [User.username == username]
-        if email:
-            conditions.append(User.email == email)
-        if phone:
+        if normalize_email(email):
+            conditions.append(User.email_normalized == normalize_email(email))
+        if normalize_phone(phone):
+            conditions.append(User.phone_normalized == normalize_phone(phone))
+        elif phone:
             conditions.append(User.phone == phone)
         
-        return db.query(User).filter(or_(*conditions)).first()
+        result = await db.execute(select(User).where(or_(*conditions)))
+        return result.scalars().first()
+    
+    @staticmethod
+    def identifier_queries(identifier: str) -> List[Select]:
+        """依識別碼類型返回依序嘗試的索引等值查詢"""
+        kind, value = classify_identifier(identifier)
+        identifier = identifier.strip()
+        queries = []
+        # 正規化值為空的用戶（遷移時因正規化後重複而清空、或電話無法解析）以原始欄位比對，
+        # 原始值完全相符者優先於正規化後相同的其他用戶
+        if kind == IdentifierKind.EMAIL:
+            queries.append(
+                select(User)
+                .where(or_(User.email_normalized == value, and_(User.email == identifier, User.email_normalized.is_(None))))
+                .order_by(User.email_normalized.is_not(None))
+            )
+        elif kind == IdentifierKind.PHONE:
+            queries.append(
+                select(User)
+                .where(or_(User.phone_normalized == value, and_(User.phone == identifier, User.phone_normalized.is_(None))))
+                .order_by(User.phone_normalized.is_not(None))
+            )
+        # 用戶名本身也可能形似郵箱或電話
+        queries.append(select(User).where(User.username == identifier))
+        if kind == IdentifierKind.USERNAME:
+            queries.append(select(User).where(User.phone == identifier, User.phone_normalized.is_(None)))
+        return queries
     
-    def authenticate_user(self, db: Session, username: str, password: str) -> Optional[User]:
+    async def get_by_identifier(self, db: AsyncSession, identifier: str) -> Optional[User]:
+        """根據登入識別碼（用戶名、郵箱或電話）查找用戶，依識別碼類型只查詢對應的索引欄位"""
+        for query in self.identifier_queries(identifier):
+            user = (await db.execute(query)).scalars().first()
+            if user is not None:
+                return user
+        return None
+    
+    async def authenticate_user(self, db: AsyncSession, username: str, password: str) -> Optional[User]:
         """用戶認證"""
-        user = self.get_by_username_or_email_or_phone(db, username, username, username)
+        user = await self.get_by_identifier(db, username)
         
         if not user:
             return None
@@ -70,26 +126,34 @@ class UserService(BaseService[User]):
             return None
         
         # 驗證密碼
-        if not verify_password_with_salt(password, user.password_salt, user.password_hash, user.password_iters):
+        if not await verify_password_with_salt_async(password, user.password_salt, user.password_hash, user.password_iters):
             # 增加失敗次數
-            self.increment_failed_login_count(db, user)
+            await self.increment_failed_login_count(db, user)
             return None
         
+        # 雜湊參數過時時於背景重新雜湊
+        password_rehasher.submit(user.id, password, user.password_hash, user.password_iters)
+        
         # 重置失敗次數
-        self.reset_failed_login_count(db, user)
+        await self.reset_failed_login_count(db, user)
         return user
     
-    def increment_failed_login_count(self, db: Session, user: User):
-        """增加登入失敗次數"""
-        user.failed_login_count += 1
-        
-        # 如果失敗次數達到3次，鎖定帳號
-        if user.failed_login_count >= 3:
-            user.status = -1  # 鎖定狀態
-        
-        db.commit()
+    async def increment_failed_login_count(self, db: AsyncSession, user: User):
+        """增加登入失敗次數（以原子 UPDATE 遞增，多個 worker 並發失敗時不會遺漏）"""
+        # 如果失敗次數達到3次，鎖定帳號；status 排在前面，MySQL 依序套用 SET 時仍以遞增前的值判斷
+        await db.execute(
+            update(User)
+            .where(User.id == user.id)
+            .ordered_values(
+                (User.status, case((User.failed_login_count + 1 >= 3, -1), else_=User.status)),
+                (User.failed_login_count, User.failed_login_count + 1)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        invalidation_bus.publish(USER_CHANGED, user.id)
     
-    def reset_failed_login_count(self, db: Session, user: User, ip_address: Optional[str] = None):
+    async def reset_failed_login_count(self, db: AsyncSession, user: User, ip_address: Optional[str] = None):
         """重置登入失敗次數"""
         user.failed_login_count = 0
         user.status = 1  # 活躍狀態
@@ -106,73 +170,80 @@ class UserService(BaseService[User]):
             except socket.error:
                 pass
         
-        db.commit()
+        await db.commit()
+        invalidation_bus.publish(USER_CHANGED, user.id)
     
-    def update_password(self, db: Session, user: User, new_password: str):
+    async def update_password(self, db: AsyncSession, user: User, new_password: str):
         """更新用戶密碼"""
-        password_hash, password_salt, password_iters = create_password_hash(new_password)
+        password_hash, password_salt, password_iters = await create_password_hash_async(new_password)
         user.password_hash = password_hash
         user.password_salt = password_salt
         user.password_iters = password_iters
         user.updated_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
+        invalidation_bus.publish(USER_CHANGED, user.id)
     
-    def set_password_reset_token(self, db: Session, user: User) -> str:
+    async def set_password_reset_token(self, db: AsyncSession, user: User) -> str:
         """設置密碼重設令牌"""
         from app.core.security import generate_password_reset_token
         token = generate_password_reset_token()
         user.password_reset_token = hash_token(token)
         user.password_reset_expires = datetime.utcnow() + timedelta(hours=1)
-        db.commit()
+        await db.commit()
         return token
     
-    def reset_password_with_token(self, db: Session, token: str, new_password: str) -> bool:
+    async def reset_password_with_token(self, db: AsyncSession, token: str, new_password: str) -> bool:
         """使用令牌重設密碼"""
         hashed_token = hash_token(token)
-        user = db.query(User).filter(
+        result = await db.execute(select(User).where(
             User.password_reset_token == hashed_token,
             User.password_reset_expires > datetime.utcnow()
-        ).first()
+        ))
+        user = result.scalars().first()
         
         if not user:
             return False
         
         # 更新密碼
-        self.update_password(db, user, new_password)
+        await self.update_password(db, user, new_password)
         
         # 清除重設令牌
         user.password_reset_token = None
         user.password_reset_expires = None
         user.failed_login_count = 0
         user.status = 1
-        db.commit()
+        await db.commit()
+        invalidation_bus.publish(USER_CHANGED, user.id)
         
         return True
     
-    def get_active_users(self, db: Session, skip: int = 0, limit: int = 100) -> List[User]:
+    async def get_active_users(self, db: AsyncSession, skip: int = 0, limit: int = 100,
+                               cursor: Optional[str] = None) -> Tuple[List[User], Optional[str]]:
         """獲取活躍用戶列表"""
-        return db.query(User).filter(User.status == 1).offset(skip).limit(limit).all()
+        return await self.paginate_async(db, select(User).where(User.status == 1), cursor, skip, limit)
     
-    def get_locked_users(self, db: Session, skip: int = 0, limit: int = 100) -> List[User]:
+    async def get_locked_users(self, db: AsyncSession, skip: int = 0, limit: int = 100,
+                               cursor: Optional[str] = None) -> Tuple[List[User], Optional[str]]:
         """獲取被鎖定的用戶列表"""
-        return db.query(User).filter(User.status == -1).offset(skip).limit(limit).all()
+        return await self.paginate_async(db, select(User).where(User.status == -1), cursor, skip, limit)
     
-    def set_email_verification_token(self, db: Session, user: User) -> str:
+    async def set_email_verification_token(self, db: AsyncSession, user: User) -> str:
         """設置郵箱驗證令牌"""
         from app.core.security import generate_password_reset_token
         token = generate_password_reset_token()
         user.email_verification_token = hash_token(token)
         user.email_verification_expires = datetime.utcnow() + timedelta(hours=24)  # 24小時過期
-        db.commit()
+        await db.commit()
         return token
     
-    def verify_email_with_token(self, db: Session, token: str) -> bool:
+    async def verify_email_with_token(self, db: AsyncSession, token: str) -> bool:
         """使用令牌驗證郵箱"""
         hashed_token = hash_token(token)
-        user = db.query(User).filter(
+        result = await db.execute(select(User).where(
             User.email_verification_token == hashed_token,
             User.email_verification_expires > datetime.utcnow()
-        ).first()
+        ))
+        user = result.scalars().first()
         
         if not user:
             return False
@@ -182,10 +253,7 @@ class UserService(BaseService[User]):
         user.status = 1  # 活躍狀態
         user.email_verification_token = None
         user.email_verification_expires = None
-        db.commit()
+        await db.commit()
+        invalidation_bus.publish(USER_CHANGED, user.id)
         
         return True
-
-
-
-
@@ -0,0 +1,257 @@
+"""
+API 負載基準測試
+以 ASGI transport 在同一進程中啟動 app.main:app，對預先建立資料的資料庫執行
+登入、/auth/me、列表與資料庫配置查詢等工作負載，輸出吞吐量與 p50/p95/p99，
+並將結果存為 JSON 以便比較不同 commit 之間各端點的效能變化
+
+用法:
+    python benchmarks/api_load.py [--workloads login,me,servers,configs,config] [--concurrency 16]
+                                  [--requests 500] [--users 20] [--database-url sqlite:///...]
+                                  [--output result.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = "Bench#Passw0rd"
+API = "/api/v1"
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """線性內插分位數"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = q * (len(ordered) - 1)
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def git_commit() -> Optional[str]:
+    """目前的 commit，無法取得時返回 None"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def seed(users: int, servers_per_user: int, configs_per_server: int) -> List[Dict[str, Any]]:
+    """建立資料表與測試資料（已存在的測試用戶會直接沿用），返回各用戶的資源 ID"""
+    from sqlalchemy import select
+    from app.db import SessionLocal, engine
+    from app.models import Base, User, Server, DatabaseConfig
+    from app.models.database_config import DatabaseType
+    from app.core.security import create_password_hash
+    from app.services.database_config_service import DatabaseConfigService
+    
+    Base.metadata.create_all(bind=engine)
+    password_hash, password_salt, password_iters = create_password_hash(PASSWORD)
+    encrypted_password = DatabaseConfigService()._encrypt_password("secret")
+    
+    fixtures = []
+    with SessionLocal() as db:
+        for index in range(users):
+            username = f"bench{index}"
+            user = db.execute(select(User).where(User.username == username)).scalars().first()
+            if user is None:
+                user = User(
+                    username=username, email=f"{username}@bench.local",
+                    password_hash=password_hash, password_salt=password_salt,
+                    password_iters=password_iters, status=1
+                )
+                db.add(user)
+                db.flush()
+                for server_index in range(servers_per_user):
+                    server = Server(
+                        user_id=user.id, server_name=f"server-{server_index}",
+                        server_ip=f"10.0.{index % 256}.{server_index % 256}", server_port=22
+                    )
+                    db.add(server)
+                    db.flush()
+                    for config_index in range(configs_per_server):
+                        db.add(DatabaseConfig(
+                            user_id=user.id, server_id=server.id, config_name=f"config-{config_index}",
+                            host="127.0.0.1", port=1, database_name="bench", username="bench",
+                            password_hash=encrypted_password, db_type=DatabaseType.POSTGRESQL,
+                            is_default=config_index == 0
+                        ))
+                db.commit()
+            config_ids = list(db.execute(
+                select(DatabaseConfig.id).where(DatabaseConfig.user_id == user.id)
+            ).scalars().all())
+            fixtures.append({"username": username, "config_ids": config_ids})
+    return fixtures
+
+def build_workloads(fixtures: List[Dict[str, Any]]) -> Dict[str, Callable]:
+    """各工作負載：接收 (client, 用戶資料) 並送出一個請求"""
+    def auth(fixture):
+        return {"Authorization": f"Bearer {fixture['token']}"}
+    
+    async def login(client, fixture):
+        return await client.post(f"{API}/auth/login", json={"username": fixture["username"], "password": PASSWORD})
+    
+    async def me(client, fixture):
+        return await client.get(f"{API}/auth/me", headers=auth(fixture))
+    
+    async def servers(client, fixture):
+        return await client.get(f"{API}/servers/", headers=auth(fixture), params={"limit": 20})
+    
+    async def configs(client, fixture):
+        return await client.get(f"{API}/database-configs/", headers=auth(fixture), params={"limit": 20})
+    
+    async def config(client, fixture):
+        config_id = random.choice(fixture["config_ids"])
+        return await client.get(f"{API}/database-configs/{config_id}", headers=auth(fixture))
+    
+    return {"login": login, "me": me, "servers": servers, "configs": configs, "config": config}
+
+async def run_workload(client, name: str, request: Callable, fixtures: List[Dict[str, Any]],
+                       concurrency: int, total: int) -> Dict[str, Any]:
+    """以固定並發數送出 total 個請求"""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    remaining = total
+    
+    async def worker(worker_index: int):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            fixture = fixtures[(worker_index + remaining) % len(fixtures)]
+            start = time.perf_counter()
+            try:
+                response = await request(client, fixture)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 3) if value is not None else None
+    
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(max(latencies)) if latencies else None,
+    }
+
+async def benchmark(args, fixtures: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    import httpx
+    from app.main import app
+    
+    workloads = build_workloads(fixtures)
+    results = {}
+    # ASGITransport 不會觸發 lifespan，需自行啟動背景資源
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for fixture in fixtures:
+                response = await workloads["login"](client, fixture)
+                response.raise_for_status()
+                fixture["token"] = response.json()["access_token"]
+            
+            for name in args.workloads:
+                if name not in workloads:
+                    raise SystemExit(f"未知的工作負載: {name}（可用: {', '.join(workloads)}）")
+                # 暖機：填充快取與連接池，不計入結果
+                await run_workload(client, name, workloads[name], fixtures, args.concurrency, args.warmup)
+                results[name] = await run_workload(
+                    client, name, workloads[name], fixtures, args.concurrency, args.requests
+                )
+                print_result(name, results[name])
+    return results
+
+def print_result(name: str, result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    """輸出單一工作負載的結果（有基準時附上變化百分比）"""
+    def delta(key: str) -> str:
+        if not baseline or not baseline.get(key) or result.get(key) is None:
+            return ""
+        return f" ({(result[key] - baseline[key]) / baseline[key] * 100:+.1f}%)"
+    
+    errors = sum(result["errors"].values())
+    print(
+        f"{name:<10} {result['throughput_rps']:>9,.1f} req/s{delta('throughput_rps')}  "
+        f"p50 {result['p50_ms']:>8.2f} ms{delta('p50_ms')}  "
+        f"p95 {result['p95_ms']:>8.2f} ms{delta('p95_ms')}  "
+        f"p99 {result['p99_ms']:>8.2f} ms{delta('p99_ms')}"
+        + (f"  errors {errors} {result['errors']}" if errors else "")
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="API 負載基準測試（進程內 ASGI）")
+    parser.add_argument("--workloads", default="login,me,servers,configs,config", help="逗號分隔的工作負載")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="每個工作負載的請求數")
+    parser.add_argument("--warmup", type=int, default=50, help="每個工作負載的暖機請求數")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--servers-per-user", type=int, default=5)
+    parser.add_argument("--configs-per-server", type=int, default=4)
+    parser.add_argument("--database-url", default=None, help="預設為暫存的 SQLite 檔案")
+    parser.add_argument("--output", default=None, help="結果 JSON 路徑")
+    parser.add_argument("--compare", default=None, help="比較用的基準結果 JSON")
+    args = parser.parse_args()
+    args.workloads = [name.strip() for name in args.workloads.split(",") if name.strip()]
+    
+    # 必須在匯入 app 之前設定
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='api-bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("PROBER_ENABLED", "false")
+    # 所有請求來自同一 IP，登入工作負載不應受節流影響
+    os.environ.setdefault("LOGIN_THROTTLE_ENABLED", "false")
+    os.environ.setdefault("DEBUG", "false")
+    
+    fixtures = seed(args.users, args.servers_per_user, args.configs_per_server)
+    print(f"database={database_url.split('@')[-1]} users={args.users} concurrency={args.concurrency} "
+          f"requests={args.requests}")
+    results = asyncio.run(benchmark(args, fixtures))
+    
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": database_url.split("://")[0],
+        "parameters": {
+            "concurrency": args.concurrency, "requests": args.requests, "warmup": args.warmup,
+            "users": args.users, "servers_per_user": args.servers_per_user,
+            "configs_per_server": args.configs_per_server
+        },
+        "results": results,
+    }
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n相對於 {baseline.get('commit')} ({baseline.get('timestamp')}):")
+        for name, result in results.items():
+            print_result(name, result, baseline.get("results", {}).get(name))
+    
+    output = args.output or f"api_load-{report['commit'] or 'unknown'}-{datetime.utcnow():%Y%m%d%H%M%S}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n結果已寫入 {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+登入識別碼查詢基準測試
+在大量用戶的資料表上比較舊的 username/email/phone OR 查詢與依識別碼類型分流的
+索引查詢，輸出吞吐量、命中數與各查詢的執行計畫
+
+用法:
+    python benchmarks/identifier_lookup.py [--users 1000000] [--lookups 20000] [--database-url sqlite:///...]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def seed(engine, users: int, batch_size: int):
+    """建立資料表並補足測試用戶（已存在的用戶會直接沿用）"""
+    from sqlalchemy import func, insert, select
+    from app.models import Base, User
+    from app.core.identifiers import normalize_email, normalize_phone
+    
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        existing = conn.execute(select(func.count()).select_from(User)).scalar()
+    if existing >= users:
+        return
+    
+    start_time = time.perf_counter()
+    for start in range(existing, users, batch_size):
+        rows = []
+        for index in range(start, min(start + batch_size, users)):
+            email = f"User{index}@Bench.local"
+            phone = f"09{index:08d}"
+            rows.append({
+                "username": f"user{index}", "email": email, "phone": phone,
+                "email_normalized": normalize_email(email), "phone_normalized": normalize_phone(phone),
+                "password_hash": b"\0" * 32, "password_salt": b"\0" * 16, "password_iters": 1, "status": 1,
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(User.__table__), rows)
+        print(f"\r建立測試用戶 {min(start + batch_size, users):,}/{users:,}", end="", flush=True)
+    print(f"\r建立測試用戶 {users:,} 筆，耗時 {time.perf_counter() - start_time:.1f} 秒")
+
+def identifiers(users: int, lookups: int):
+    """混合用戶名、郵箱（大小寫不同）、電話（不同格式）與不存在的識別碼"""
+    rng = random.Random(42)
+    values = []
+    for _ in range(lookups):
+        index = rng.randrange(users)
+        kind = rng.randrange(4)
+        if kind == 0:
+            values.append(f"user{index}")
+        elif kind == 1:
+            values.append(f"user{index}@bench.LOCAL")
+        elif kind == 2:
+            phone = f"09{index:08d}"
+            values.append(f"{phone[:4]}-{phone[4:7]}-{phone[7:]}")
+        else:
+            values.append(f"missing{index}@bench.local")
+    return values
+
+def or_query(identifier: str):
+    """原本的查詢：username / email / phone 三欄 OR"""
+    from sqlalchemy import or_, select
+    from app.models import User
+    return [select(User).where(or_(User.username == identifier, User.email == identifier, User.phone == identifier))]
+
+def classified_query(identifier: str):
+    """依識別碼類型分流的索引查詢"""
+    from app.services.user_service import UserService
+    return UserService.identifier_queries(identifier)
+
+def run(label: str, session, build, values):
+    """執行基準測試並輸出結果"""
+    hits = 0
+    statements = 0
+    start = time.perf_counter()
+    for value in values:
+        for query in build(value):
+            statements += 1
+            if session.execute(query).scalars().first() is not None:
+                hits += 1
+                break
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {len(values) / elapsed:>10,.0f} ops/s  {elapsed / len(values) * 1e6:>8.1f} us/op  "
+          f"hits {hits:,}/{len(values):,}  statements {statements:,}")
+
+def explain(engine, label: str, queries):
+    """輸出執行計畫"""
+    from sqlalchemy import text
+    prefix = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    with engine.connect() as conn:
+        for query in queries:
+            sql = str(query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            print(f"\n[{label}] {sql.splitlines()[-1].strip()}")
+            for row in conn.execute(text(f"{prefix} {sql}")):
+                print("   ", " | ".join(str(column) for column in row))
+
+def main():
+    parser = argparse.ArgumentParser(description="登入識別碼查詢基準測試")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=10000, help="建立測試用戶時每批寫入的資料列數")
+    parser.add_argument("--database-url", default=None, help="預設為暫存的 SQLite 檔案")
+    args = parser.parse_args()
+    
+    # 必須在匯入 app 之前設定
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='identifier-bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    
+    from sqlalchemy.orm import Session
+    from app.db.engine_profiles import create_engine_from_profile
+    
+    engine = create_engine_from_profile(database_url, name="benchmark")
+    seed(engine, args.users, args.batch_size)
+    values = identifiers(args.users, args.lookups)
+    print(f"database={database_url.split('@')[-1]} users={args.users:,} lookups={args.lookups:,}")
+    
+    with Session(engine) as session:
+        # 暖機：填充頁面快取
+        run("warmup", session, classified_query, values[:1000])
+        run("or", session, or_query, values)
+        run("classified", session, classified_query, values)
+    
+    for value in ("user1", "user1@bench.LOCAL", "0900-000-001"):
+        explain(engine, "or", or_query(value))
+        explain(engine, "classified", classified_query(value)[:1])
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
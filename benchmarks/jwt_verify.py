@@ -0,0 +1,47 @@
+"""
+JWT 驗證微基準測試
+比較快取與未快取的令牌驗證吞吐量
+
+用法:
+    python benchmarks/jwt_verify.py [--iterations 20000] [--tokens 100] [--backend jose]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def run(label: str, func, tokens, iterations: int):
+    """執行基準測試並輸出結果"""
+    start = time.perf_counter()
+    for i in range(iterations):
+        assert func(tokens[i % len(tokens)]) is not None
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {iterations / elapsed:>12,.0f} ops/s  {elapsed / iterations * 1e6:>8.2f} us/op")
+
+def main():
+    parser = argparse.ArgumentParser(description="JWT 驗證微基準測試")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=100, help="輪流驗證的不同令牌數")
+    parser.add_argument("--backend", default=None, help="JWT 後端（jose / pyjwt）")
+    args = parser.parse_args()
+    
+    if args.backend:
+        os.environ["JWT_BACKEND"] = args.backend
+    
+    from app.core import security
+    
+    tokens = [
+        security.create_access_token({"sub": str(i), "username": f"user{i}"})
+        for i in range(args.tokens)
+    ]
+    print(f"backend={security.jwt_backend.name} iterations={args.iterations} tokens={args.tokens}")
+    
+    run("uncached", security.decode_token, tokens, args.iterations)
+    security.token_cache.clear()
+    run("cached", security.verify_token, tokens, args.iterations)
+    print(f"cache: {security.token_cache.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ Migration 和 Seeder 執行腳本
 import sys
 import os
 from sqlalchemy.orm import Session
-from sqlalchemy import text, create_engine
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 
 # 添加項目根目錄到 Python 路徑
@@ -13,16 +13,12 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.core.config import settings
 from app.core.security import create_password_hash
+from app.core.instrumentation import instrument_engine
+from app.db.engine_profiles import create_engine_from_profile
 
 # 創建數據庫引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    echo=True,
-    pool_recycle=300,
-    pool_size=10,
-    max_overflow=20
-)
+engine = create_engine_from_profile(settings.DATABASE_URL)
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
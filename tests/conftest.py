@@ -0,0 +1,34 @@
+"""
+測試共用設定
+在匯入 app 之前指向暫存的 SQLite 資料庫並關閉背景任務，每個測試前重建資料表
+"""
+import os
+import sys
+import tempfile
+
+_database_dir = tempfile.mkdtemp(prefix="arfa-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_database_dir}/test.db"
+os.environ.setdefault("PROBER_ENABLED", "false")
+os.environ.setdefault("LOGIN_THROTTLE_ENABLED", "false")
+os.environ.setdefault("PASSWORD_HASH_CALIBRATE_ON_STARTUP", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+@pytest.fixture(autouse=True)
+def database():
+    """每個測試使用全新的資料表"""
+    from app.db import engine
+    from app.models import Base
+    
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+
+@pytest.fixture(scope="session", autouse=True)
+def password_hashing_pool():
+    """測試結束後關閉密碼雜湊執行池"""
+    from app.core.password_hashing import password_hashing_pool
+    
+    yield password_hashing_pool
+    password_hashing_pool.shutdown()
@@ -0,0 +1,19 @@
+"""
+測試輔助函式
+"""
+import asyncio
+
+def run_async(coro):
+    """在新的事件循環中執行協程，結束後釋放非同步引擎的連線（連線不可跨事件循環使用）"""
+    from app.db import async_engine
+    
+    async def runner():
+        # 先建立一條連線完成方言初始化，並發建立首條連線時會在初始化鎖上互相等待
+        async with async_engine.connect():
+            pass
+        try:
+            return await coro
+        finally:
+            await async_engine.dispose()
+    
+    return asyncio.run(runner())
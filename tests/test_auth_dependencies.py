@@ -0,0 +1,106 @@
+"""
+認證依賴：與端點共用請求範圍的會話，唯讀端點優先讀取副本
+"""
+import tempfile
+from datetime import datetime
+from fastapi import Depends, FastAPI
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, select
+from app.core.dependencies import get_current_user, require_permission
+from app.core.security import create_access_token
+from app.core.session import generate_session_id
+from app.db import AsyncSessionLocal, async_engine, get_async_database_url, get_async_db, get_async_read_db
+from app.db.engine_profiles import create_async_engine_from_profile
+from app.db.routing import USE_REPLICA, ReplicaSet, prefer_replica, reads_from_replica
+from app.models import Base
+from app.models.user import User
+from app.models.user_session import UserSession
+from tests.helpers import run_async
+
+def _seed(engines, user_id: int) -> str:
+    """在指定的資料庫中建立用戶與會話，返回訪問令牌"""
+    session_id = generate_session_id()
+    now = datetime.utcnow()
+    for engine in engines:
+        with engine.begin() as conn:
+            conn.execute(User.__table__.insert(), [{
+                "id": user_id, "username": f"user{user_id}", "password_hash": b"x", "password_salt": b"x",
+                "password_iters": 1, "status": 1, "failed_login_count": 0, "mfa_enabled": False,
+                "email_verified": True, "created_at": now, "updated_at": now
+            }])
+            conn.execute(UserSession.__table__.insert(), [{
+                "user_id": user_id, "session_id": session_id, "token_signature": "x",
+                "created_at": now, "last_seen_at": now
+            }])
+    return create_access_token({"sub": str(user_id), "sid": session_id})
+
+def test_get_current_user_reads_replica_and_falls_back_to_primary(database):
+    replica_url = f"sqlite:///{tempfile.mkdtemp(prefix='arfa-replica-')}/replica.db"
+    replica_engine = create_engine(replica_url)
+    Base.metadata.create_all(bind=replica_engine)
+    replicas = ReplicaSet([create_async_engine_from_profile(get_async_database_url(replica_url), name="test_replica")],
+                          selection="round_robin", max_lag=5, check_interval=60, check_timeout=1)
+    replicas.replicas[0].healthy = True
+    
+    # 已複寫到副本的用戶與會話；以及只存在於主庫（尚未複寫）的
+    replicated_token = _seed([database, replica_engine], 101)
+    primary_only_token = _seed([database], 102)
+    
+    async def authenticate(token: str):
+        async with AsyncSessionLocal(replicas=replicas) as db:
+            prefer_replica(db)
+            principal = await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token), db)
+            return principal.id, reads_from_replica(db)
+    
+    async def scenario():
+        try:
+            assert await authenticate(replicated_token) == (101, True)
+            # 副本查不到時改查主庫，之後該請求的查詢都送往主庫
+            assert await authenticate(primary_only_token) == (102, False)
+        finally:
+            await replicas.replicas[0].engine.dispose()
+    
+    run_async(scenario())
+    replica_engine.dispose()
+
+def test_auth_and_endpoint_share_one_session_per_request(database):
+    token = _seed([database], 201)
+    app = FastAPI()
+    seen = {}
+    
+    @app.post("/write")
+    async def write(current_user=Depends(get_current_user), db=Depends(get_async_db)):
+        seen["write"] = db
+        await db.execute(select(User.id))
+        return current_user.id
+    
+    @app.get("/read")
+    async def read(current_user=Depends(get_current_user), db=Depends(get_async_read_db)):
+        seen["read"] = db
+        await db.execute(select(User.id))
+        return current_user.id
+    
+    @app.get("/guarded")
+    async def guarded(current_user=Depends(require_permission("user.read")), db=Depends(get_async_read_db)):
+        return current_user.id
+    
+    checkouts = []
+    listener = lambda *args: checkouts.append(1)
+    event.listen(async_engine.sync_engine, "checkout", listener)
+    try:
+        with TestClient(app) as client:
+            headers = {"Authorization": f"Bearer {token}"}
+            for method, path in (("post", "/write"), ("get", "/read")):
+                checkouts.clear()
+                response = getattr(client, method)(path, headers=headers)
+                assert response.status_code == 200 and response.json() == 201
+                assert len(checkouts) == 1, path
+            # 唯讀端點的會話在認證依賴執行前即優先讀取副本；寫入端點不會
+            assert seen["read"].sync_session.info.get(USE_REPLICA)
+            assert not seen["write"].sync_session.info.get(USE_REPLICA)
+            checkouts.clear()
+            assert client.get("/guarded", headers=headers).status_code == 403
+            assert len(checkouts) <= 1
+    finally:
+        event.remove(async_engine.sync_engine, "checkout", listener)
@@ -0,0 +1,35 @@
+"""
+連接池指標：每次借出只記錄一次等待時間
+"""
+import sqlite3
+from app.db.engine_profiles import POOL_CHECKED_OUT, POOL_WAIT, InstrumentedQueuePool
+
+class _ContendedPool(InstrumentedQueuePool):
+    """第一次增加溢出數時模擬被其他執行緒搶先，使 QueuePool._do_get 遞迴重試"""
+    
+    contended = False
+    
+    def _inc_overflow(self):
+        if not self.contended:
+            self.contended = True
+            return False
+        return super()._inc_overflow()
+
+def test_pool_wait_recorded_once_per_checkout():
+    pool = _ContendedPool(lambda: sqlite3.connect(":memory:"), pool_size=2, max_overflow=0,
+                          logging_name="test_pool_metrics")
+    before = POOL_WAIT.count(engine="test_pool_metrics")
+    
+    first = pool.connect()
+    assert pool.contended
+    assert POOL_WAIT.count(engine="test_pool_metrics") == before + 1
+    assert POOL_CHECKED_OUT.get(engine="test_pool_metrics") == 1
+    
+    second = pool.connect()
+    assert POOL_WAIT.count(engine="test_pool_metrics") == before + 2
+    assert POOL_CHECKED_OUT.get(engine="test_pool_metrics") == 2
+    
+    first.close()
+    second.close()
+    assert POOL_CHECKED_OUT.get(engine="test_pool_metrics") == 0
+    pool.dispose()
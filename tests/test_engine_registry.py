@@ -0,0 +1,24 @@
+"""
+外部資料庫引擎註冊表：驅動層逾時
+"""
+from app.core.config import settings
+from app.db.engine_registry import EngineRegistry
+
+def test_connect_args_per_driver():
+    assert EngineRegistry.connect_args("mysql+pymysql://u:p@h:3306/d", 7.5) == {
+        "connect_timeout": 7.5, "read_timeout": 7.5, "write_timeout": 7.5
+    }
+    assert EngineRegistry.connect_args("postgresql://u:p@h:5432/d", 0.5) == {
+        "connect_timeout": 2, "options": "-c statement_timeout=500"
+    }
+    assert EngineRegistry.connect_args("sqlite:///test.db", 3) == {"timeout": 3}
+
+def test_engines_reused_with_pool_timeout():
+    registry = EngineRegistry(max_engines=2, idle_seconds=60, pool_size=1, max_overflow=0)
+    connection_string = "mysql+pymysql://u:p@127.0.0.1:3306/d"
+    engine = registry.get_engine(1, connection_string)
+    try:
+        assert registry.get_engine(1, connection_string) is engine
+        assert engine.pool.timeout() == settings.CONNECTION_TEST_TIMEOUT_SECONDS
+    finally:
+        registry.dispose_all()
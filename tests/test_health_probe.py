@@ -0,0 +1,77 @@
+"""
+背景健康探測：租約取得
+"""
+import asyncio
+from sqlalchemy import text
+from app.db import AsyncSessionLocal
+from app.models.database_config import DatabaseConfig, DatabaseType
+from app.models.server import Server
+from app.services.health_probe_service import HealthProber
+from tests.helpers import run_async
+
+def _prober(batch_size: int = 10) -> HealthProber:
+    return HealthProber(interval=60, max_backoff=600, jitter_ratio=0.1, concurrency=4,
+                        batch_size=batch_size, poll_seconds=1, lease_seconds=120)
+
+def _seed(database, count: int):
+    with database.begin() as conn:
+        conn.execute(Server.__table__.insert(), [
+            {"id": 1, "user_id": 1, "server_name": "s1", "server_ip": "127.0.0.1", "server_port": 22, "is_active": True}
+        ])
+        conn.execute(DatabaseConfig.__table__.insert(), [
+            {
+                "id": index, "user_id": 1, "server_id": 1, "config_name": f"c{index}", "host": "127.0.0.1",
+                "port": 5432, "database_name": "db", "username": "u", "password_hash": "x",
+                "db_type": DatabaseType.POSTGRESQL, "is_active": True, "probe_failures": 0
+            }
+            for index in range(1, count + 1)
+        ])
+
+def test_claim_batch_with_rounded_lease_timestamps(database):
+    """租約到期時間被資料庫捨入為整秒（MySQL TIMESTAMP）時仍能查回取得的配置"""
+    _seed(database, 3)
+    with database.begin() as conn:
+        conn.execute(text("""
+        CREATE TRIGGER round_probe_lease AFTER UPDATE OF probe_lease_expires_at ON database_configs
+        WHEN NEW.probe_lease_expires_at IS NOT NULL
+        BEGIN
+            UPDATE database_configs SET probe_lease_expires_at = substr(NEW.probe_lease_expires_at, 1, 19) || '.000000'
+            WHERE id = NEW.id;
+        END
+        """))
+    prober = _prober()
+    
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            lease_owner, configs = await prober.claim_batch(db)
+        assert sorted(config.id for config in configs) == [1, 2, 3]
+        assert all(config.probe_lease_owner == lease_owner for config in configs)
+        assert lease_owner.startswith(prober.worker_id)
+        
+        # 租約未到期前不會被再次取得
+        async with AsyncSessionLocal() as db:
+            assert await prober.claim_batch(db) == ("", [])
+    
+    run_async(scenario())
+
+def test_concurrent_claims_are_disjoint(database):
+    _seed(database, 12)
+    probers = [_prober(batch_size=5) for _ in range(4)]
+    
+    async def claim(prober: HealthProber):
+        async with AsyncSessionLocal() as db:
+            _, configs = await prober.claim_batch(db)
+            return [config.id for config in configs]
+    
+    async def scenario():
+        ids = []
+        # 並發取得時落敗的 worker 這一輪可能拿到較少配置，重複取得直到沒有到期的配置
+        for _ in range(12):
+            claimed = await asyncio.gather(*(claim(prober) for prober in probers))
+            batch_ids = [config_id for batch in claimed for config_id in batch]
+            if not batch_ids:
+                break
+            ids += batch_ids
+        assert sorted(ids) == list(range(1, 13))
+    
+    run_async(scenario())
@@ -0,0 +1,69 @@
+"""
+登入識別碼查詢：正規化欄位查詢與遷移清空重複值後的原始欄位比對
+"""
+from sqlalchemy import update
+from app.db import AsyncSessionLocal
+from app.models.user import User
+from app.services.user_service import UserService
+from tests.helpers import run_async
+
+PASSWORD = "Passw0rd!x"
+
+def test_lookup_by_normalized_email_and_phone():
+    service = UserService()
+    
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            user = await service.create_user(db, "alice", "Alice@Example.com", "0912 345 678", PASSWORD)
+            for identifier in ("alice", "ALICE@example.COM", "+886912345678", "0912-345-678"):
+                found = await service.get_by_identifier(db, identifier)
+                assert found is not None and found.id == user.id, identifier
+            assert await service.get_by_identifier(db, "bob@example.com") is None
+            assert (await service.authenticate_user(db, "alice@EXAMPLE.com", PASSWORD)).id == user.id
+    
+    run_async(scenario())
+
+def test_user_with_cleared_normalized_identifiers():
+    """遷移時因正規化後重複而清空正規化值的用戶：無關的更新不會重算，仍可以原始郵箱與電話登入"""
+    service = UserService()
+    
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            first = await service.create_user(db, "first", "dup@example.com", "0912345678", PASSWORD)
+            second = await service.create_user(db, "second", "other@example.com", "0922333444", PASSWORD)
+            # 模擬遷移前已存在、正規化後與 first 重複的資料
+            await db.execute(
+                update(User.__table__).where(User.id == second.id)
+                .values(email="DUP@example.com", email_normalized=None, phone="+886 912 345 678", phone_normalized=None)
+            )
+            await db.commit()
+        
+        async with AsyncSessionLocal() as db:
+            # 只變更失敗次數的 ORM 更新不應寫回重複的正規化值
+            await service.update_async(db, second.id, failed_login_count=1)
+            await service.update_async(db, second.id, email="DUP@example.com")
+            
+            user = await db.get(User, second.id)
+            assert user.failed_login_count == 1
+            assert user.email_normalized is None and user.phone_normalized is None
+            
+            assert (await service.get_by_identifier(db, "dup@example.com")).id == first.id
+            # 原始值完全相符時優先於正規化後相同的用戶
+            assert (await service.get_by_identifier(db, "DUP@example.com")).id == second.id
+            assert (await service.get_by_identifier(db, "0912345678")).id == first.id
+            assert (await service.authenticate_user(db, "+886 912 345 678", PASSWORD)).id == second.id
+    
+    run_async(scenario())
+
+def test_changed_email_is_renormalized():
+    service = UserService()
+    
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            user = await service.create_user(db, "carol", "carol@example.com", None, PASSWORD)
+            await service.update_async(db, user.id, email="Carol.New@Example.com")
+            found = await service.get_by_identifier(db, "carol.new@example.com")
+            assert found is not None and found.id == user.id
+            assert found.email_normalized == "carol.new@example.com"
+    
+    run_async(scenario())
@@ -0,0 +1,69 @@
+"""
+跨 worker 快取失效：資料庫後端的輪詢、略過自身事件、遲到事件的回看與積壓上限
+"""
+from datetime import datetime
+from app.core.invalidation import INVALIDATION_ERRORS, DatabaseInvalidationBackend, InvalidationBus
+from app.models.cache_invalidation import CacheInvalidation
+from tests.helpers import run_async
+
+def _worker():
+    """建立一個 worker 的匯流排，返回 (後端, 收到的事件)"""
+    backend = DatabaseInvalidationBackend(poll_interval=1, retention_seconds=3600, max_pending=3)
+    bus = InvalidationBus(backend)
+    backend.bus = bus
+    received = []
+    bus.subscribe("user", lambda key: received.append(key))
+    return backend, received
+
+def test_events_reach_other_workers_but_not_the_publisher(database):
+    (backend_a, received_a), (backend_b, received_b) = _worker(), _worker()
+    
+    async def scenario():
+        # 啟動前的事件已反映在資料庫中，不重新分派
+        backend_a.bus.publish("user", 1)
+        await backend_a.flush()
+        for backend in (backend_a, backend_b):
+            await backend.poll()
+        assert received_b == []
+        
+        backend_a.bus.publish("user", 2)
+        backend_b.bus.publish("user", 3)
+        for backend in (backend_a, backend_b):
+            await backend.flush()
+        for backend in (backend_a, backend_b, backend_a, backend_b):
+            await backend.poll()
+    
+    run_async(scenario())
+    # 發布者在本進程立即分派一次，輪詢時略過自身事件
+    assert received_a == ["1", "2", "3"]
+    assert received_b == ["3", "2"]
+
+def test_late_committed_ids_are_delivered_once(database):
+    backend, received = _worker()
+    
+    def insert(*ids):
+        with database.begin() as conn:
+            conn.execute(CacheInvalidation.__table__.insert(), [{
+                "id": row_id, "topic": "user", "entity_key": str(row_id), "origin": "other-worker",
+                "created_at": datetime.utcnow()
+            } for row_id in ids])
+    
+    async def scenario():
+        await backend.poll()
+        insert(10, 12)
+        await backend.poll()
+        # 較小的 id 在較大的 id 之後才提交
+        insert(11)
+        await backend.poll()
+        await backend.poll()
+    
+    run_async(scenario())
+    assert received == ["10", "12", "11"]
+
+def test_pending_overflow_drops_oldest_events():
+    backend, _ = _worker()
+    before = INVALIDATION_ERRORS.get(backend="database", reason="overflow")
+    for key in range(5):
+        backend.publish(("user", str(key), 0.0))
+    assert [key for _, key, _ in backend._pending] == ["2", "3", "4"]
+    assert INVALIDATION_ERRORS.get(backend="database", reason="overflow") == before + 2
@@ -0,0 +1,93 @@
+"""
+連接測試延遲彙總：增量合併與並發寫入同一時間桶
+"""
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from app.core.config import settings
+from app.core.sketch import LatencySketch
+from app.db import AsyncSessionLocal
+from app.models.connection_test_rollup import ConnectionTestRollup, RollupResolution
+from app.models.database_config import ConnectionTestLog
+from app.services.latency_rollup_service import LatencyRollupService
+from tests.helpers import run_async
+
+TESTED_AT = datetime(2024, 5, 1, 10, 30, 15)
+
+async def _rollups(resolution: RollupResolution):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ConnectionTestRollup).where(ConnectionTestRollup.resolution == resolution.value)
+        )
+        return result.scalars().all()
+
+def test_record_merges_into_existing_buckets():
+    service = LatencyRollupService()
+    
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await service.record(db, [(1, 20, True, TESTED_AT), (1, None, False, TESTED_AT)])
+            await db.commit()
+        async with AsyncSessionLocal() as db:
+            await service.record(db, [(1, 5, True, TESTED_AT.replace(minute=31)), (1, 80, True, TESTED_AT)])
+            await db.commit()
+        
+        minutes = sorted(await _rollups(RollupResolution.MINUTE), key=lambda row: row.bucket_start)
+        assert [(row.count, row.failures) for row in minutes] == [(3, 1), (1, 0)]
+        assert (minutes[0].min_ms, minutes[0].max_ms, minutes[0].sum_ms) == (20, 80, 100)
+        
+        [hour] = await _rollups(RollupResolution.HOUR)
+        assert (hour.count, hour.failures, hour.min_ms, hour.max_ms, hour.sum_ms) == (4, 1, 5, 80, 105)
+        assert LatencySketch.from_json(hour.sketch).count == 3
+        
+        async with AsyncSessionLocal() as db:
+            [bucket] = await service.get_history(db, [1], RollupResolution.DAY, TESTED_AT, TESTED_AT)
+        assert bucket.count == 4 and bucket.avg_ms == 35.0
+    
+    run_async(scenario())
+
+def test_concurrent_writers_do_not_lose_updates():
+    """多個交易同時建立並更新同一時間桶時，計數與草圖都不遺失"""
+    service = LatencyRollupService()
+    writers = 8
+    
+    async def write(index: int):
+        async with AsyncSessionLocal() as db:
+            await service.record(db, [(1, 10 + index, index % 2 == 0, TESTED_AT)])
+            await db.commit()
+    
+    async def scenario():
+        await asyncio.gather(*(write(index) for index in range(writers)))
+        for resolution in RollupResolution:
+            [row] = await _rollups(resolution)
+            assert row.count == writers
+            assert row.failures == writers // 2
+            assert (row.min_ms, row.max_ms) == (10, 10 + writers - 1)
+            assert row.sum_ms == sum(10 + index for index in range(writers))
+            assert LatencySketch.from_json(row.sketch).count == writers
+    
+    run_async(scenario())
+
+def test_prune_keeps_raw_logs_unless_retention_is_configured(database, monkeypatch):
+    now = datetime.utcnow()
+    with database.begin() as conn:
+        conn.execute(ConnectionTestLog.__table__.insert(), [{
+            "connection_id": 1, "user_id": 1, "test_type": "CONNECTION", "status": "SUCCESS",
+            "response_time_ms": 10, "tested_at": now - timedelta(days=days)
+        } for days in (1, 30, 400)])
+    
+    def prune() -> int:
+        async def scenario():
+            async with AsyncSessionLocal() as db:
+                return (await LatencyRollupService().prune(db, now))["raw"]
+        return run_async(scenario())
+    
+    def remaining() -> int:
+        with database.connect() as conn:
+            return conn.scalar(select(func.count()).select_from(ConnectionTestLog))
+    
+    # 預設永久保留原始日誌，供稽核匯出
+    assert settings.CONNECTION_TEST_LOG_RETENTION_DAYS == 0
+    assert prune() == 0 and remaining() == 3
+    monkeypatch.setattr(settings, "CONNECTION_TEST_LOG_RETENTION_DAYS", 7)
+    assert prune() == 2 and remaining() == 1
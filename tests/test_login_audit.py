@@ -0,0 +1,98 @@
+"""
+登入稽核事件寫入：暫存檔重新寫入、損毀列與無法寫入事件的隔離、各進程獨立的暫存檔
+"""
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from app.core.audit import LoginEventSink, _HOSTNAME
+from app.models.login_log import UserLoginEvent
+from app.models.user import User
+from tests.helpers import run_async
+
+def _sink(tmp_path) -> LoginEventSink:
+    return LoginEventSink(batch_size=2, flush_interval=1, max_buffer=100, spill_path=str(tmp_path / "events.ndjson"))
+
+def _event(reason=1) -> dict:
+    return {"user_id": 1, "succeeded": reason == 1, "reason": reason, "ip": b"\x7f\x00\x00\x01",
+            "user_agent": "pytest", "occurred_at": datetime.utcnow()}
+
+def _seed_user(engine):
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{
+            "id": 1, "username": "alice", "password_hash": b"x", "password_salt": b"x", "password_iters": 1,
+            "status": 1, "failed_login_count": 0, "mfa_enabled": False, "email_verified": True,
+            "created_at": now, "updated_at": now
+        }])
+
+def _count(engine) -> int:
+    with engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(UserLoginEvent))
+
+def test_spill_per_process_and_replay_after_outage(database, tmp_path, monkeypatch):
+    _seed_user(database)
+    sink = _sink(tmp_path)
+    assert sink.spill_path == str(tmp_path / f"events.{_HOSTNAME}-{os.getpid()}.ndjson")
+    
+    async def unavailable(rows):
+        raise OperationalError("INSERT", {}, Exception("database is down"))
+    
+    for _ in range(3):
+        sink.record(_event())
+    monkeypatch.setattr(sink, "_insert", unavailable)
+    run_async(sink.flush())
+    assert sink.pending == 0 and _count(database) == 0
+    assert len(open(sink.spill_path).readlines()) == 3
+    
+    monkeypatch.undo()
+    sink.record(_event())
+    run_async(sink.flush())
+    assert _count(database) == 4
+    assert not os.path.exists(sink.spill_path) and not os.path.exists(sink.replay_path)
+    run_async(sink.flush())
+    assert _count(database) == 4
+
+def test_corrupt_spill_lines_are_quarantined_and_buffer_still_drains(database, tmp_path):
+    _seed_user(database)
+    sink = _sink(tmp_path)
+    sink._spill([_event(), _event()])
+    with open(sink.spill_path, "a", encoding="utf-8") as f:
+        # 進程在寫入中途結束留下的不完整列
+        f.write('{"user_id": 1, "succeeded": tr')
+    sink.record(_event())
+    
+    run_async(sink.flush())
+    assert _count(database) == 3
+    assert sink.pending == 0
+    assert not os.path.exists(sink.replay_path)
+    assert open(sink.quarantine_path).read().startswith('{"user_id": 1, "succeeded": tr')
+
+def test_rows_that_cannot_insert_are_quarantined(database, tmp_path):
+    _seed_user(database)
+    sink = _sink(tmp_path)
+    for reason in (1, None, 2):
+        sink.record(_event(reason))
+    
+    run_async(sink.flush())
+    assert _count(database) == 2
+    assert not os.path.exists(sink.spill_path)
+    quarantined = [json.loads(line) for line in open(sink.quarantine_path)]
+    assert [row["reason"] for row in quarantined] == [None]
+
+def test_spill_left_by_exited_process_is_replayed_once(database, tmp_path):
+    _seed_user(database)
+    sink = _sink(tmp_path)
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    orphan = str(tmp_path / f"events.{_HOSTNAME}-{exited.pid}.ndjson")
+    with open(orphan, "w", encoding="utf-8") as f:
+        f.write(json.dumps({**_event(), "ip": None, "occurred_at": datetime.utcnow().isoformat()}) + "\n")
+    
+    run_async(sink.flush())
+    run_async(sink.flush())
+    assert _count(database) == 1
+    assert not os.path.exists(orphan)
@@ -0,0 +1,131 @@
+"""
+登入節流：各範圍的上限、滑動視窗加權、成功後清除與資料庫後端的並發遞增
+"""
+import asyncio
+import pytest
+from sqlalchemy import select
+from app.core import login_throttle as throttle_module
+from app.core.login_throttle import (
+    DatabaseThrottleBackend, LoginThrottle, LoginThrottledError, MemoryThrottleBackend
+)
+from app.models.login_throttle import LoginThrottleCounter
+from tests.helpers import run_async
+
+WINDOW = 100
+
+class _Clock:
+    def __init__(self, now: float):
+        self.now = now
+    
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock(10_000.0)
+    monkeypatch.setattr(throttle_module.time, "time", clock)
+    return clock
+
+def _throttle(backend=None) -> LoginThrottle:
+    return LoginThrottle(backend or MemoryThrottleBackend(WINDOW, max_keys=1000), enabled=True,
+                         ip_limit=6, username_limit=4, ip_username_limit=3)
+
+async def _fail(throttle: LoginThrottle, ip, identifier: str, times: int):
+    for _ in range(times):
+        await throttle.record_failure(ip, identifier)
+
+def test_ip_username_limit_and_normalized_identifiers(clock):
+    throttle = _throttle()
+    
+    async def scenario():
+        await _fail(throttle, "10.0.0.1", "Alice@Example.com", 2)
+        await throttle.check("10.0.0.1", "alice@example.com")
+        await _fail(throttle, "10.0.0.1", " ALICE@example.com ", 1)
+        # 大小寫不同的同一郵箱共用計數
+        with pytest.raises(LoginThrottledError) as error:
+            await throttle.check("10.0.0.1", "alice@example.com")
+        assert 1 <= error.value.retry_after <= WINDOW
+        # 其他 IP 仍可嘗試，直到識別碼本身達到上限
+        await throttle.check("10.0.0.2", "alice@example.com")
+        await _fail(throttle, "10.0.0.2", "alice@example.com", 1)
+        with pytest.raises(LoginThrottledError):
+            await throttle.check("10.0.0.3", "alice@example.com")
+    
+    run_async(scenario())
+
+def test_ip_limit_spans_identifiers(clock):
+    throttle = _throttle()
+    
+    async def scenario():
+        for index in range(6):
+            await _fail(throttle, "10.0.0.9", f"user{index}", 1)
+        with pytest.raises(LoginThrottledError):
+            await throttle.check("10.0.0.9", "someone-else")
+        await throttle.check("10.0.0.10", "someone-else")
+    
+    run_async(scenario())
+
+def test_previous_window_is_weighted_by_remaining_overlap(clock):
+    throttle = _throttle()
+    clock.now = 10_000.0  # 視窗起點
+    
+    async def scenario():
+        await _fail(throttle, None, "bob", 4)
+        with pytest.raises(LoginThrottledError):
+            await throttle.check(None, "bob")
+        # 下一個視窗過了一半：前一視窗的 4 次以 0.5 加權為 2
+        clock.now = 10_000.0 + WINDOW * 1.5
+        await throttle.check(None, "bob")
+        await _fail(throttle, None, "bob", 1)
+        await throttle.check(None, "bob")
+        await _fail(throttle, None, "bob", 1)
+        with pytest.raises(LoginThrottledError):
+            await throttle.check(None, "bob")
+        # 兩個視窗之後舊計數完全滑出
+        clock.now = 10_000.0 + WINDOW * 3
+        await throttle.check(None, "bob")
+    
+    run_async(scenario())
+
+def test_reset_clears_identifier_scopes_but_keeps_ip(clock):
+    throttle = _throttle()
+    
+    async def scenario():
+        await _fail(throttle, "10.0.0.1", "carol", 3)
+        for index in range(3):
+            await _fail(throttle, "10.0.0.1", f"other{index}", 1)
+        with pytest.raises(LoginThrottledError):
+            await throttle.check("10.0.0.1", "carol")
+        await throttle.reset("10.0.0.1", "carol")
+        # IP 範圍仍累計 6 次失敗
+        with pytest.raises(LoginThrottledError):
+            await throttle.check("10.0.0.1", "carol")
+        await throttle.check("10.0.0.2", "carol")
+    
+    run_async(scenario())
+
+def test_disabled_throttle_never_blocks(clock):
+    throttle = _throttle()
+    throttle.enabled = False
+    
+    async def scenario():
+        await _fail(throttle, "10.0.0.1", "dave", 10)
+        await throttle.check("10.0.0.1", "dave")
+    
+    run_async(scenario())
+
+def test_database_backend_counts_concurrent_failures(database, clock):
+    throttle = _throttle(DatabaseThrottleBackend(WINDOW))
+    
+    async def scenario():
+        # 多個 worker 同時建立同一鍵的計數列：先寫入者建立，其餘改以 UPDATE 遞增
+        await asyncio.gather(*[throttle.record_failure("10.0.0.1", "erin") for _ in range(8)])
+        with pytest.raises(LoginThrottledError):
+            await throttle.check("10.0.0.1", "erin")
+        await throttle.reset("10.0.0.1", "erin")
+    
+    run_async(scenario())
+    with database.connect() as conn:
+        attempts = conn.execute(select(LoginThrottleCounter.attempts)).scalars().all()
+    # 重設後只剩 IP 範圍的計數
+    assert attempts == [8]
@@ -0,0 +1,30 @@
+"""
+/metrics 存取控制：未設定抓取令牌時要求 system.logs 權限，設定後比對令牌
+"""
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.dependencies import metrics_access
+
+def _client() -> TestClient:
+    app = FastAPI()
+    
+    @app.get("/metrics", dependencies=[Depends(metrics_access())])
+    async def metrics():
+        return "ok"
+    
+    return TestClient(app)
+
+def test_metrics_requires_login_without_token(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_AUTH_TOKEN", "")
+    client = _client()
+    assert client.get("/metrics").status_code in (401, 403)
+    assert client.get("/metrics", headers={"Authorization": "Bearer anything"}).status_code == 401
+
+def test_metrics_accepts_configured_token(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_AUTH_TOKEN", "scrape-secret")
+    client = _client()
+    assert client.get("/metrics").status_code in (401, 403)
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
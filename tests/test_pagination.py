@@ -0,0 +1,74 @@
+"""
+鍵集（游標）分頁：游標編碼與跨頁不重複、不遺漏
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+from app.core.pagination import decode_cursor, encode_cursor
+from app.db import AsyncSessionLocal
+from app.models.user import User
+from app.services.user_service import UserService
+from tests.helpers import run_async
+
+def test_cursor_round_trip():
+    values = [datetime(2024, 5, 1, 12, 30, 15, 123456), 42, "name"]
+    cursor = encode_cursor(values)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, [datetime, int, str]) == values
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!", encode_cursor([1, 2]), encode_cursor([{"x": 1}]), "bnVsbA",
+    # 型別不符或超出範圍的值在送往資料庫前即拒絕
+    encode_cursor(["x"]), encode_cursor([True]), encode_cursor([1.5]), encode_cursor([None]), encode_cursor([2 ** 63]),
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, [int])
+
+def test_cursor_values_must_match_key_types():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(["2024-05-01T00:00:00", 1]), [datetime, int])
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor([datetime(2024, 5, 1)]), [str])
+
+def test_keyset_pages_cover_all_rows_with_ties(database):
+    """多個排序鍵且前導鍵大量重複時，逐頁讀取的結果與一次性排序一致"""
+    service = UserService()
+    base = datetime(2024, 1, 1)
+    with database.begin() as conn:
+        conn.execute(User.__table__.insert(), [{
+            "username": f"user{index:02d}", "password_hash": b"x", "password_salt": b"x", "password_iters": 1,
+            "status": 1, "failed_login_count": 0, "mfa_enabled": False, "email_verified": True,
+            # 每三位用戶共用同一建立時間
+            "created_at": base + timedelta(minutes=index // 3), "updated_at": base
+        } for index in range(20)])
+    
+    async def scenario(descending: bool):
+        keys = [User.created_at, User.id]
+        pages = []
+        cursor = None
+        async with AsyncSessionLocal() as db:
+            while True:
+                items, cursor = await service.paginate_async(
+                    db, select(User).where(User.status == 1),
+                    cursor, limit=4, keys=keys, descending=descending
+                )
+                pages.append([user.id for user in items])
+                if cursor is None:
+                    break
+        return pages
+    
+    expected = sorted(range(1, 21), key=lambda user_id: ((user_id - 1) // 3, user_id))
+    for descending in (False, True):
+        pages = run_async(scenario(descending))
+        assert all(len(page) == 4 for page in pages)
+        flattened = [user_id for page in pages for user_id in page]
+        assert flattened == (list(reversed(expected)) if descending else expected)
+
+def test_paginate_rejects_cursor_with_wrong_key_type():
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await UserService().paginate_async(db, select(User), encode_cursor(["x"]))
+    
+    with pytest.raises(ValueError):
+        run_async(scenario())
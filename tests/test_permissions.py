@@ -0,0 +1,82 @@
+"""
+RBAC 權限引擎：位元遮罩編譯、停用角色排除與角色/角色權限變更後的快取失效
+"""
+from datetime import datetime
+import pytest
+from app.core.permissions import permission_engine
+from app.db import AsyncSessionLocal, SessionLocal
+from app.models.permission import Permission
+from app.models.role import Role
+from app.models.user import User
+from app.services.role_service import RoleService
+from tests.helpers import run_async
+
+@pytest.fixture
+def rbac(database):
+    """兩位用戶、兩個角色與三個權限；editor 擁有 user.read 與 user.update，auditor 擁有 system.logs"""
+    now = datetime.utcnow()
+    with database.begin() as conn:
+        conn.execute(User.__table__.insert(), [{
+            "id": user_id, "username": f"user{user_id}", "password_hash": b"x", "password_salt": b"x",
+            "password_iters": 1, "status": 1, "failed_login_count": 0, "mfa_enabled": False,
+            "email_verified": True, "created_at": now, "updated_at": now
+        } for user_id in (1, 2)])
+        conn.execute(Permission.__table__.insert(), [
+            {"id": 1, "code": "user.read", "name": "讀取用戶"},
+            {"id": 2, "code": "user.update", "name": "更新用戶"},
+            {"id": 3, "code": "system.logs", "name": "系統日誌"},
+        ])
+        conn.execute(Role.__table__.insert(), [
+            {"id": 1, "code": "editor", "name": "編輯", "status": 1},
+            {"id": 2, "code": "auditor", "name": "稽核", "status": 1},
+        ])
+    service = RoleService()
+    with SessionLocal() as db:
+        service.grant_permission_to_role(db, 1, 1)
+        service.grant_permission_to_role(db, 1, 2)
+        service.grant_permission_to_role(db, 2, 3)
+        service.assign_role_to_user(db, 1, 1)
+    permission_engine.invalidate_all()
+    yield service
+    permission_engine.invalidate_all()
+
+def _check(user_id: int, *codes: str):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            return [await permission_engine.has_permission(db, user_id, code) for code in codes]
+    return run_async(scenario())
+
+def test_role_permissions_compile_to_user_masks(rbac):
+    assert _check(1, "user.read", "user.update", "system.logs", "no.such.permission") == [True, True, False, False]
+    assert _check(2, "user.read", "system.logs") == [False, False]
+
+def test_user_role_changes_invalidate_cached_mask(rbac):
+    assert _check(2, "system.logs") == [False]
+    with SessionLocal() as db:
+        rbac.assign_role_to_user(db, 2, 2)
+    assert _check(2, "system.logs", "user.read") == [True, False]
+    with SessionLocal() as db:
+        rbac.remove_role_from_user(db, 2, 2)
+    assert _check(2, "system.logs") == [False]
+
+def test_role_permission_changes_recompile_matrix(rbac):
+    assert _check(1, "user.update", "system.logs") == [True, False]
+    with SessionLocal() as db:
+        rbac.revoke_permission_from_role(db, 1, 2)
+        rbac.grant_permission_to_role(db, 1, 3)
+    assert _check(1, "user.update", "system.logs", "user.read") == [False, True, True]
+
+def test_disabled_roles_grant_nothing(rbac):
+    assert _check(1, "user.read") == [True]
+    with SessionLocal() as db:
+        rbac.update(db, 1, status=0)
+    assert _check(1, "user.read", "user.update") == [False, False]
+    with SessionLocal() as db:
+        rbac.update(db, 1, status=1)
+    assert _check(1, "user.read") == [True]
+
+def test_masks_cached_for_an_older_matrix_are_ignored(rbac):
+    assert _check(2, "user.read") == [False]
+    # 重新編譯期間才寫入快取的舊版本遮罩不會被使用
+    permission_engine._user_masks.set(2, (permission_engine._version - 1, -1))
+    assert _check(2, "user.read", "system.logs") == [False, False]
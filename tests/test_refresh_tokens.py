@@ -0,0 +1,84 @@
+"""
+刷新令牌輪替：重複使用偵測
+"""
+from datetime import datetime
+import pytest
+from sqlalchemy import select
+from app.core.session import create_refresh_token, create_user_session, generate_session_id, rotate_refresh_token
+from app.db import AsyncSessionLocal
+from app.models.user import User
+from app.models.user_session import UserSession
+from tests.helpers import run_async
+
+async def _login(db) -> str:
+    user = User(username="alice", password_hash=b"x", password_salt=b"x", password_iters=1, status=1)
+    db.add(user)
+    await db.commit()
+    session_id = generate_session_id()
+    refresh_token = create_refresh_token(session_id)
+    await create_user_session(user, f"access-{session_id}", None, None, db,
+                              session_id=session_id, refresh_token=refresh_token)
+    return refresh_token
+
+async def _revoked_at(db, refresh_token: str):
+    result = await db.execute(
+        select(UserSession.revoked_at).where(UserSession.session_id == refresh_token.partition(".")[0])
+    )
+    return result.scalar_one()
+
+def test_rotation_returns_new_token_and_rejects_unknown_tokens():
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            token = await _login(db)
+            _, rotated = await rotate_refresh_token(token, db)
+            assert rotated != token and rotated.partition(".")[0] == token.partition(".")[0]
+            
+            # 未曾簽發的令牌只會被拒絕，不會撤銷會話
+            with pytest.raises(ValueError, match="無效的刷新令牌"):
+                await rotate_refresh_token(token.partition(".")[0] + ".forged", db)
+            assert await _revoked_at(db, token) is None
+            
+            _, rotated_again = await rotate_refresh_token(rotated, db)
+            assert rotated_again != rotated
+    
+    run_async(scenario())
+
+@pytest.mark.parametrize("generations", [1, 2, 4])
+def test_replaying_any_consumed_generation_revokes_session(monkeypatch, generations):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "REFRESH_TOKEN_REUSE_GRACE_SECONDS", 0)
+    
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            first = await _login(db)
+            token = first
+            for _ in range(generations):
+                _, token = await rotate_refresh_token(token, db)
+            
+            with pytest.raises(ValueError, match="會話已撤銷"):
+                await rotate_refresh_token(first, db)
+            assert isinstance(await _revoked_at(db, first), datetime)
+            # 撤銷後目前的令牌也無法使用
+            with pytest.raises(ValueError):
+                await rotate_refresh_token(token, db)
+    
+    run_async(scenario())
+
+def test_previous_token_within_grace_is_rejected_without_revoking(monkeypatch):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "REFRESH_TOKEN_REUSE_GRACE_SECONDS", 60)
+    
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            first = await _login(db)
+            _, second = await rotate_refresh_token(first, db)
+            with pytest.raises(ValueError, match="^刷新令牌已被使用$"):
+                await rotate_refresh_token(first, db)
+            assert await _revoked_at(db, first) is None
+            
+            # 寬限期只適用於上一個令牌，更早的令牌仍會撤銷會話
+            _, third = await rotate_refresh_token(second, db)
+            with pytest.raises(ValueError, match="會話已撤銷"):
+                await rotate_refresh_token(first, db)
+    
+    run_async(scenario())
@@ -0,0 +1,55 @@
+"""
+會話撤銷集合刷新：較晚提交或時鐘較慢主機寫入的撤銷不會落在水位之後而遺漏
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.core.session import SessionActivityTracker
+from app.db import AsyncSessionLocal
+from app.models.user import User
+from app.models.user_session import UserSession
+from tests.helpers import run_async
+
+def _tracker() -> SessionActivityTracker:
+    return SessionActivityTracker(flush_interval=30, staleness=60, refresh_interval=5, lookback=300)
+
+def _seed(engine, session_ids):
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{
+            "id": 1, "username": "alice", "password_hash": b"x", "password_salt": b"x", "password_iters": 1,
+            "status": 1, "failed_login_count": 0, "mfa_enabled": False, "email_verified": True,
+            "created_at": now, "updated_at": now
+        }])
+        conn.execute(UserSession.__table__.insert(), [{
+            "user_id": 1, "session_id": session_id, "token_signature": "x", "created_at": now, "last_seen_at": now
+        } for session_id in session_ids])
+
+def test_out_of_order_revocations_reach_every_worker(database):
+    _seed(database, ["early", "late", "skewed"])
+    worker_a, worker_b = _tracker(), _tracker()
+    
+    async def revoke(db, session_id: str, revoked_at: datetime):
+        await db.execute(
+            update(UserSession).where(UserSession.session_id == session_id).values(revoked_at=revoked_at)
+        )
+        await db.commit()
+    
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            for tracker in (worker_a, worker_b):
+                await tracker.refresh_revocations(db)
+            
+            # worker A 先撤銷 early 並刷新，水位前進
+            await revoke(db, "early", datetime.utcnow())
+            await worker_a.refresh_revocations(db)
+            assert worker_a.is_revoked("early")
+            
+            # late 的 revoked_at 在 A 刷新前寫入、刷新後才提交；skewed 來自時鐘慢兩分鐘的主機
+            await revoke(db, "late", datetime.utcnow() - timedelta(seconds=5))
+            await revoke(db, "skewed", datetime.utcnow() - timedelta(minutes=2))
+            
+            for tracker in (worker_a, worker_b):
+                await tracker.refresh_revocations(db)
+                assert all(tracker.is_revoked(session_id) for session_id in ("early", "late", "skewed"))
+    
+    run_async(scenario())
@@ -0,0 +1,60 @@
+"""
+用戶批次匯入：格式檢查與執行池忙碌時的處理
+"""
+from app.db import AsyncSessionLocal
+from app.models.user import UserCreate, UserRegister
+from app.services.user_import_service import UserImportService, ImportFormat
+from app.services.user_service import UserService
+from tests.helpers import run_async
+
+PASSWORD = "Passw0rd!x"
+
+def test_rows_with_malformed_email_or_phone_are_rejected():
+    data = (
+        "username,email,phone,password\n"
+        f"good,Good@Example.com,0912-345-678,{PASSWORD}\n"
+        f"bad_email,not-an-email,,{PASSWORD}\n"
+        f"bad_phone,,12ab,{PASSWORD}\n"
+        f"short_phone,,12345,{PASSWORD}\n"
+    ).encode()
+    
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            response = await UserImportService().import_users(db, data, ImportFormat.CSV)
+            assert (response.created, response.failed) == (1, 3)
+            assert [result.error for result in response.results] == [
+                None, "郵箱格式不正確", "電話格式不正確", "電話格式不正確"
+            ]
+            
+            service = UserService()
+            for identifier in ("good@example.com", "+886912345678"):
+                user = await service.authenticate_user(db, identifier, PASSWORD)
+                assert user is not None and user.username == "good"
+    
+    run_async(scenario())
+
+def test_rows_fail_when_hashing_pool_stays_busy(monkeypatch):
+    """執行池持續忙碌時在時間上限後以錯誤結束，而不是無限重試"""
+    from app.core.config import settings
+    from app.core.password_hashing import password_hashing_pool, PasswordHashingBusyError
+    
+    async def busy(*args):
+        raise PasswordHashingBusyError("busy")
+    
+    monkeypatch.setattr(settings, "USER_IMPORT_HASH_BUSY_TIMEOUT_SECONDS", 0.3)
+    monkeypatch.setattr(password_hashing_pool, "run", busy)
+    data = f"username,email,phone,password\nu1,,,{PASSWORD}\nu2,,,{PASSWORD}\n".encode()
+    
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            response = await UserImportService().import_users(db, data, ImportFormat.CSV)
+        assert (response.created, response.failed) == (0, 2)
+        assert all(result.error == "密碼雜湊服務忙碌中，請稍後重新匯入" for result in response.results)
+    
+    run_async(scenario())
+
+def test_single_user_models_keep_accepting_legacy_formats():
+    """格式檢查只用於批次匯入，新增與註冊端點的既有行為不變"""
+    assert UserCreate(username="legacy", email="legacy", phone="ext. 12", password=PASSWORD).phone == "ext. 12"
+    assert UserRegister(username="legacy", email="", phone="12ab", password=PASSWORD,
+                        confirm_password=PASSWORD).email == ""